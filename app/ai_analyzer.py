@@ -1,7 +1,14 @@
 import os
+import json
+import asyncio
+import hashlib
 import logging
-from openai import OpenAI
+from collections import Counter
 from dotenv import load_dotenv
+from app.http_client import get_http_client
+from app.cache import analysis_cache
+from app.upstream import get_policy, UpstreamError
+from app.context_builder import build_context, build_chunks, format_chunk, needs_map_reduce
 
 load_dotenv()
 
@@ -11,44 +18,28 @@ logger = logging.getLogger(__name__)
 
 # OpenAI API key
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
+# Must support JSON mode (response_format json_object)
+OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4o')
+# Concurrent chunk extraction calls of one map-reduce analysis
+AI_MAP_CONCURRENCY = int(os.getenv('AI_MAP_CONCURRENCY', '4'))
+# Findings of each kind (issues, patterns, positives) passed to the reduce prompt, most reported first
+AI_REDUCE_MAX_FINDINGS = int(os.getenv('AI_REDUCE_MAX_FINDINGS', '25'))
 
+RISK_LEVELS = ['Low', 'Medium', 'High', 'Critical']
+# Expected analysis fields and their defaults when the model leaves one out
+ANALYSIS_DEFAULTS = {
+    "risk_level": "Unknown",
+    "summary": "",
+    "key_issues": [],
+    "concerning_patterns": [],
+    "recommendations": [],
+    "positive_aspects": [],
+    "source_breakdown": {"web_mentions": "", "trustpilot_reviews": ""}
+}
+_client = None
+_client_http = None
 
-def analyze_reputation_data(business_name: str, search_results: str, trustpilot_data: list = None) -> dict:
-    """
-    Analyze reputation data using OpenAI to identify risks and provide insights.
-    
-    :param business_name: Name of the business being analyzed
-    :param search_results: Formatted search results from SERP
-    :param trustpilot_data: Optional Trustpilot review data
-    :return: Dictionary with AI analysis results
-    """
-    if not client:
-        logger.error("OpenAI API key not found in environment variables")
-        return {
-            "error": "OpenAI API key not configured",
-            "summary": "Unable to perform AI analysis. Please check OpenAI API configuration.",
-            "risk_level": "unknown",
-            "key_issues": [],
-            "recommendations": []
-        }
-    
-    try:
-        # Prepare the context for AI analysis
-        context = f"Business Name: {business_name}\n\n"
-        context += "=== WEB SEARCH RESULTS ===\n"
-        context += search_results
-        
-        if trustpilot_data:
-            context += "\n\n=== TRUSTPILOT REVIEWS ===\n"
-            for review in trustpilot_data:
-                context += f"Rating: {review.get('review_rating', 'N/A')}/5\n"
-                context += f"Author: {review.get('author_title', 'Anonymous')}\n"
-                context += f"Review: {review.get('review_text', '')}\n"
-                context += f"Date: {review.get('review_datetime_utc', '')}\n\n"
-        
-        # Create the AI prompt
-        system_prompt = """You are a professional reputation monitoring and risk assessment AI. 
+SYSTEM_PROMPT = """You are a professional reputation monitoring and risk assessment AI. 
         Your job is to analyze online mentions and reviews of businesses to identify potential reputation risks.
         
         Provide a comprehensive analysis that includes:
@@ -59,76 +50,425 @@ def analyze_reputation_data(business_name: str, search_results: str, trustpilot_
         5. A concise executive summary
         
         Be objective, factual, and focus on legitimate concerns while filtering out frivolous complaints."""
-        
-        user_prompt = f"""Please analyze the following reputation data for '{business_name}' and provide a detailed assessment:
-
-{context}
 
-Please structure your response as a JSON object with the following format:
-{{
+RESPONSE_FORMAT = """Please structure your response as a JSON object with the following format:
+{
     "risk_level": "Low|Medium|High|Critical",
     "summary": "Brief executive summary of findings",
     "key_issues": ["list", "of", "main", "issues", "found"],
     "concerning_patterns": ["any", "recurring", "themes", "or", "patterns"],
     "recommendations": ["specific", "actionable", "recommendations"],
     "positive_aspects": ["any", "positive", "mentions", "or", "mitigating", "factors"],
-    "source_breakdown": {{
+    "source_breakdown": {
         "web_mentions": "count and summary",
         "trustpilot_reviews": "count and summary"
-    }}
-}}"""
+    }
+}"""
 
-        logger.info(f"Sending reputation analysis request to OpenAI for {business_name}")
-        
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": system_prompt},
+MAP_SYSTEM_PROMPT = """You are a professional reputation monitoring and risk assessment AI.
+        You are given one batch of the online mentions and reviews of a business; the other batches are
+        analyzed separately and the findings combined afterwards.
+
+        Extract the specific complaints, recurring patterns and positive points in this batch only, and
+        rate the reputation risk this batch alone signals. Be objective and factual, and filter out
+        frivolous complaints."""
+
+EXTRACTION_FORMAT = """Please structure your response as a JSON object with the following format:
+{
+    "issues": ["specific", "complaints", "found"],
+    "patterns": ["recurring", "themes"],
+    "positives": ["positive", "points"],
+    "risk_signal": "Low|Medium|High|Critical",
+    "negative_items": <number of mentions and reviews in this batch that are negative>
+}
+Keep each entry to a short phrase, with at most 8 entries per list."""
+# Expected chunk extraction fields and their defaults
+EXTRACTION_DEFAULTS = {"issues": [], "patterns": [], "positives": [], "risk_signal": "Unknown", "negative_items": 0}
+EXTRACTION_MAX_ENTRIES = 8
+# Analysis fields carried into an incremental update's prompt
+PREVIOUS_ANALYSIS_FIELDS = ("risk_level", "summary", "key_issues", "concerning_patterns", "recommendations",
+                            "positive_aspects")
+
+
+def get_openai_client():
+    """
+    Return an AsyncOpenAI client bound to the shared HTTP connection pool.
+
+    :return: AsyncOpenAI instance, or None if no API key is configured
+    """
+    global _client, _client_http
+    if not OPENAI_API_KEY:
+        return None
+    http_client = get_http_client()
+    if _client is None or _client_http is not http_client:
+        # The SDK is imported on first use: it is the slowest import in the app
+        from openai import AsyncOpenAI
+        # Retries are left to the shared upstream policy (see app/upstream.py)
+        _client = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=http_client, max_retries=0)
+        _client_http = http_client
+    return _client
+
+
+def analysis_cache_key(request_params: dict) -> str:
+    """
+    Content address for an analysis: a hash of the exact chat completion request
+    (model, sampling settings and the full prompt text).
+
+    :param request_params: Keyword arguments for chat.completions.create
+    :return: Hex digest
+    """
+    payload = json.dumps(request_params, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def normalize_analysis(result: dict) -> dict:
+    """
+    Fill in missing analysis fields and map the risk level onto RISK_LEVELS
+    (case-insensitively), so the UI always gets the same shape.
+    """
+    analysis = {**ANALYSIS_DEFAULTS, **result}
+    risk_level = str(analysis.get("risk_level") or "").strip().capitalize()
+    analysis["risk_level"] = risk_level if risk_level in RISK_LEVELS else "Unknown"
+    return analysis
+
+
+def normalize_extraction(result: dict) -> dict:
+    """
+    Fill in missing chunk extraction fields, keep the lists to short strings and
+    map the risk signal onto RISK_LEVELS, as normalize_analysis does.
+    """
+    extraction = {**EXTRACTION_DEFAULTS, **result}
+    for field in ("issues", "patterns", "positives"):
+        entries = extraction[field] if isinstance(extraction[field], list) else []
+        extraction[field] = [str(entry).strip() for entry in entries if str(entry).strip()][:EXTRACTION_MAX_ENTRIES]
+    risk_signal = str(extraction.get("risk_signal") or "").strip().capitalize()
+    extraction["risk_signal"] = risk_signal if risk_signal in RISK_LEVELS else "Unknown"
+    try:
+        extraction["negative_items"] = max(0, int(extraction["negative_items"]))
+    except (TypeError, ValueError):
+        extraction["negative_items"] = 0
+    return {field: extraction[field] for field in EXTRACTION_DEFAULTS}
+
+
+def merge_extractions(extractions: list) -> dict:
+    """
+    Combine chunk extractions for the reduce prompt: each distinct finding
+    (case-insensitively) with the number of chunks that reported it, most reported
+    first and at most AI_REDUCE_MAX_FINDINGS per kind, plus the count of chunks
+    per risk signal. The reduce prompt stays the same size however many chunks
+    there are.
+    """
+    merged = {}
+    for field in ("issues", "patterns", "positives"):
+        counts, labels = Counter(), {}
+        for extraction in extractions:
+            for finding in dict.fromkeys(entry.lower() for entry in extraction[field]):
+                counts[finding] += 1
+            for entry in extraction[field]:
+                labels.setdefault(entry.lower(), entry)
+        merged[field] = [
+            {"finding": labels[finding], "batches": count}
+            for finding, count in counts.most_common(AI_REDUCE_MAX_FINDINGS)
+        ]
+    signals = Counter(extraction["risk_signal"] for extraction in extractions)
+    merged["risk_signals"] = {level: signals[level] for level in RISK_LEVELS + ["Unknown"] if signals[level]}
+    merged["negative_items"] = sum(extraction["negative_items"] for extraction in extractions)
+    return merged
+
+
+async def stream_reputation_analysis(business_name: str, search_results: list, trustpilot_data: list = None, refresh: bool = False):
+    """
+    Analyze reputation data using OpenAI, yielding the model output as it is generated.
+
+    Yields `{"type": "token", "content": ...}` events for each streamed chunk and
+    finishes with one `{"type": "analysis", "analysis": {...}}` event carrying the
+    parsed result. A memoized analysis is yielded directly with no token events.
+
+    The prompt holds a token-budgeted selection of the mentions and reviews (see
+    app/context_builder.py) and the model answers in JSON mode. When there are
+    far more than one prompt holds (AI_MAP_REDUCE_MIN_TOKENS), every item is
+    analyzed by map-reduce instead: see _map_reduce_analysis.
+    
+    :param business_name: Name of the business being analyzed
+    :param search_results: Search result dicts from search_negative_mentions
+    :param trustpilot_data: Optional Trustpilot review data
+    :param refresh: Skip the memoized analysis and call the model again
+    """
+    client = get_openai_client()
+    if not client:
+        logger.error("OpenAI API key not found in environment variables")
+        yield {"type": "analysis", "analysis": {
+            "error": "OpenAI API key not configured",
+            "summary": "Unable to perform AI analysis. Please check OpenAI API configuration.",
+            "risk_level": "unknown",
+            "key_issues": [],
+            "recommendations": []
+        }}
+        return
+
+    try:
+        chunks = build_chunks(business_name, search_results, trustpilot_data)
+        map_reduce = needs_map_reduce(business_name, chunks)
+    except Exception as e:
+        logger.error(f"Error during AI analysis for {business_name}: {e}")
+        yield {"type": "analysis", "analysis": _error_analysis(e)}
+        return
+    if map_reduce:
+        async for event in _map_reduce_analysis(client, business_name, chunks, refresh):
+            yield event
+        return
+
+    def build_prompt() -> str:
+        # Prepare the context for AI analysis
+        context = build_context(business_name, search_results, trustpilot_data)
+        return f"""Please analyze the following reputation data for '{business_name}' and provide a detailed assessment:
+
+{context}
+
+{RESPONSE_FORMAT}"""
+
+    async for event in _run_analysis(client, business_name, build_prompt, refresh):
+        yield event
+
+
+async def _run_analysis(client, business_name: str, build_prompt, refresh: bool):
+    """
+    Send one analysis prompt (memoized, streamed), yielding token events and the
+    final analysis event. Any failure, including building the prompt, is yielded
+    as an error analysis.
+
+    :param build_prompt: Returns the user prompt
+    """
+    try:
+        user_prompt = build_prompt()
+        request_params = {
+            "model": OPENAI_MODEL,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": user_prompt}
             ],
-            max_tokens=1500,
-            temperature=0.3  # Lower temperature for more consistent, factual responses
+            "max_tokens": 1500,
+            "temperature": 0.3,  # Lower temperature for more consistent, factual responses
+            # JSON mode: the reply is always a syntactically valid JSON object
+            "response_format": {"type": "json_object"}
+        }
+        cache_key = analysis_cache_key(request_params)
+
+        if not refresh:
+            try:
+                memoized = await analysis_cache.get(cache_key, 'openai')
+            except Exception as e:
+                logger.error(f"Failed to read memoized AI analysis for {business_name}: {e}")
+                memoized = None
+            if memoized is not None:
+                logger.info(f"Reusing memoized AI analysis for {business_name}")
+                memoized['cached'] = True
+                yield {"type": "analysis", "analysis": memoized}
+                return
+
+        logger.info(f"Sending reputation analysis request to OpenAI for {business_name}")
+        
+        stream = await get_policy('openai').call(
+            client.chat.completions.create, **request_params, stream=True, idempotent=False
         )
+        chunks = []
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                chunks.append(delta)
+                yield {"type": "token", "content": delta}
         
-        ai_response = response.choices[0].message.content
+        ai_response = "".join(chunks)
         logger.info(f"Received AI analysis for {business_name}")
         
-        # Try to parse JSON response, fallback to text if needed
+        # JSON mode guarantees valid JSON unless the reply was cut off at max_tokens,
+        # which is reported as an error rather than replaced by a guessed analysis
+        try:
+            result = normalize_analysis(json.loads(ai_response))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Model reply was incomplete JSON ({len(ai_response)} characters): {e}") from e
         try:
-            import json
-            result = json.loads(ai_response)
-        except json.JSONDecodeError:
-            # Fallback if AI doesn't return valid JSON
-            result = {
-                "risk_level": "Medium",
-                "summary": ai_response[:500] + "..." if len(ai_response) > 500 else ai_response,
-                "key_issues": ["Analysis provided in summary"],
-                "concerning_patterns": [],
-                "recommendations": ["Review detailed analysis in summary"],
-                "positive_aspects": [],
-                "source_breakdown": {
-                    "web_mentions": "See summary for details",
-                    "trustpilot_reviews": "See summary for details"
-                }
-            }
+            await analysis_cache.set(cache_key, 'openai', result)
+        except Exception as e:
+            logger.error(f"Failed to memoize AI analysis for {business_name}: {e}")
         
-        return result
+        result['cached'] = False
+        yield {"type": "analysis", "analysis": result}
         
     except Exception as e:
         logger.error(f"Error during AI analysis for {business_name}: {e}")
-        return {
-            "error": str(e),
-            "risk_level": "Unknown",
-            "summary": f"Error occurred during AI analysis: {str(e)}",
-            "key_issues": ["Analysis failed due to technical error"],
-            "concerning_patterns": [],
-            "recommendations": ["Contact support to resolve analysis issue"],
-            "positive_aspects": [],
-            "source_breakdown": {
-                "web_mentions": "Analysis failed",
-                "trustpilot_reviews": "Analysis failed"
-            }
+        yield {"type": "analysis", "analysis": _error_analysis(e)}
+
+
+def _error_analysis(e: Exception) -> dict:
+    """Analysis reported in place of one that failed with `e`."""
+    return {
+        "error": str(e),
+        "error_kind": e.kind if isinstance(e, UpstreamError) else "failed",
+        "risk_level": "Unknown",
+        "summary": f"Error occurred during AI analysis: {str(e)}",
+        "key_issues": ["Analysis failed due to technical error"],
+        "concerning_patterns": [],
+        "recommendations": ["Contact support to resolve analysis issue"],
+        "positive_aspects": [],
+        "source_breakdown": {
+            "web_mentions": "Analysis failed",
+            "trustpilot_reviews": "Analysis failed"
         }
+    }
+
+
+async def _extract_chunk(client, business_name: str, context: str, refresh: bool) -> dict:
+    """
+    Map step: extract issues, patterns, positives and a risk signal from one
+    chunk's context. Extractions are memoized like analyses, under a hash of the
+    request, so an unchanged chunk is not sent again on a rerun.
+
+    :param context: Chunk context from format_chunk
+    :return: Normalized extraction (see EXTRACTION_DEFAULTS)
+    """
+    request_params = {
+        "model": OPENAI_MODEL,
+        "messages": [
+            {"role": "system", "content": MAP_SYSTEM_PROMPT},
+            {"role": "user", "content": f"""Please extract the reputation findings from this batch of data about '{business_name}':
+
+{context}
+
+{EXTRACTION_FORMAT}"""}
+        ],
+        "max_tokens": 500,
+        "temperature": 0.3,
+        "response_format": {"type": "json_object"}
+    }
+    cache_key = analysis_cache_key(request_params)
+    if not refresh:
+        try:
+            memoized = await analysis_cache.get(cache_key, 'openai')
+        except Exception as e:
+            logger.error(f"Failed to read memoized chunk extraction for {business_name}: {e}")
+            memoized = None
+        if memoized is not None:
+            return memoized
+
+    response = await get_policy('openai').call(client.chat.completions.create, **request_params, idempotent=False)
+    reply = response.choices[0].message.content or ''
+    try:
+        extraction = normalize_extraction(json.loads(reply))
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Model reply was incomplete JSON ({len(reply)} characters): {e}") from e
+    try:
+        await analysis_cache.set(cache_key, 'openai', extraction)
+    except Exception as e:
+        logger.error(f"Failed to memoize chunk extraction for {business_name}: {e}")
+    return extraction
+
+
+async def _map_reduce_analysis(client, business_name: str, chunks: list, refresh: bool):
+    """
+    Analyze more mentions and reviews than fit in one prompt. Each chunk gets its
+    own extraction call, at most AI_MAP_CONCURRENCY at a time; the merged
+    extractions then go into one reduce prompt answered in the usual analysis
+    schema, streamed and memoized by _run_analysis. Latency grows with the number
+    of chunks divided by the concurrency, while the reduce prompt stays bounded.
+
+    If a chunk fails the analysis is reported as an error; the chunks that did
+    succeed are memoized, so a retry sends only the failed ones.
+
+    :param chunks: (mentions, reviews) pairs from build_chunks
+    """
+    semaphore = asyncio.Semaphore(AI_MAP_CONCURRENCY)
+
+    async def extract(mentions: list, reviews: list) -> dict:
+        async with semaphore:
+            return await _extract_chunk(client, business_name, format_chunk(business_name, mentions, reviews), refresh)
+
+    mention_count = sum(len(mentions) for mentions, _ in chunks)
+    review_count = sum(len(reviews) for _, reviews in chunks)
+    logger.info(
+        f"Map-reduce analysis for {business_name}: {mention_count} mentions and {review_count} reviews "
+        f"in {len(chunks)} chunks"
+    )
+    results = await asyncio.gather(*(extract(mentions, reviews) for mentions, reviews in chunks),
+                                   return_exceptions=True)
+    failures = [result for result in results if isinstance(result, Exception)]
+    if failures:
+        logger.error(f"Error during AI analysis for {business_name}: {len(failures)} of {len(chunks)} chunks failed")
+        yield {"type": "analysis", "analysis": _error_analysis(failures[0])}
+        return
+
+    def build_prompt() -> str:
+        findings = json.dumps(merge_extractions(results), indent=2, ensure_ascii=False)
+        return f"""Below are the findings extracted from {review_count} Trustpilot reviews and {mention_count} web mentions of '{business_name}', analyzed in {len(chunks)} batches. Each finding lists how many batches reported it, and risk_signals counts the batches per risk level. Merge them into one detailed assessment: combine findings that describe the same problem, weigh them by how widely they were reported, and set the risk level from the evidence as a whole.
+
+=== BATCH FINDINGS ===
+{findings}
+
+{RESPONSE_FORMAT}"""
+
+    async for event in _run_analysis(client, business_name, build_prompt, refresh):
+        yield event
+
+
+async def analyze_reputation_data(business_name: str, search_results: list, trustpilot_data: list = None, refresh: bool = False) -> dict:
+    """
+    Analyze reputation data using OpenAI to identify risks and provide insights.
+
+    Parsed analyses are memoized under a hash of the prompt and model settings, so
+    unchanged inputs return immediately without a model call. The result's `cached`
+    flag says whether it came from the memo.
+    
+    :param business_name: Name of the business being analyzed
+    :param search_results: Search result dicts from search_negative_mentions
+    :param trustpilot_data: Optional Trustpilot review data
+    :param refresh: Skip the memoized analysis and call the model again
+    :return: Dictionary with AI analysis results
+    """
+    analysis = None
+    async for event in stream_reputation_analysis(business_name, search_results, trustpilot_data, refresh):
+        if event["type"] == "analysis":
+            analysis = event["analysis"]
+    return analysis
+
+
+async def update_reputation_analysis(business_name: str, previous: dict, new_search_results: list,
+                                     new_trustpilot_data: list = None, refresh: bool = False) -> dict:
+    """
+    Update an earlier analysis with only the mentions and reviews found since it
+    was made, instead of re-analyzing the whole history. The prompt holds the
+    previous findings plus a token-budgeted context of the new items, so its
+    size follows the amount of new activity. Memoized like analyze_reputation_data.
+
+    :param business_name: Name of the business being analyzed
+    :param previous: Analysis being updated
+    :param new_search_results: Search results not seen by the previous analysis
+    :param new_trustpilot_data: Trustpilot reviews posted since the previous analysis
+    :param refresh: Skip the memoized analysis and call the model again
+    :return: Dictionary with the updated analysis
+    """
+    client = get_openai_client()
+    if not client:
+        logger.error("OpenAI API key not found in environment variables")
+        return {**previous, "error": "OpenAI API key not configured"}
+
+    def build_prompt() -> str:
+        findings = json.dumps({field: previous.get(field) for field in PREVIOUS_ANALYSIS_FIELDS}, indent=2)
+        context = build_context(business_name, new_search_results, new_trustpilot_data)
+        return f"""Below is the current reputation assessment for '{business_name}', followed by web mentions and reviews that appeared since it was made. Update the assessment with the new data: keep findings that still hold, add new issues and patterns, and change the risk level only if the new data warrants it.
+
+=== CURRENT ASSESSMENT ===
+{findings}
+
+=== NEW DATA ===
+{context}
+
+{RESPONSE_FORMAT}"""
+
+    analysis = None
+    async for event in _run_analysis(client, business_name, build_prompt, refresh):
+        if event["type"] == "analysis":
+            analysis = event["analysis"]
+    return analysis
 
 
 def get_risk_level_color(risk_level: str) -> str:
@@ -1,45 +1,330 @@
 import os
-from apify_client import ApifyClient
+import json
+import base64
+import asyncio
+from urllib.parse import urlencode
 from dotenv import load_dotenv
 import logging
+from app.upstream import get_policy, UpstreamError
+from app.providers import provider_error, provider_errors
+from app.cache import cached, cached_stream
+from app.models import Business
+from app.singleflight import SingleFlight
+from app.apify_runs import apify_run_store, run_input_key, TERMINAL_STATUSES
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 APIFY_TOKEN = os.getenv("APIFY_TOKEN")
+APIFY_API_URL = "https://api.apify.com/v2"
+ACTOR_ID = "compass~crawler-google-places"
 
-async def get_apify_low_rated_places(category: str, location: str, max_results: int = 5, return_limit: int = 5):
+# Seconds the Apify API may hold a run request open waiting for the run to finish.
+# Longer crawls are followed up with further long-poll requests.
+WAIT_FOR_FINISH = 60
+DATASET_PAGE_SIZE = 100
+# Places crawled by one paginated search; its pages are read from the dataset as it fills
+APIFY_PAGINATED_MAX_PLACES = int(os.getenv('APIFY_PAGINATED_MAX_PLACES', '100'))
+# Seconds a paginated search waits per long-poll for the crawl to add items
+APIFY_PAGE_WAIT = 10
+# Public URL of this app's /api/apify/webhook; when set, Apify reports finished runs
+# there instead of the app having to poll for them
+APIFY_WEBHOOK_URL = os.getenv('APIFY_WEBHOOK_URL')
+# Sent with each webhook request; the receiver rejects requests without it
+APIFY_WEBHOOK_SECRET = os.getenv('APIFY_WEBHOOK_SECRET')
+WEBHOOK_EVENT_TYPES = ["ACTOR.RUN.SUCCEEDED", "ACTOR.RUN.FAILED", "ACTOR.RUN.ABORTED", "ACTOR.RUN.TIMED_OUT"]
+
+# Concurrent requests for the same crawl start it once
+apify_starts = SingleFlight('apify.start')
+
+
+def _auth_headers() -> dict:
+    return {"Authorization": f"Bearer {APIFY_TOKEN or ''}"}
+
+
+async def _get_run(run_id: str, wait: int = 0) -> dict:
+    """
+    Get a run's current state, waiting up to `wait` seconds for it to finish.
+    """
+    response = await get_policy('apify').request(
+        "GET",
+        f"{APIFY_API_URL}/actor-runs/{run_id}",
+        params={"waitForFinish": wait},
+        headers=_auth_headers(),
+        timeout=wait + 30
+    )
+    response.raise_for_status()
+    return response.json()["data"]
+
+
+def _run_input(category: str, location: str, max_places: int) -> dict:
+    return {
+        "searchStringsArray": [category],
+        "locationQuery": location,
+        "maxCrawledPlacesPerSearch": max_places,
+        "language": "en"
+    }
+
+
+def _webhooks_param() -> dict:
+    """Ad-hoc webhook for a run, in the base64 JSON form the run API expects."""
+    if not APIFY_WEBHOOK_URL:
+        return {}
+    url = APIFY_WEBHOOK_URL
+    if APIFY_WEBHOOK_SECRET:
+        url += ('&' if '?' in url else '?') + urlencode({"token": APIFY_WEBHOOK_SECRET})
+    webhooks = [{"eventTypes": WEBHOOK_EVENT_TYPES, "requestUrl": url}]
+    return {"webhooks": base64.b64encode(json.dumps(webhooks).encode('utf-8')).decode('ascii')}
+
+
+def _run_handle(record: dict) -> dict:
+    """The client's view of a stored run."""
+    run_input = record["run_input"]
+    return {
+        "run_id": record["run_id"],
+        "status": record["status"],
+        "dataset_id": record["dataset_id"],
+        "category": (run_input.get("searchStringsArray") or [None])[0],
+        "location": run_input.get("locationQuery"),
+        "max_places": record["max_places"],
+        "started_at": record["started_at"],
+        "finished_at": record["finished_at"]
+    }
+
+
+async def _start_or_reuse(run_input: dict, refresh: bool, wait: int) -> dict:
+    if not refresh:
+        record = await asyncio.to_thread(apify_run_store.find_reusable, run_input)
+        if record is not None and record["status"] not in TERMINAL_STATUSES:
+            # Check that the run is really still going (or has since succeeded)
+            run = await _get_run(record["run_id"])
+            await asyncio.to_thread(apify_run_store.set_status, record["run_id"], run["status"])
+            record["status"] = run["status"]
+        if record is not None and (record["status"] == "SUCCEEDED" or record["status"] not in TERMINAL_STATUSES):
+            logger.info(f"Reusing Apify run {record['run_id']} ({record['status']}) for input: {run_input}")
+            return {**_run_handle(record), "reused": True}
+
+    logger.info(f"Starting Apify crawl with input: {run_input}")
+    response = await get_policy('apify').request(
+        "POST",
+        f"{APIFY_API_URL}/acts/{ACTOR_ID}/runs",
+        params={"waitForFinish": wait, **_webhooks_param()},
+        headers=_auth_headers(),
+        json=run_input,
+        timeout=wait + 30
+    )
+    response.raise_for_status()
+    run = response.json()["data"]
+    await asyncio.to_thread(apify_run_store.save_run, run_input, run)
+    record = await asyncio.to_thread(apify_run_store.get_run, run["id"])
+    return {**_run_handle(record), "reused": False}
+
+
+async def start_apify_run(category: str, location: str, max_places: int = APIFY_PAGINATED_MAX_PLACES,
+                          refresh: bool = False, wait: int = 0) -> dict:
+    """
+    Start a compass/crawler-google-places crawl without waiting for it, or reuse
+    the crawl of an identical search (same category, location and language, at
+    least as many places) that is still running or succeeded within
+    APIFY_DATASET_MAX_AGE.
+
+    :param max_places: Places to crawl
+    :param refresh: Always start a new crawl
+    :param wait: Seconds the start request may wait for a new crawl to finish
+    :return: Run handle: run_id, status, dataset_id, search input, timestamps, and
+        whether an earlier crawl was reused
+    :raises UpstreamError: Apify is rate limiting or unavailable
+    """
+    run_input = _run_input(category, location, max_places)
+    key = f"{run_input_key(run_input)}:{max_places}:{int(refresh)}"
+    return await apify_starts.do(key, _start_or_reuse, run_input, refresh, wait)
+
+
+async def get_apify_run(run_id: str, wait: int = 0):
+    """
+    Get a crawl's handle, asking Apify for its current status while it is not
+    finished.
+
+    :param wait: Seconds to wait for an unfinished crawl to finish
+    :return: Run handle, or None for a run this app did not start
+    :raises UpstreamError: Apify is rate limiting or unavailable
+    """
+    record = await asyncio.to_thread(apify_run_store.get_run, run_id)
+    if record is None:
+        return None
+    if record["status"] not in TERMINAL_STATUSES:
+        run = await _get_run(run_id, wait)
+        await asyncio.to_thread(apify_run_store.set_status, run_id, run["status"])
+        record = await asyncio.to_thread(apify_run_store.get_run, run_id)
+    return _run_handle(record)
+
+
+async def handle_apify_webhook(payload: dict):
+    """
+    Update a crawl from an Apify webhook notification. The status is read back
+    from the Apify API rather than taken from the request body.
+
+    :param payload: Webhook body (the default payload template)
+    :return: Run handle, or None for a run this app did not start
+    """
+    run_id = (payload.get("resource") or {}).get("id") or (payload.get("eventData") or {}).get("actorRunId")
+    if not run_id:
+        return None
+    logger.info(f"Apify webhook {payload.get('eventType')} for run {run_id}")
+    return await get_apify_run(run_id)
+
+
+async def _read_dataset(dataset_id: str, offset: int, limit: int) -> list:
+    response = await get_policy('apify').request(
+        "GET",
+        f"{APIFY_API_URL}/datasets/{dataset_id}/items",
+        params={"offset": offset, "limit": limit, "clean": "true"},
+        headers=_auth_headers()
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def _is_low_rated(item: dict) -> bool:
+    score = item.get("totalScore", 5)
+    return bool(score) and score <= 3.0
+
+
+def _parse_item(item: dict) -> dict:
+    return Business.from_apify(item).to_dict()
+
+
+async def iterate_dataset_items(dataset_id: str, page_size: int = DATASET_PAGE_SIZE):
+    """
+    Lazily yield items from an Apify dataset, one page request at a time.
+    """
+    offset = 0
+    while True:
+        items = await _read_dataset(dataset_id, offset, page_size)
+        for item in items:
+            yield item
+        if len(items) < page_size:
+            return
+        offset += len(items)
+
+
+async def get_apify_run_results(run: dict, limit: int = None) -> list:
+    """
+    Low-rated places (rating <= 3.0) in a finished crawl's dataset.
+
+    :param run: Run handle (see get_apify_run)
+    :param limit: Stop after this many places
+    """
+    results = []
+    async for item in iterate_dataset_items(run["dataset_id"]):
+        if _is_low_rated(item):
+            results.append(_parse_item(item))
+            if limit and len(results) >= limit:
+                break
+    return results
+
+
+async def iter_apify_low_rated_places(category: str, location: str, max_results: int = 5, return_limit: int = 5,
+                                      refresh: bool = False):
+    """
+    Yield low-rated places (rating <= 3.0) from a compass/crawler-google-places run as
+    each dataset item is read, stopping after `return_limit`. Upstream errors propagate
+    to the caller.
+
+    :param refresh: Start a new crawl rather than reusing one of the same search
+    """
+    run = await start_apify_run(category, location, max_results, refresh=refresh, wait=WAIT_FOR_FINISH)
+    # Long-poll until the crawl finishes, without blocking the event loop
+    while run["status"] not in TERMINAL_STATUSES:
+        run = await get_apify_run(run["run_id"], WAIT_FOR_FINISH)
+    if run["status"] != "SUCCEEDED":
+        raise RuntimeError(f"Apify run {run['run_id']} finished with status {run['status']}")
+    found = 0
+    async for item in iterate_dataset_items(run["dataset_id"]):
+        if _is_low_rated(item):
+            found += 1
+            yield _parse_item(item)
+        if found >= return_limit:
+            break
+
+
+@cached('apify')
+async def get_apify_low_rated_places(category: str, location: str, max_results: int = 5, return_limit: int = 5,
+                                     refresh: bool = False):
     """
     Fetch businesses from Apify's compass/crawler-google-places actor, filter for rating <= 3.0, and return up to 5 structured results. Only crawl up to 5 places to minimize credit usage.
     """
     try:
-        client = ApifyClient(APIFY_TOKEN)
-        run_input = {
-            "searchStringsArray": [category],
-            "locationQuery": location,
-            "maxCrawledPlacesPerSearch": max_results,
-            "language": "en"
-        }
-        logger.info(f"Calling Apify actor with input: {run_input}")
-        run = client.actor("compass/crawler-google-places").call(run_input=run_input)
-        filtered_results = []
-        for item in client.dataset(run["defaultDatasetId"]).iterate_items():
-            score = item.get("totalScore", 5)
-            if score and score <= 3.0:
-                filtered_results.append({
-                    "name": item.get("title"),
-                    "address": item.get("address"),
-                    "rating": score,
-                    "reviews_count": item.get("reviewsCount"),
-                    "phone": item.get("phone"),
-                    "website": item.get("website"),
-                    "reviews": []
-                })
-            if len(filtered_results) >= return_limit:
-                break
+        filtered_results = [
+            place async for place in iter_apify_low_rated_places(
+                category, location, max_results, return_limit, refresh=refresh
+            )
+        ]
         logger.info(f"Apify: {len(filtered_results)} low-rated places found (limited to {return_limit}).")
         return filtered_results
+    except UpstreamError:
+        # Rate limits and outages are reported to the caller, not shown as "no results"
+        raise
     except Exception as e:
         logger.error(f"Apify error: {str(e)}")
-        return [] 
\ No newline at end of file
+        return []
+
+
+async def get_apify_low_rated_page(category: str, location: str, run_id: str = None, dataset_id: str = None,
+                                   offset: int = 0, page_size: int = 5, refresh: bool = False) -> dict:
+    """
+    Get one page of low-rated places from a paginated Apify crawl.
+
+    The first page starts a crawl of up to APIFY_PAGINATED_MAX_PLACES places without
+    waiting for it to finish; each page reads the crawl's dataset from `offset`,
+    long-polling the run only when it needs items that are not crawled yet.
+
+    :param run_id: Run of the crawl (None for the first page)
+    :param dataset_id: Dataset of the crawl (None for the first page)
+    :param offset: Dataset items already read by earlier pages
+    :param page_size: Low-rated places per page
+    :param refresh: Start a new crawl rather than reusing one of the same search
+    :return: {"results": [...], "run_id", "dataset_id", "next_offset": None after the last page}
+    :raises UpstreamError: Apify is rate limiting, unavailable or rejected the request, or the crawl failed
+    """
+    with provider_errors('apify'):
+        if run_id is None:
+            run = await start_apify_run(category, location, APIFY_PAGINATED_MAX_PLACES, refresh=refresh)
+            run_id, dataset_id = run["run_id"], run["dataset_id"]
+            finished = run["status"] in TERMINAL_STATUSES
+        else:
+            finished = False
+
+        results = []
+        exhausted = False
+        while len(results) < page_size:
+            items = await _read_dataset(dataset_id, offset, DATASET_PAGE_SIZE)
+            for item in items:
+                offset += 1
+                if _is_low_rated(item):
+                    results.append(_parse_item(item))
+                    if len(results) >= page_size:
+                        break
+            if len(results) >= page_size:
+                break
+            if len(items) < DATASET_PAGE_SIZE:
+                if finished:
+                    exhausted = True
+                    break
+                run = await _get_run(run_id, APIFY_PAGE_WAIT)
+                await asyncio.to_thread(apify_run_store.set_status, run_id, run["status"])
+                finished = run.get("status") in TERMINAL_STATUSES
+                if finished and run["status"] != "SUCCEEDED" and not results:
+                    raise provider_error('apify', f"Apify run {run_id} finished with status {run['status']}")
+
+    return {
+        "results": results,
+        "run_id": run_id,
+        "dataset_id": dataset_id,
+        "next_offset": None if exhausted else offset
+    }
+
+
+# Streaming search mode: same cache entries as get_apify_low_rated_places
+stream_apify_low_rated_places = cached_stream('apify', 'get_apify_low_rated_places')(iter_apify_low_rated_places)
@@ -0,0 +1,126 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from dotenv import load_dotenv
+from app.cache import connect_sqlite
+
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+APIFY_RUNS_PATH = os.getenv('APIFY_RUNS_PATH', 'data/apify_runs.sqlite3')
+# How long a finished crawl's dataset is reused for identical searches. Apify deletes
+# unnamed datasets after the plan's retention period (7 days on most plans).
+APIFY_DATASET_MAX_AGE = int(os.getenv('APIFY_DATASET_MAX_AGE', '86400'))
+
+TERMINAL_STATUSES = {"SUCCEEDED", "FAILED", "ABORTED", "TIMED-OUT"}
+
+
+def run_input_key(run_input: dict) -> str:
+    """
+    Key identifying a crawl by what it searches for, so identical searches share
+    one dataset. The crawl size is compared separately (a larger crawl serves a
+    smaller request).
+    """
+    search = {
+        'searchStringsArray': sorted(s.strip().lower() for s in run_input.get('searchStringsArray') or []),
+        'locationQuery': (run_input.get('locationQuery') or '').strip().lower(),
+        'language': run_input.get('language') or 'en',
+    }
+    return hashlib.sha256(json.dumps(search, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class ApifyRunStore:
+    """
+    SQLite record of the Apify crawls this app started: their input, status and
+    dataset. Lets clients follow a run by id and lets identical searches reuse a
+    finished dataset instead of crawling again.
+    """
+
+    COLUMNS = ('run_id', 'input_key', 'run_input', 'max_places', 'dataset_id', 'status', 'started_at', 'finished_at')
+
+    def __init__(self, path: str = APIFY_RUNS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = connect_sqlite(self.path)
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS apify_runs ('
+                'run_id TEXT PRIMARY KEY, input_key TEXT NOT NULL, run_input TEXT NOT NULL, '
+                'max_places INTEGER NOT NULL, dataset_id TEXT NOT NULL, status TEXT NOT NULL, '
+                'started_at REAL NOT NULL, finished_at REAL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_apify_runs_input ON apify_runs (input_key, started_at)')
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _row(self, row) -> dict:
+        if row is None:
+            return None
+        run = dict(zip(self.COLUMNS, row))
+        run['run_input'] = json.loads(run['run_input'])
+        return run
+
+    def save_run(self, run_input: dict, run: dict):
+        """Record a run just started (or found running) from its Apify run object."""
+        finished_at = time.time() if run.get('status') in TERMINAL_STATUSES else None
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                'INSERT OR REPLACE INTO apify_runs '
+                '(run_id, input_key, run_input, max_places, dataset_id, status, started_at, finished_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (run['id'], run_input_key(run_input), json.dumps(run_input),
+                 int(run_input.get('maxCrawledPlacesPerSearch') or 0), run['defaultDatasetId'],
+                 run.get('status') or 'READY', time.time(), finished_at)
+            )
+            conn.commit()
+
+    def set_status(self, run_id: str, status: str):
+        finished_at = time.time() if status in TERMINAL_STATUSES else None
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                'UPDATE apify_runs SET status = ?, finished_at = COALESCE(finished_at, ?) WHERE run_id = ?',
+                (status, finished_at, run_id)
+            )
+            conn.commit()
+
+    def get_run(self, run_id: str):
+        with self._lock:
+            row = self._connect().execute(
+                f'SELECT {", ".join(self.COLUMNS)} FROM apify_runs WHERE run_id = ?', (run_id,)
+            ).fetchone()
+        return self._row(row)
+
+    def find_reusable(self, run_input: dict, max_age: float = APIFY_DATASET_MAX_AGE):
+        """
+        Latest crawl of the same search at least as large as `run_input` asks for
+        that either succeeded within `max_age` or is still running.
+
+        :return: Run record, or None
+        """
+        placeholders = ', '.join('?' for _ in TERMINAL_STATUSES)
+        with self._lock:
+            row = self._connect().execute(
+                f'SELECT {", ".join(self.COLUMNS)} FROM apify_runs '
+                'WHERE input_key = ? AND max_places >= ? '
+                f"AND ((status = 'SUCCEEDED' AND finished_at >= ?) OR status NOT IN ({placeholders})) "
+                'ORDER BY started_at DESC LIMIT 1',
+                (run_input_key(run_input), int(run_input.get('maxCrawledPlacesPerSearch') or 0),
+                 time.time() - max_age, *sorted(TERMINAL_STATUSES))
+            ).fetchone()
+        return self._row(row)
+
+
+apify_run_store = ApifyRunStore()
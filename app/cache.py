@@ -0,0 +1,360 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import inspect
+import logging
+import sqlite3
+import functools
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = os.getenv('CACHE_PATH', 'data/cache.sqlite3')
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '5000'))
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv('ANALYSIS_CACHE_MAX_ENTRIES', '1000'))
+# Streams longer than this are passed through without being cached
+STREAM_CACHE_MAX_ITEMS = int(os.getenv('STREAM_CACHE_MAX_ITEMS', '500'))
+# Seconds a write waits for another thread or worker process holding the database lock
+SQLITE_BUSY_TIMEOUT = 10.0
+
+# Default time-to-live per provider, in seconds. Override with CACHE_TTL_<PROVIDER>.
+DEFAULT_TTLS = {
+    'outscraper': 24 * 3600,
+    'google_places': 24 * 3600,
+    'apify': 7 * 24 * 3600,
+    'trustpilot': 6 * 3600,
+    'openai': 7 * 24 * 3600,
+}
+
+# Version of the value shape cached per provider, bumped when it changes so entries
+# written in the old shape are missed rather than read back. Trustpilot reviews
+# became app.models.Review dicts in version 2.
+SCHEMA_VERSIONS = {
+    'trustpilot': 2,
+}
+
+
+def provider_ttl(provider: str) -> int:
+    """
+    Get the cache TTL for a provider, honouring CACHE_TTL_<PROVIDER> overrides.
+
+    :param provider: Provider name
+    :return: TTL in seconds
+    """
+    override = os.getenv(f'CACHE_TTL_{provider.upper()}')
+    if override:
+        return int(override)
+    return DEFAULT_TTLS.get(provider, 3600)
+
+
+def normalize_value(value):
+    """
+    Normalize a call argument so equivalent searches share a cache key:
+    strings are lowercased with collapsed whitespace, containers recursively.
+    """
+    if isinstance(value, str):
+        return ' '.join(value.lower().split())
+    if isinstance(value, (list, tuple)):
+        return [normalize_value(item) for item in value]
+    if isinstance(value, dict):
+        return {key: normalize_value(item) for key, item in value.items()}
+    return value
+
+
+def connect_sqlite(path: str, autocommit: bool = False) -> sqlite3.Connection:
+    """
+    Open a SQLite database shared between threads and worker processes: WAL
+    journaling lets readers proceed during a write, and writers wait for the
+    lock instead of failing with "database is locked".
+
+    :param path: Database file path (its directory is created if needed)
+    :param autocommit: Disable implicit transactions, for explicit BEGIN IMMEDIATE
+    :return: Connection
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(
+        path, timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False, isolation_level=None if autocommit else ''
+    )
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+def make_key(provider: str, name: str, params: dict) -> str:
+    """
+    Build a stable cache key from provider, function name and normalized parameters.
+    """
+    key = {'provider': provider, 'name': name, 'params': normalize_value(params)}
+    if provider in SCHEMA_VERSIONS:
+        key['schema'] = SCHEMA_VERSIONS[provider]
+    payload = json.dumps(key, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    SQLite-backed cache with per-entry expiry and size-bounded LRU eviction.
+    Entries survive restarts; hit/miss counters are kept per provider.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES, table: str = 'cache'):
+        self.path = path
+        self.max_entries = max_entries
+        self.table = table
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = connect_sqlite(self.path)
+            conn.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.table} ('
+                'key TEXT PRIMARY KEY, provider TEXT NOT NULL, value TEXT NOT NULL, '
+                'created_at REAL NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{self.table}_accessed ON {self.table} (accessed_at)')
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _count(self, provider: str, outcome: str):
+        counters = self.stats.setdefault(provider, {'hits': 0, 'misses': 0})
+        counters[outcome] += 1
+
+    def get_sync(self, key: str, provider: str):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(f'SELECT value, expires_at FROM {self.table} WHERE key = ?', (key,)).fetchone()
+            if row is None or row[1] <= now:
+                if row is not None:
+                    conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+                    conn.commit()
+                self._count(provider, 'misses')
+                return None
+            conn.execute(f'UPDATE {self.table} SET accessed_at = ? WHERE key = ?', (now, key))
+            conn.commit()
+            self._count(provider, 'hits')
+        return json.loads(row[0])
+
+    def set_sync(self, key: str, provider: str, value, ttl: int):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                f'INSERT OR REPLACE INTO {self.table} (key, provider, value, created_at, expires_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, provider, json.dumps(value), now, now + ttl, now)
+            )
+            conn.execute(f'DELETE FROM {self.table} WHERE expires_at <= ?', (now,))
+            conn.execute(
+                f'DELETE FROM {self.table} WHERE key IN ('
+                f'SELECT key FROM {self.table} ORDER BY accessed_at ASC '
+                f'LIMIT MAX(0, (SELECT COUNT(*) FROM {self.table}) - ?))',
+                (self.max_entries,)
+            )
+            conn.commit()
+
+    def clear_sync(self, provider: str = None):
+        with self._lock:
+            conn = self._connect()
+            if provider:
+                conn.execute(f'DELETE FROM {self.table} WHERE provider = ?', (provider,))
+            else:
+                conn.execute(f'DELETE FROM {self.table}')
+            conn.commit()
+
+    async def get(self, key: str, provider: str):
+        return await asyncio.to_thread(self.get_sync, key, provider)
+
+    async def set(self, key: str, provider: str, value, ttl: int = None):
+        ttl = provider_ttl(provider) if ttl is None else ttl
+        await asyncio.to_thread(self.set_sync, key, provider, value, ttl)
+
+    async def clear(self, provider: str = None):
+        await asyncio.to_thread(self.clear_sync, provider)
+
+    def get_stats(self) -> dict:
+        """
+        Get hit/miss counters per provider plus the current entry count.
+        """
+        with self._lock:
+            entries = self._connect().execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+        providers = {}
+        for provider, counters in self.stats.items():
+            total = counters['hits'] + counters['misses']
+            providers[provider] = {
+                **counters,
+                'hit_ratio': round(counters['hits'] / total, 3) if total else 0.0
+            }
+        return {'entries': entries, 'max_entries': self.max_entries, 'providers': providers}
+
+
+result_cache = ResultCache()
+
+# Parsed OpenAI analyses, keyed by a hash of the exact request (see ai_analyzer)
+analysis_cache = ResultCache(max_entries=ANALYSIS_CACHE_MAX_ENTRIES, table='analysis_cache')
+
+
+async def _cache_lookup(key: str, provider: str):
+    try:
+        return await result_cache.get(key, provider)
+    except Exception as e:
+        logger.error(f"Cache read failed for {provider}: {e}")
+        return None
+
+
+async def _cache_store(key: str, provider: str, value):
+    try:
+        await result_cache.set(key, provider, value)
+    except Exception as e:
+        logger.error(f"Cache write failed for {provider}: {e}")
+
+
+async def read_cached(func, *args, **kwargs):
+    """
+    Read the value a @cached function has cached for these arguments, without
+    calling it.
+
+    :param func: A @cached function (or a decorator stacked on one)
+    :return: The cached value, or None
+    """
+    return await _cache_lookup(func.cache_key(*args, **kwargs), func.cache_provider)
+
+
+async def store_cached(func, value, *args, **kwargs):
+    """
+    Store a value as a @cached function's result for these arguments, e.g. one
+    item of a batched fetch, so later calls of the function read it. Empty values
+    are not stored, as with @cached.
+
+    :param func: A @cached function (or a decorator stacked on one)
+    :param value: The function's result for these arguments
+    """
+    if not _is_empty(value):
+        await _cache_store(func.cache_key(*args, **kwargs), func.cache_provider, value)
+
+
+def _call_key(signature, provider: str, name: str, args: tuple, kwargs: dict) -> str:
+    # A refresh changes how the value is fetched, not which value it is
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    bound.arguments.pop('refresh', None)
+    return make_key(provider, name, dict(bound.arguments))
+
+
+def _is_empty(result) -> bool:
+    """Whether a provider result holds nothing worth caching: no value, or a page without results."""
+    if isinstance(result, dict) and 'results' in result:
+        return not result['results']
+    return not result
+
+
+def cached(provider: str, name: str = None):
+    """
+    Decorator caching an async provider function's result in the shared ResultCache.
+
+    The key covers the provider, the function and its normalized arguments (defaults
+    included). Pass `refresh=True` to bypass the cached value and store a fresh one;
+    it is passed on to functions that take a `refresh` parameter of their own.
+    Empty results, and pages ({"results": [...], ...}) without results, are not
+    cached: an empty answer may be a transient miss and is cheap to recompute.
+    Concurrent misses for the same key share one upstream call (across worker
+    processes too, when shared state is enabled).
+
+    :param provider: Provider name used for the key, TTL lookup and statistics
+    :param name: Key name (default: the function's qualified name)
+    """
+    # Imported here: app.singleflight builds its keys with make_key from this module
+    from app.singleflight import SingleFlight
+
+    def decorator(func):
+        signature = inspect.signature(func)
+        forward_refresh = 'refresh' in signature.parameters
+        key_name = name or func.__qualname__
+        flights = SingleFlight(f'{provider}.{key_name}')
+
+        @functools.wraps(func)
+        async def wrapper(*args, refresh: bool = False, **kwargs):
+            if forward_refresh:
+                kwargs['refresh'] = refresh
+            key = _call_key(signature, provider, key_name, args, kwargs)
+
+            if not refresh:
+                hit = await _cache_lookup(key, provider)
+                if hit is not None:
+                    logger.info(f"Cache hit for {provider}.{func.__name__}")
+                    return hit
+
+            async def fetch():
+                result = await func(*args, **kwargs)
+                if not _is_empty(result):
+                    await _cache_store(key, provider, result)
+                return result
+
+            return await flights.do(key, fetch, fresh=refresh)
+
+        def cache_key(*args, **kwargs) -> str:
+            kwargs.pop('refresh', None)
+            return _call_key(signature, provider, key_name, args, kwargs)
+
+        wrapper.singleflight = flights
+        wrapper.cache_key = cache_key
+        wrapper.cache_provider = provider
+        return wrapper
+    return decorator
+
+
+def cached_stream(provider: str, name: str, max_items: int = STREAM_CACHE_MAX_ITEMS):
+    """
+    Async-generator counterpart of @cached. Items are yielded as the wrapped
+    generator produces them; a cached list is replayed item by item instead.
+
+    Sharing `name` with a @cached list function over the same parameters makes both
+    read and write the same entry. `refresh` is passed on as with @cached. A fully consumed stream is stored only when it
+    held at most `max_items` items, so large streams are never buffered whole.
+
+    :param provider: Provider name used for the key, TTL lookup and statistics
+    :param name: Key name of the matching @cached list function
+    :param max_items: Largest stream that is buffered for caching
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        forward_refresh = 'refresh' in signature.parameters
+
+        @functools.wraps(func)
+        async def wrapper(*args, refresh: bool = False, **kwargs):
+            if forward_refresh:
+                kwargs['refresh'] = refresh
+            key = _call_key(signature, provider, name, args, kwargs)
+
+            if not refresh:
+                hit = await _cache_lookup(key, provider)
+                if hit is not None:
+                    logger.info(f"Cache hit for {provider}.{func.__name__}")
+                    for item in hit:
+                        yield item
+                    return
+
+            collected = []
+            async for item in func(*args, **kwargs):
+                if collected is not None:
+                    collected.append(item)
+                    if len(collected) > max_items:
+                        collected = None
+                yield item
+            if collected:
+                await _cache_store(key, provider, collected)
+
+        return wrapper
+    return decorator
@@ -0,0 +1,231 @@
+import os
+import zlib
+import asyncio
+import hashlib
+import logging
+from dotenv import load_dotenv
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+
+try:
+    import brotli
+except ImportError:
+    # Optional: without the brotli package, responses are gzip-compressed only
+    brotli = None
+
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Responses smaller than this are sent uncompressed (the framing costs more than it saves)
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '500'))
+# Levels for pages and JSON, compressed per response (fast settings)
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', '4'))
+# Levels for static files, compressed once per file version and kept in memory
+STATIC_GZIP_LEVEL = int(os.getenv('STATIC_GZIP_LEVEL', '9'))
+STATIC_BROTLI_QUALITY = int(os.getenv('STATIC_BROTLI_QUALITY', '11'))
+# Browser cache lifetime of versioned static URLs (static_url adds the version)
+STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', str(365 * 86400)))
+
+COMPRESSIBLE_TYPES = ('text/html', 'text/css', 'text/plain', 'text/csv', 'application/json',
+                      'application/javascript', 'text/javascript', 'application/x-ndjson', 'image/svg+xml')
+
+
+def negotiate_encoding(accept_encoding: str):
+    """
+    Pick the response encoding from an Accept-Encoding header: brotli when the
+    client accepts it and the brotli package is installed, else gzip.
+
+    :return: 'br', 'gzip' or None
+    """
+    accepted = {}
+    for part in accept_encoding.lower().split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                continue
+        accepted[name.strip()] = quality
+    if brotli is not None and accepted.get('br', 0) > 0:
+        return 'br'
+    if accepted.get('gzip', 0) > 0:
+        return 'gzip'
+    return None
+
+
+def is_compressible(headers) -> bool:
+    """Whether a response with these headers is worth compressing (and not already encoded)."""
+    if 'content-encoding' in headers:
+        return False
+    media_type = headers.get('content-type', '').split(';')[0].strip().lower()
+    return media_type in COMPRESSIBLE_TYPES
+
+
+def weak_etag(etag: str) -> str:
+    """
+    Weaken an ETag for a compressed representation. If-None-Match comparison is
+    weak, so the client's revalidations still match the uncompressed ETag.
+    """
+    return etag if etag.startswith('W/') else f'W/{etag}'
+
+
+class Compressor:
+    """Incremental gzip or brotli compressor whose output can be flushed per chunk."""
+
+    def __init__(self, encoding: str, level: int = None):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY if level is None else level)
+        else:
+            # wbits 31: gzip container
+            self._zlib = zlib.compressobj(GZIP_LEVEL if level is None else level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        """Compress a chunk; with `flush`, everything so far can be decoded by the client."""
+        if self.encoding == 'br':
+            return self._brotli.process(data) + (self._brotli.flush() if flush else b'')
+        return self._zlib.compress(data) + (self._zlib.flush(zlib.Z_SYNC_FLUSH) if flush else b'')
+
+    def finish(self) -> bytes:
+        if self.encoding == 'br':
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+def compress(data: bytes, encoding: str, level: int = None) -> bytes:
+    compressor = Compressor(encoding, level)
+    return compressor.compress(data) + compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing HTML, CSS, JSON and other text responses with
+    brotli or gzip, as the client accepts. Streamed responses (chunked results
+    pages) are flushed chunk by chunk, so each business card still reaches the
+    browser as soon as it is rendered. Server-Sent Events and responses that are
+    already encoded pass through.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get('accept-encoding', ''))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, compressor, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message['type'] == 'http.response.start':
+                # Held back until the first body chunk shows whether it is worth compressing
+                start = message
+                return
+            if message['type'] != 'http.response.body':
+                await send(message)
+                return
+
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+            if compressor is None:
+                headers = MutableHeaders(raw=list(start['headers']))
+                if (start['status'] < 200 or start['status'] in (204, 304) or not is_compressible(headers)
+                        or (not more_body and len(body) < self.minimum_size)):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = Compressor(encoding)
+                headers['content-encoding'] = encoding
+                headers.add_vary_header('Accept-Encoding')
+                if 'etag' in headers:
+                    headers['etag'] = weak_etag(headers['etag'])
+                if more_body:
+                    del headers['content-length']
+                    body = compressor.compress(body, flush=True)
+                else:
+                    body = compressor.compress(body) + compressor.finish()
+                    headers['content-length'] = str(len(body))
+                await send({**start, 'headers': headers.raw})
+                await send({'type': 'http.response.body', 'body': body, 'more_body': more_body})
+                return
+
+            body = compressor.compress(body, flush=True) if more_body else compressor.compress(body) + compressor.finish()
+            await send({'type': 'http.response.body', 'body': body, 'more_body': more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+def static_url(path: str, directory: str = 'static') -> str:
+    """
+    URL of a static file with a version derived from its size and modification
+    time, so it can be cached for STATIC_MAX_AGE and still change on deploy.
+    """
+    stat_result = os.stat(os.path.join(directory, path))
+    version = hashlib.md5(f'{stat_result.st_mtime}-{stat_result.st_size}'.encode(), usedforsecurity=False).hexdigest()
+    return f'/static/{path}?v={version[:12]}'
+
+
+class CompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles that serves brotli or gzip versions of text assets, compressed
+    once per file version at the highest levels and kept in memory, and sets
+    Cache-Control: versioned URLs (?v=, from static_url) are immutable, others
+    are revalidated with ETag/Last-Modified (304 Not Modified when unchanged).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (path, mtime, size, encoding) -> compressed bytes
+        self._compressed = {}
+
+    def _compress_file(self, full_path: str, stat_result: os.stat_result, encoding: str) -> bytes:
+        key = (full_path, stat_result.st_mtime, stat_result.st_size, encoding)
+        if key not in self._compressed:
+            with open(full_path, 'rb') as file:
+                data = file.read()
+            level = STATIC_BROTLI_QUALITY if encoding == 'br' else STATIC_GZIP_LEVEL
+            # Older versions of the file are dropped
+            for old in [old for old in self._compressed if old[0] == full_path and old[3] == encoding]:
+                del self._compressed[old]
+            self._compressed[key] = compress(data, encoding, level)
+            logger.info(f"Compressed {full_path} with {encoding}: {len(data)} -> {len(self._compressed[key])} bytes")
+        return self._compressed[key]
+
+    async def get_response(self, path: str, scope) -> Response:
+        response = await super().get_response(path, scope)
+        request_headers = Headers(scope=scope)
+        if 'v=' in scope.get('query_string', b'').decode('latin-1'):
+            response.headers['cache-control'] = f'public, max-age={STATIC_MAX_AGE}, immutable'
+        else:
+            response.headers['cache-control'] = 'no-cache'
+        response.headers.add_vary_header('Accept-Encoding')
+
+        encoding = negotiate_encoding(request_headers.get('accept-encoding', ''))
+        if (not isinstance(response, FileResponse) or response.status_code != 200 or encoding is None
+                or not is_compressible(response.headers) or response.stat_result is None
+                or response.stat_result.st_size < COMPRESS_MIN_SIZE):
+            return response
+
+        body = await asyncio.to_thread(self._compress_file, response.path, response.stat_result, encoding)
+        headers = MutableHeaders(raw=[(name, value) for name, value in response.headers.raw if name != b'content-length'])
+        headers['content-encoding'] = encoding
+        headers['etag'] = weak_etag(headers['etag'])
+        return Response(body, status_code=200, headers=dict(headers))
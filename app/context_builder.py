@@ -0,0 +1,282 @@
+import os
+import re
+import math
+from collections import Counter
+import logging
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from app.serp_search import format_results_for_ai
+from app.negativity import negativity_score
+
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Estimated prompt tokens available for web mentions and reviews
+AI_CONTEXT_TOKEN_BUDGET = int(os.getenv('AI_CONTEXT_TOKEN_BUDGET', '2500'))
+# Longest single snippet or review, in estimated tokens, before it is truncated
+AI_CONTEXT_MAX_ITEM_TOKENS = int(os.getenv('AI_CONTEXT_MAX_ITEM_TOKENS', '200'))
+# Estimated tokens of mentions and reviews per chunk of a map-reduce analysis
+AI_CHUNK_TOKEN_BUDGET = int(os.getenv('AI_CHUNK_TOKEN_BUDGET', str(AI_CONTEXT_TOKEN_BUDGET)))
+# Below this many estimated tokens of (de-duplicated) mentions and reviews, one
+# prompt holds the best-ranked of them; above it, all are analyzed by map-reduce
+AI_MAP_REDUCE_MIN_TOKENS = int(os.getenv('AI_MAP_REDUCE_MIN_TOKENS', str(4 * AI_CONTEXT_TOKEN_BUDGET)))
+# Jaccard similarity of word 3-grams above which two snippets or reviews count as near-duplicates
+NEAR_DUPLICATE_THRESHOLD = 0.8
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_WORD_PATTERN = re.compile(r"[a-z0-9']+")
+_DATE_FORMATS = ['%m/%d/%Y %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d', '%b %d, %Y', '%B %d, %Y']
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the token count of a text without a tokenizer: one token per
+    punctuation mark and per four characters of each word (rounded up), which
+    slightly overestimates GPT tokenizers on English prose.
+
+    :param text: Any text
+    :return: Estimated token count
+    """
+    return sum(math.ceil(len(piece) / 4) for piece in _TOKEN_PATTERN.findall(text or ''))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut a text at a word boundary so it fits within `max_tokens` estimated tokens.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    words = (text or '').split()
+    kept, used = [], 0
+    for word in words:
+        cost = estimate_tokens(word)
+        if used + cost > max_tokens - 1:
+            break
+        kept.append(word)
+        used += cost
+    return ' '.join(kept) + ' …'
+
+
+def parse_date(value: str):
+    """
+    Parse the review and search-result date formats the providers return.
+
+    :return: Unix timestamp, or None if the date is missing or unrecognized
+    """
+    value = (value or '').strip()
+    for date_format in _DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).replace(tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+def recency(value: str, now: float) -> float:
+    """1.0 for today, falling linearly to 0 for items two years old or undated."""
+    timestamp = parse_date(value)
+    if timestamp is None:
+        return 0.0
+    return max(0.0, 1 - (now - timestamp) / (730 * 86400))
+
+
+def _shingles(text: str) -> frozenset:
+    """Word 3-grams of a text (its words, if it has fewer than three)."""
+    words = _WORD_PATTERN.findall((text or '').lower())
+    if len(words) < 3:
+        return frozenset(words)
+    return frozenset(zip(words, words[1:], words[2:]))
+
+
+class _NearDuplicates:
+    """
+    The texts kept so far, as an index of 3-gram -> texts containing it, so a
+    text is compared only with kept texts it shares a 3-gram with.
+    """
+
+    def __init__(self):
+        self._sizes = []
+        self._index = {}
+
+    def is_duplicate(self, shingles: frozenset) -> bool:
+        # Shared 3-grams per kept text; Jaccard similarity = shared / (|a| + |b| - shared)
+        shared = Counter()
+        for shingle in shingles:
+            shared.update(self._index.get(shingle, ()))
+        size = len(shingles)
+        return any(
+            count / (size + self._sizes[position] - count) >= NEAR_DUPLICATE_THRESHOLD
+            for position, count in shared.items()
+        )
+
+    def add(self, shingles: frozenset):
+        for shingle in shingles:
+            self._index.setdefault(shingle, []).append(len(self._sizes))
+        self._sizes.append(len(shingles))
+
+
+def format_review(review: dict) -> str:
+    return (
+        f"Rating: {review.get('rating') or 'N/A'}/5\n"
+        f"Author: {review.get('author') or 'Anonymous'}\n"
+        f"Review: {review.get('text') or ''}\n"
+        f"Date: {review.get('date') or ''}\n\n"
+    )
+
+
+def build_context(business_name: str, search_results: list, trustpilot_data: list = None,
+                  budget: int = AI_CONTEXT_TOKEN_BUDGET, now: float = None) -> str:
+    """
+    Build the analysis context from web mentions and Trustpilot reviews within a
+    token budget.
+
+    Items are ranked by negativity (weighted keyword score, plus low star ratings for reviews
+    and repeat hits across queries for mentions) and recency; near-duplicates of a
+    higher-ranked item are dropped, long items are truncated, and items are added
+    in rank order while they fit in `budget` estimated tokens.
+
+    :param business_name: Name of the business being analyzed
+    :param search_results: Search result dicts from search_negative_mentions
+    :param trustpilot_data: Optional Trustpilot review dicts
+    :param budget: Estimated token budget for the mentions and reviews
+    :param now: Reference time for recency (default: the current time)
+    :return: Context text for the prompt
+    """
+    now = now if now is not None else datetime.now(timezone.utc).timestamp()
+    candidates = []
+    for index, result in enumerate(search_results or []):
+        text = f"{result.get('title', '')} {result.get('snippet', '')}"
+        negativity = result.get('negativity_score')
+        if negativity is None:
+            negativity = negativity_score(text)
+        score = negativity + len(result.get('search_queries') or []) - 1 + recency(result.get('date'), now)
+        # Syndicated copies share the snippet even when titles differ
+        candidates.append((score, 0, index, 'mention', result, result.get('snippet') or text))
+    for index, review in enumerate(trustpilot_data or []):
+        text = review.get('text') or ''
+        try:
+            stars = max(0.0, 5 - float(review.get('rating')))
+        except (TypeError, ValueError):
+            stars = 0.0
+        score = negativity_score(text) + stars + recency(review.get('date'), now)
+        candidates.append((score, 1, index, 'review', review, text))
+    # Highest score first; ties keep the providers' own order, mentions first
+    candidates.sort(key=lambda candidate: (-candidate[0], candidate[1], candidate[2]))
+
+    mentions, reviews, kept = [], [], _NearDuplicates()
+    used = duplicates = dropped = 0
+    # Heading line of format_results_for_ai, paid once rather than per mention
+    mention_heading = estimate_tokens(f"Web search results for negative mentions of '{business_name}':\n\n")
+    for _, _, _, kind, item, text in candidates:
+        shingles = _shingles(text)
+        if kept.is_duplicate(shingles):
+            duplicates += 1
+            continue
+        if kind == 'mention':
+            item = {**item, 'snippet': truncate_to_tokens(item.get('snippet', ''), AI_CONTEXT_MAX_ITEM_TOKENS)}
+            cost = estimate_tokens(format_results_for_ai([item], business_name)) - mention_heading
+        else:
+            item = {**item, 'text': truncate_to_tokens(item.get('text') or '', AI_CONTEXT_MAX_ITEM_TOKENS)}
+            cost = estimate_tokens(format_review(item))
+        if used + cost > budget:
+            dropped += 1
+            continue
+        used += cost
+        kept.add(shingles)
+        (mentions if kind == 'mention' else reviews).append(item)
+
+    logger.info(
+        f"Context for {business_name}: {len(mentions)} mentions and {len(reviews)} reviews in ~{used} tokens "
+        f"({duplicates} near-duplicates removed, {dropped} over budget)"
+    )
+
+    context = f"Business Name: {business_name}\n\n"
+    context += "=== WEB SEARCH RESULTS ===\n"
+    context += format_results_for_ai(mentions, business_name)
+    if reviews:
+        context += "\n\n=== TRUSTPILOT REVIEWS ===\n"
+        context += ''.join(format_review(review) for review in reviews)
+    return context
+
+
+def build_chunks(business_name: str, search_results: list, trustpilot_data: list = None,
+                 budget: int = AI_CHUNK_TOKEN_BUDGET) -> list:
+    """
+    Split every web mention and Trustpilot review into chunks of at most `budget`
+    estimated tokens, for a map-reduce analysis of more data than one prompt holds.
+
+    Nothing is ranked out: reviews (oldest first, undated last) and mentions (by
+    link) are taken in that order, near-duplicates of an earlier item dropped as in
+    build_context, long items truncated, and the rest packed in order. The order does not depend on the providers' ranking, so a rerun with
+    a few new reviews yields the same chunks up to the newest reviews, and the
+    extractions of those chunks are reused from the memo.
+
+    :param business_name: Name of the business being analyzed
+    :param search_results: Search result dicts from search_negative_mentions
+    :param trustpilot_data: Optional Trustpilot review dicts
+    :param budget: Estimated token budget per chunk
+    :return: List of (mentions, reviews) pairs, one per chunk; a single chunk if everything fits in `budget`
+    """
+    def review_order(review: dict) -> tuple:
+        timestamp = parse_date(review.get('date'))
+        return timestamp is None, timestamp or 0, review.get('text') or '', str(review.get('author') or '')
+
+    items, kept = [], _NearDuplicates()
+
+    def is_duplicate(text: str) -> bool:
+        shingles = _shingles(text)
+        if kept.is_duplicate(shingles):
+            return True
+        kept.add(shingles)
+        return False
+
+    for review in sorted(trustpilot_data or [], key=review_order):
+        text = review.get('text') or ''
+        if is_duplicate(text):
+            continue
+        item = {**review, 'text': truncate_to_tokens(text, AI_CONTEXT_MAX_ITEM_TOKENS)}
+        items.append(('review', item, estimate_tokens(format_review(item))))
+
+    mention_heading = estimate_tokens(f"Web search results for negative mentions of '{business_name}':\n\n")
+    for result in sorted(search_results or [], key=lambda result: (result.get('link') or '', result.get('title') or '')):
+        if is_duplicate(result.get('snippet') or f"{result.get('title', '')} {result.get('snippet', '')}"):
+            continue
+        item = {**result, 'snippet': truncate_to_tokens(result.get('snippet', ''), AI_CONTEXT_MAX_ITEM_TOKENS)}
+        items.append(('mention', item, estimate_tokens(format_results_for_ai([item], business_name)) - mention_heading))
+
+    chunks, mentions, reviews, used = [], [], [], 0
+    for kind, item, cost in items:
+        if (mentions or reviews) and used + cost > budget:
+            chunks.append((mentions, reviews))
+            mentions, reviews, used = [], [], 0
+        (mentions if kind == 'mention' else reviews).append(item)
+        used += cost
+    if mentions or reviews or not chunks:
+        chunks.append((mentions, reviews))
+    return chunks
+
+
+def needs_map_reduce(business_name: str, chunks: list) -> bool:
+    """
+    Whether chunks from build_chunks hold too much for one ranked, budgeted
+    prompt (more than one chunk and at least AI_MAP_REDUCE_MIN_TOKENS estimated tokens).
+    """
+    if len(chunks) < 2:
+        return False
+    tokens = sum(estimate_tokens(format_chunk(business_name, mentions, reviews)) for mentions, reviews in chunks)
+    return tokens >= AI_MAP_REDUCE_MIN_TOKENS
+
+
+def format_chunk(business_name: str, mentions: list, reviews: list) -> str:
+    """Context text for one chunk from build_chunks, in the sections build_context uses."""
+    context = f"Business Name: {business_name}\n"
+    if mentions:
+        context += "\n=== WEB SEARCH RESULTS ===\n"
+        context += format_results_for_ai(mentions, business_name)
+    if reviews:
+        context += "\n=== TRUSTPILOT REVIEWS ===\n"
+        context += ''.join(format_review(review) for review in reviews)
+    return context
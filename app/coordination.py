@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import uuid
+import socket
+import asyncio
+import logging
+import threading
+from dotenv import load_dotenv
+from app.cache import connect_sqlite
+
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# uvicorn starts this many worker processes (its --workers default)
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+# 'auto' shares in-flight calls and rate budgets between workers when there are several
+SHARED_STATE = os.getenv('SHARED_STATE', 'auto').lower()
+SHARED_STATE_PATH = os.getenv('SHARED_STATE_PATH', 'data/shared.sqlite3')
+
+# A worker running a shared call renews its lease this often; a lease that is not
+# renewed (the worker died) expires and another worker takes the call over
+FLIGHT_LEASE_SECONDS = 30.0
+# How long a finished call's result stays readable by the workers that waited for it
+FLIGHT_RESULT_SECONDS = 30.0
+FLIGHT_POLL_SECONDS = 0.1
+
+# Identifies this process in leases (several containers may share one volume)
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def shared_state_enabled() -> bool:
+    """
+    Whether in-flight calls and rate budgets are coordinated between worker
+    processes through SHARED_STATE_PATH (SHARED_STATE=true, or 'auto' with
+    WEB_CONCURRENCY above 1).
+    """
+    if SHARED_STATE == 'auto':
+        return WEB_CONCURRENCY > 1
+    return SHARED_STATE in ('1', 'true', 'yes')
+
+
+class SharedStore:
+    """
+    SQLite database in WAL mode holding state shared by the worker processes.
+    Each operation is one short BEGIN IMMEDIATE transaction run in a thread.
+    """
+
+    def __init__(self, path: str = SHARED_STATE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            conn = connect_sqlite(self.path, autocommit=True)
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS rate_buckets ('
+                'provider TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS flights ('
+                'key TEXT PRIMARY KEY, owner TEXT NOT NULL, lease_until REAL NOT NULL, '
+                'done INTEGER NOT NULL DEFAULT 0, value TEXT)'
+            )
+            self._conn = conn
+        return self._conn
+
+    def transaction(self, func, *args):
+        """Run `func(conn, *args)` in a write transaction and return its result."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = func(conn, *args)
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+            return result
+
+
+shared_store = SharedStore()
+
+
+def _take_token(conn, provider: str, rate: float, burst: int) -> float:
+    now = time.time()
+    row = conn.execute('SELECT tokens, updated_at FROM rate_buckets WHERE provider = ?', (provider,)).fetchone()
+    tokens = float(burst) if row is None else min(burst, row[0] + max(0.0, now - row[1]) * rate)
+    wait = 0.0
+    if tokens >= 1:
+        tokens -= 1
+    else:
+        wait = (1 - tokens) / rate
+    conn.execute(
+        'INSERT OR REPLACE INTO rate_buckets (provider, tokens, updated_at) VALUES (?, ?, ?)', (provider, tokens, now)
+    )
+    return wait
+
+
+class SharedTokenBucket:
+    """
+    Token bucket whose tokens live in the shared store, so one provider budget
+    holds across every worker process. Same interface as upstream.TokenBucket.
+    """
+
+    def __init__(self, provider: str, rate: float, burst: int, store: SharedStore = shared_store):
+        self.provider = provider
+        self.rate = rate
+        self.burst = burst
+        self.store = store
+        # Waiters in this process queue here, so only one of them polls the store
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a token is available in the shared budget and take it."""
+        async with self._lock:
+            while True:
+                wait = await asyncio.to_thread(
+                    self.store.transaction, _take_token, self.provider, self.rate, self.burst
+                )
+                if not wait:
+                    return
+                await asyncio.sleep(wait)
+
+
+def _claim_flight(conn, key: str, owner: str, reuse_result: bool = True):
+    """
+    Become the worker running `key`, or report its finished result or that it is
+    still running elsewhere.
+
+    :param reuse_result: Accept a result finished within FLIGHT_RESULT_SECONDS
+        (otherwise run the call again)
+    :return: ('run', None), ('done', value) or ('wait', None)
+    """
+    now = time.time()
+    row = conn.execute('SELECT done, value, lease_until FROM flights WHERE key = ?', (key,)).fetchone()
+    if row is not None and row[2] > now:
+        if not row[0]:
+            return 'wait', None
+        if reuse_result:
+            return 'done', json.loads(row[1])
+    conn.execute(
+        'INSERT OR REPLACE INTO flights (key, owner, lease_until, done, value) VALUES (?, ?, ?, 0, NULL)',
+        (key, owner, now + FLIGHT_LEASE_SECONDS)
+    )
+    # Drop leases and results nobody can use any more
+    conn.execute('DELETE FROM flights WHERE lease_until < ?', (now - FLIGHT_RESULT_SECONDS,))
+    return 'run', None
+
+
+def _renew_flight(conn, key: str, owner: str):
+    conn.execute(
+        'UPDATE flights SET lease_until = ? WHERE key = ? AND owner = ? AND done = 0',
+        (time.time() + FLIGHT_LEASE_SECONDS, key, owner)
+    )
+
+
+def _finish_flight(conn, key: str, owner: str, value):
+    if value is None:
+        conn.execute('DELETE FROM flights WHERE key = ? AND owner = ?', (key, owner))
+    else:
+        conn.execute(
+            'UPDATE flights SET done = 1, value = ?, lease_until = ? WHERE key = ? AND owner = ?',
+            (value, time.time() + FLIGHT_RESULT_SECONDS, key, owner)
+        )
+
+
+class SharedFlight:
+    """
+    Cross-process request coalescing: the first worker to claim a key runs the
+    call and publishes its JSON result; workers asking for the same key meanwhile
+    wait and read that result instead of calling the provider again. If the call
+    fails (or its result is not JSON) the others run it themselves.
+    """
+
+    def __init__(self, store: SharedStore = shared_store, owner: str = WORKER_ID):
+        self.store = store
+        self.owner = owner
+        self.stats = {'started': 0, 'joined': 0}
+
+    async def _heartbeat(self, key: str):
+        while True:
+            await asyncio.sleep(FLIGHT_LEASE_SECONDS / 3)
+            await asyncio.to_thread(self.store.transaction, _renew_flight, key, self.owner)
+
+    async def do(self, key: str, func, *args, fresh: bool = False, **kwargs):
+        """
+        Run `func(*args, **kwargs)` unless another worker is already running `key`,
+        in which case wait for its result.
+
+        :param key: Coalescing key, unique across call sites
+        :param func: Coroutine function to run
+        :param fresh: Only join a call still running, never a result already published
+            (for callers asking for a refresh)
+        :return: The call's result, or the result published by another worker
+        """
+        while True:
+            state, value = await asyncio.to_thread(
+                self.store.transaction, _claim_flight, key, self.owner, not fresh
+            )
+            if state == 'run':
+                break
+            if state == 'done':
+                self.stats['joined'] += 1
+                logger.info("Reusing result of a call made by another worker")
+                return value
+            await asyncio.sleep(FLIGHT_POLL_SECONDS)
+
+        self.stats['started'] += 1
+        heartbeat = asyncio.create_task(self._heartbeat(key))
+        published = None
+        try:
+            result = await func(*args, **kwargs)
+            try:
+                published = json.dumps(result)
+            except (TypeError, ValueError):
+                published = None
+            return result
+        finally:
+            heartbeat.cancel()
+            try:
+                await asyncio.to_thread(self.store.transaction, _finish_flight, key, self.owner, published)
+            except Exception as e:
+                logger.error(f"Failed to publish shared call result: {e}")
+
+
+shared_flights = SharedFlight()
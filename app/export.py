@@ -0,0 +1,80 @@
+import io
+import os
+import csv
+import logging
+import orjson
+from dotenv import load_dotenv
+from starlette.responses import StreamingResponse
+
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+SEARCH_EXPORT_COLUMNS = ['name', 'address', 'rating', 'reviews_count', 'website', 'phone']
+# Businesses one search export returns at most; pages are fetched from the provider as the download reaches them
+EXPORT_MAX_ROWS = int(os.getenv('EXPORT_MAX_ROWS', '10000'))
+# Rows are sent in chunks of about this many bytes (the buffer never holds more than one chunk)
+EXPORT_CHUNK_BYTES = int(os.getenv('EXPORT_CHUNK_BYTES', '16384'))
+
+
+def _csv_value(value):
+    # Lists (e.g. key issues) go into one cell
+    if isinstance(value, (list, tuple)):
+        return '; '.join(str(entry) for entry in value)
+    return '' if value is None else value
+
+
+async def csv_lines(rows, columns: list):
+    """
+    Encode rows as CSV, a chunk at a time. Only the chunk being filled is held
+    in memory, however many rows there are.
+
+    :param rows: Async iterable of row dicts (keys outside `columns` are ignored)
+    :param columns: Column names, in order; also the header row
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for row in rows:
+        writer.writerow([_csv_value(row.get(column)) for column in columns])
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+async def ndjson_lines(rows, columns: list):
+    """
+    Encode rows as newline-delimited JSON, one object per row with the keys in
+    `columns`, a chunk at a time like csv_lines.
+    """
+    buffer = bytearray()
+    async for row in rows:
+        buffer += orjson.dumps({column: row.get(column) for column in columns}, default=str)
+        buffer += b'\n'
+        if len(buffer) >= EXPORT_CHUNK_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def export_response(rows, columns: list, format: str, filename: str) -> StreamingResponse:
+    """
+    Stream rows as a CSV or NDJSON download.
+
+    :param rows: Async iterable of row dicts, consumed as the response is sent
+    :param columns: Columns exported, in order
+    :param format: 'csv' or 'ndjson'
+    :param filename: Download file name without extension
+    """
+    body = csv_lines(rows, columns) if format == 'csv' else ndjson_lines(rows, columns)
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{format}"'}
+    )
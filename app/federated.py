@@ -0,0 +1,256 @@
+import os
+import re
+import asyncio
+import logging
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+from app.upstream import UpstreamError
+from app.providers import get_provider, is_configured
+
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Seconds each provider gets before its results are dropped from the page and it is
+# reported as late. Override with FEDERATED_DEADLINE_<PROVIDER>.
+DEFAULT_DEADLINES = {
+    'outscraper': 45.0,
+    'google_places': 10.0,
+    'apify': 60.0,
+}
+
+# Field precedence when merging: earlier providers win for scalar fields
+PROVIDER_ORDER = ['google_places', 'outscraper', 'apify']
+
+MERGED_FIELDS = ['name', 'address', 'rating', 'reviews_count', 'website', 'phone']
+
+_ADDRESS_ABBREVIATIONS = {
+    'street': 'st', 'avenue': 'ave', 'road': 'rd', 'boulevard': 'blvd', 'drive': 'dr',
+    'lane': 'ln', 'suite': 'ste', 'highway': 'hwy', 'north': 'n', 'south': 's',
+    'east': 'e', 'west': 'w',
+}
+
+# Hosts many businesses share (social pages, directories, link-in-bio and map
+# links): a website on one of them never identifies a business for de-duplication
+SHARED_WEBSITE_HOSTS = {
+    'facebook.com', 'fb.com', 'instagram.com', 'twitter.com', 'x.com', 'linkedin.com',
+    'tiktok.com', 'youtube.com', 'yelp.com', 'yellowpages.com', 'tripadvisor.com',
+    'nextdoor.com', 'linktr.ee', 'google.com', 'g.page', 'goo.gl', 'business.site',
+}
+
+# Late provider calls keep running so their results land in the cache
+_background_tasks = set()
+
+
+def provider_deadline(provider: str) -> float:
+    """
+    Get the federated-search deadline for a provider, in seconds.
+    """
+    override = os.getenv(f'FEDERATED_DEADLINE_{provider.upper()}')
+    if override:
+        return float(override)
+    return DEFAULT_DEADLINES.get(provider, 30.0)
+
+
+def configured_providers() -> list:
+    """
+    List the search providers that have credentials configured, in merge order.
+    """
+    return [provider for provider in PROVIDER_ORDER if is_configured(provider)]
+
+
+def _normalize_text(value: str) -> str:
+    return ' '.join(re.sub(r'[^a-z0-9 ]+', ' ', (value or '').lower()).split())
+
+
+def _street_key(address: str) -> str:
+    """First address segment (street line) with common abbreviations applied."""
+    street = _normalize_text((address or '').split(',')[0])
+    return ' '.join(_ADDRESS_ABBREVIATIONS.get(word, word) for word in street.split())
+
+
+def _website_key(website: str):
+    """
+    Normalized website URL (host plus path, without scheme, 'www.', query or
+    trailing slash), e.g. 'https://www.Acme.com/store/1/?utm=x' -> 'acme.com/store/1'.
+
+    :return: The key, or None when there is no website or it is on a shared host
+    """
+    website = (website or '').strip()
+    if not website:
+        return None
+    parsed = urlparse(website if '://' in website else f'https://{website}')
+    host = parsed.netloc.lower().split('@')[-1].split(':')[0].rstrip('.')
+    host = host[4:] if host.startswith('www.') else host
+    if not host or any(host == shared or host.endswith(f'.{shared}') for shared in SHARED_WEBSITE_HOSTS):
+        return None
+    return host + parsed.path.rstrip('/').lower()
+
+
+def normalize_business(business: dict, provider: str) -> dict:
+    """
+    Map a provider's business dict onto the common schema.
+
+    :param business: Business dict from a provider module
+    :param provider: Provider name
+    :return: Business dict with every MERGED_FIELDS key, reviews and sources
+    """
+    record = {field: business.get(field) for field in MERGED_FIELDS}
+    record['reviews'] = list(business.get('reviews') or [])
+    record['sources'] = [provider]
+    return record
+
+
+class BusinessMerger:
+    """
+    De-duplicates businesses across providers by normalized name plus street
+    address, or by website URL when the name or street also agree, merging
+    duplicates into one record that keeps the richest fields.
+
+    Websites on SHARED_WEBSITE_HOSTS are never used, and the URL path is part of
+    the key, so businesses with only a social page and chain branches
+    (acme.com/store/1, acme.com/store/2, or one acme.com at two streets) stay apart.
+    """
+
+    def __init__(self):
+        self.records = []
+        self._by_website = {}
+        self._by_name_address = {}
+
+    @staticmethod
+    def _keys(record: dict):
+        name = _normalize_text(record.get('name'))
+        street = _street_key(record.get('address'))
+        name_address = (name, street) if name and street else None
+        return _website_key(record.get('website')), name, street, name_address
+
+    def _find(self, record: dict):
+        website, name, street, name_address = self._keys(record)
+        existing = self._by_name_address.get(name_address) if name_address else None
+        if existing is None and website:
+            # The same website is only the same business when the street agrees too, or
+            # the name does and the streets do not differ (chain branches share both)
+            for candidate in self._by_website.get(website, []):
+                _, candidate_name, candidate_street, _ = self._keys(candidate)
+                if street and candidate_street:
+                    if street == candidate_street:
+                        return candidate
+                elif name and name == candidate_name:
+                    return candidate
+        return existing
+
+    def add(self, record: dict):
+        """
+        Add a normalized record.
+
+        :param record: Record from normalize_business
+        :return: (merged record, True if it is a new business)
+        """
+        existing = self._find(record)
+        if existing is None:
+            self.records.append(record)
+            existing, is_new = record, True
+        else:
+            self._merge(existing, record)
+            is_new = False
+
+        website, _, _, name_address = self._keys(existing)
+        if website:
+            branches = self._by_website.setdefault(website, [])
+            if existing not in branches:
+                branches.append(existing)
+        if name_address:
+            self._by_name_address.setdefault(name_address, existing)
+        return existing, is_new
+
+    @staticmethod
+    def _merge(target: dict, record: dict):
+        for field in MERGED_FIELDS:
+            if target.get(field) in (None, '') and record.get(field) not in (None, ''):
+                target[field] = record[field]
+        # Counts differ between sources; the largest is the most complete
+        counts = [count for count in (target.get('reviews_count'), record.get('reviews_count')) if count is not None]
+        target['reviews_count'] = max(counts) if counts else None
+        if len(record['reviews']) > len(target['reviews']):
+            target['reviews'] = record['reviews']
+        for source in record['sources']:
+            if source not in target['sources']:
+                target['sources'].append(source)
+
+
+def _provider_call(provider: str, category: str, location: str, refresh: bool):
+    query = f"{category} in {location}"
+    if provider == 'outscraper':
+        return get_provider('outscraper').get_negative_reviews(query, refresh=refresh)
+    if provider == 'google_places':
+        return get_provider('google_places').get_low_rated_places(query, refresh=refresh)
+    return get_provider('apify').get_apify_low_rated_places(category, location, refresh=refresh)
+
+
+async def _call_with_deadline(provider: str, category: str, location: str, refresh: bool):
+    """
+    Run one provider search with its deadline.
+
+    :return: (provider, status, businesses) where status is 'ok', 'late', or the
+             UpstreamError kind ('rate_limited', 'unavailable', 'failed')
+    """
+    task = asyncio.ensure_future(_provider_call(provider, category, location, refresh))
+    try:
+        businesses = await asyncio.wait_for(asyncio.shield(task), provider_deadline(provider))
+        return provider, 'ok', businesses
+    except UpstreamError as e:
+        logger.error(f"Federated search: {e}")
+        return provider, e.kind, []
+    except asyncio.TimeoutError:
+        logger.warning(f"Federated search: {provider} missed its {provider_deadline(provider)}s deadline")
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+        return provider, 'late', []
+
+
+async def iter_federated_search(category: str, location: str, refresh: bool = False):
+    """
+    Query every configured provider concurrently, each under its own deadline,
+    yielding (provider, status, businesses) as each one finishes or times out.
+    """
+    calls = [_call_with_deadline(provider, category, location, refresh) for provider in configured_providers()]
+    for next_done in asyncio.as_completed(calls):
+        yield await next_done
+
+
+async def federated_search(category: str, location: str, refresh: bool = False) -> dict:
+    """
+    Search all configured providers and merge their results.
+
+    :param category: Business category, e.g. 'Dentist'
+    :param location: Location, e.g. 'Dubai'
+    :param refresh: Bypass cached provider results
+    :return: {"results": merged businesses, "providers": {provider: status}}
+    """
+    merger = BusinessMerger()
+    statuses = {}
+    arrived = {}
+    async for provider, status, businesses in iter_federated_search(category, location, refresh):
+        statuses[provider] = status
+        arrived[provider] = businesses
+    # Merge in provider precedence order, not arrival order, so merged fields are stable
+    for provider in PROVIDER_ORDER:
+        for business in arrived.get(provider, []):
+            merger.add(normalize_business(business, provider))
+    logger.info(f"Federated search: {len(merger.records)} businesses from {statuses}")
+    return {"results": merger.records, "providers": statuses}
+
+
+async def stream_federated_search(category: str, location: str, refresh: bool = False):
+    """
+    Yield de-duplicated businesses as each provider finishes. A business already
+    sent is not sent again; fields from later providers are not merged into it.
+    """
+    merger = BusinessMerger()
+    async for provider, status, businesses in iter_federated_search(category, location, refresh):
+        for business in businesses:
+            record, is_new = merger.add(normalize_business(business, provider))
+            if is_new:
+                yield record
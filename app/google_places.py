@@ -1,7 +1,10 @@
 import os
-import httpx
 import logging
 from dotenv import load_dotenv
+from app.upstream import get_policy, UpstreamError
+from app.providers import provider_error
+from app.cache import cached, cached_stream
+from app.models import Business
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -11,50 +14,97 @@ load_dotenv()
 
 API_KEY = os.getenv("GOOGLE_API_KEY")
 
+SEARCH_TEXT_URL = "https://places.googleapis.com/v1/places:searchText"
+FIELD_MASK = "places.displayName,places.formattedAddress,places.rating,places.userRatingCount"
+
+
+async def _search_text(query: str, page_size: int, page_token: str = None, field_mask: str = FIELD_MASK) -> dict:
+    """
+    Send one Text Search request and return the decoded response.
+    """
+    headers = {
+        "Content-Type": "application/json",
+        "X-Goog-Api-Key": API_KEY,
+        "X-Goog-FieldMask": field_mask
+    }
+    data = {
+        "textQuery": query,
+        "pageSize": page_size
+    }
+    if page_token:
+        data["pageToken"] = page_token
+
+    # A Text Search only reads, so it is retried like a GET
+    response = await get_policy('google_places').request(
+        "POST", SEARCH_TEXT_URL, headers=headers, json=data, idempotent=True
+    )
+    result = response.json()
+    logger.info(f"Raw Google Places API response: {result}")
+    return result
+
+
+def _parse_place(place: dict) -> dict:
+    return Business.from_google_places(place).to_dict()
+
+
+async def iter_low_rated_places(query: str, limit: int = 20):
+    """
+    Yield businesses from the new Google Places API (v1), one at a time as each is
+    parsed. Upstream errors propagate to the caller.
+    """
+    logger.info(f"Making API request to Google Places (New) with query: {query}")
+
+    result = await _search_text(query, limit)
+
+    if "error" in result:
+        logger.error(f"Google Places API error: {result['error'].get('message')}")
+        return
+
+    # Parse all results (no filtering)
+    places = result.get("places", [])
+    logger.info(f"Number of places returned from Google: {len(places)}")
+    for place in places:
+        yield _parse_place(place)
+
+
+async def get_low_rated_places_page(query: str, page_token: str = None, page_size: int = 20) -> tuple:
+    """
+    Get one page of Google Places results. Page tokens are short-lived, so pages
+    are fetched live rather than cached.
+
+    :param query: Text query, e.g. 'Dentist in Dubai'
+    :param page_token: nextPageToken of the previous page (None for the first page)
+    :param page_size: Results per page (Google allows at most 20)
+    :return: (list of business dicts, next page token or None)
+    :raises UpstreamError: Google is rate limiting, unavailable or rejected the request
+    """
+    logger.info(f"Fetching Google Places page for query: {query}")
+    result = await _search_text(query, page_size, page_token, f"{FIELD_MASK},nextPageToken")
+    if "error" in result:
+        raise provider_error(
+            'google_places', f"Google Places API error: {result['error'].get('message')}", result['error'].get('code')
+        )
+    return [_parse_place(place) for place in result.get("places", [])], result.get("nextPageToken")
+
+
+@cached('google_places')
 async def get_low_rated_places(query: str, limit: int = 20):
     """
     Get businesses using the new Google Places API (v1). Show all results, no rating filter.
     """
     try:
-        logger.info(f"Making API request to Google Places (New) with query: {query}")
-
-        url = "https://places.googleapis.com/v1/places:searchText"
-        headers = {
-            "Content-Type": "application/json",
-            "X-Goog-Api-Key": API_KEY,
-            "X-Goog-FieldMask": "places.displayName,places.formattedAddress,places.rating,places.userRatingCount"
-        }
-        data = {
-            "textQuery": query,
-            "pageSize": limit
-        }
-
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, headers=headers, json=data)
-            result = response.json()
-        logger.info(f"Raw Google Places API response: {result}")
-
-        if "error" in result:
-            logger.error(f"Google Places API error: {result['error'].get('message')}")
-            return []
-
-        # Parse all results (no filtering)
-        places = result.get("places", [])
-        logger.info(f"Number of places returned from Google: {len(places)}")
-        all_places = [
-            {
-                "name": place.get("displayName", {}).get("text"),
-                "address": place.get("formattedAddress"),
-                "rating": place.get("rating"),
-                "reviews_count": place.get("userRatingCount"),
-                "reviews": []
-            }
-            for place in places
-        ]
+        all_places = [place async for place in iter_low_rated_places(query, limit)]
         logger.info(f"All places to be shown: {all_places}")
 
         return all_places
 
+    except UpstreamError:
+        # Rate limits and outages are reported to the caller, not shown as "no results"
+        raise
     except Exception as e:
         logger.error(f"Error occurred: {str(e)}")
-        return [] 
\ No newline at end of file
+        return []
+
+
+# Streaming search mode: same cache entries as get_low_rated_places
+stream_low_rated_places = cached_stream('google_places', 'get_low_rated_places')(iter_low_rated_places)
@@ -0,0 +1,58 @@
+import logging
+from typing import Optional
+
+import httpx
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Upstream calls are slow (Apify crawls, GPT-4 completions), so the read timeout
+# is generous; connection setup should still fail fast.
+DEFAULT_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+DEFAULT_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30.0)
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def create_http_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """
+    Build the keep-alive client shared by every provider module.
+
+    :param transport: Optional transport override (e.g. a mock transport for offline runs)
+    :return: A new httpx.AsyncClient
+    """
+    return httpx.AsyncClient(timeout=DEFAULT_TIMEOUT, limits=DEFAULT_LIMITS, transport=transport)
+
+
+async def init_http_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """
+    Create the shared client. Called from the FastAPI lifespan on startup.
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+    _client = create_http_client(transport)
+    logger.info("Shared HTTP client pool started")
+    return _client
+
+
+async def close_http_client():
+    """
+    Close the shared client and release its pooled connections.
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        logger.info("Shared HTTP client pool closed")
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Return the shared client, creating it lazily when used outside the app lifespan
+    (scripts, the Python shell).
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_http_client()
+    return _client
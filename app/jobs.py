@@ -0,0 +1,368 @@
+import os
+import csv
+import io
+import json
+import time
+import uuid
+import asyncio
+import logging
+import sqlite3
+import threading
+from dotenv import load_dotenv
+from app.reputation import coalesced_reputation_analysis, normalize_domain
+from app.cache import connect_sqlite
+from app.coordination import WORKER_ID, shared_state_enabled
+
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+JOBS_PATH = os.getenv('JOBS_PATH', 'data/jobs.sqlite3')
+# Domains analyzed at the same time across all bulk jobs, per worker process
+BULK_CONCURRENCY = int(os.getenv('BULK_CONCURRENCY', '3'))
+BULK_MAX_DOMAINS = int(os.getenv('BULK_MAX_DOMAINS', '1000'))
+# A worker renews the lease on the items it is analyzing; items whose lease ran
+# out (the worker died) are picked up again by any worker
+JOB_ITEM_LEASE_SECONDS = 60.0
+# How often idle workers look for items submitted to other worker processes
+JOB_POLL_SECONDS = 2.0
+# Analyses that failed because OpenAI was rate limiting or unavailable are
+# retried after this many seconds times the attempt number, up to JOB_ITEM_MAX_ATTEMPTS times
+JOB_RETRY_SECONDS = float(os.getenv('JOB_RETRY_SECONDS', '30'))
+JOB_ITEM_MAX_ATTEMPTS = int(os.getenv('JOB_ITEM_MAX_ATTEMPTS', '3'))
+RETRY_ERROR_KINDS = {'rate_limited', 'unavailable'}
+
+CSV_HEADER_NAMES = {'domain', 'domains', 'website', 'url'}
+CSV_COLUMNS = ['domain', 'status', 'risk_level', 'summary', 'key_issues', 'search_count', 'trustpilot_count', 'error']
+# Job items read from the store at a time when exporting results
+EXPORT_BATCH_SIZE = 200
+
+
+def parse_domains(domains) -> list:
+    """
+    Turn a list of domains, or CSV text with domains in the first column, into a
+    de-duplicated list of normalized domains. A header row is skipped.
+
+    :param domains: List of strings or CSV text
+    :return: List of normalized domains, in submission order
+    """
+    if isinstance(domains, str):
+        rows = csv.reader(io.StringIO(domains))
+        domains = [row[0] for row in rows if row]
+        if domains and domains[0].strip().lower() in CSV_HEADER_NAMES:
+            domains = domains[1:]
+    normalized = (normalize_domain(domain) for domain in domains if domain and domain.strip())
+    return [domain for domain in dict.fromkeys(normalized) if domain]
+
+
+class JobStore:
+    """
+    SQLite storage for bulk jobs and their per-domain items. Everything a job
+    needs to resume lives here, so jobs survive restarts.
+    """
+
+    def __init__(self, path: str = JOBS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = connect_sqlite(self.path)
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, refresh INTEGER NOT NULL, created_at REAL NOT NULL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS job_items ('
+                'job_id TEXT NOT NULL, position INTEGER NOT NULL, domain TEXT NOT NULL, '
+                'status TEXT NOT NULL, result TEXT, error TEXT, updated_at REAL NOT NULL, '
+                'owner TEXT, lease_until REAL, attempts INTEGER NOT NULL DEFAULT 0, '
+                'PRIMARY KEY (job_id, position))'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_job_items_status ON job_items (status)')
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def create_job(self, domains: list, refresh: bool = False) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute('INSERT INTO jobs (id, refresh, created_at) VALUES (?, ?, ?)', (job_id, int(refresh), now))
+            conn.executemany(
+                'INSERT INTO job_items (job_id, position, domain, status, updated_at) VALUES (?, ?, ?, ?, ?)',
+                [(job_id, position, domain, 'pending', now) for position, domain in enumerate(domains)]
+            )
+            conn.commit()
+        return job_id
+
+    def set_item(self, job_id: str, position: int, status: str, result: dict = None, error: str = None):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                'UPDATE job_items SET status = ?, result = ?, error = ?, updated_at = ? WHERE job_id = ? AND position = ?',
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id, position)
+            )
+            conn.commit()
+
+    def retry_item(self, job_id: str, position: int, delay: float, error: str):
+        """Put an item back in the queue, to be claimed again after `delay` seconds."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "UPDATE job_items SET status = 'pending', error = ?, owner = NULL, lease_until = ?, "
+                'attempts = attempts + 1, updated_at = ? WHERE job_id = ? AND position = ?',
+                (error, now + delay, now, job_id, position)
+            )
+            conn.commit()
+
+    def requeue_interrupted(self) -> int:
+        """
+        Reset items left running by a previous process. Only safe when this is the
+        only worker process; with several, unfinished items are recovered when
+        their lease expires.
+
+        :return: Number of items re-queued
+        """
+        with self._lock:
+            conn = self._connect()
+            count = conn.execute(
+                "UPDATE job_items SET status = 'pending', lease_until = NULL WHERE status = 'running'"
+            ).rowcount
+            conn.commit()
+        return count
+
+    def claim_next(self, owner: str, lease_seconds: float = JOB_ITEM_LEASE_SECONDS):
+        """
+        Atomically take the oldest pending item (or one whose worker stopped
+        renewing its lease) and mark it running for `owner`. Items put back by
+        retry_item wait until their retry time.
+
+        :return: (job_id, position, domain, refresh, attempts), or None if nothing is queued
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            # Write lock first, so two workers cannot claim the same item
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                'SELECT i.job_id, i.position, i.domain, j.refresh, i.attempts FROM job_items i '
+                'JOIN jobs j ON j.id = i.job_id '
+                "WHERE i.status IN ('pending', 'running') AND COALESCE(i.lease_until, 0) < ? "
+                'ORDER BY j.created_at, i.position LIMIT 1',
+                (now,)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE job_items SET status = 'running', owner = ?, lease_until = ?, updated_at = ? "
+                    'WHERE job_id = ? AND position = ?',
+                    (owner, now + lease_seconds, now, row[0], row[1])
+                )
+            conn.commit()
+        if row is None:
+            return None
+        job_id, position, domain, refresh, attempts = row
+        return job_id, position, domain, bool(refresh), attempts
+
+    def renew_leases(self, owner: str, lease_seconds: float = JOB_ITEM_LEASE_SECONDS):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "UPDATE job_items SET lease_until = ? WHERE owner = ? AND status = 'running'",
+                (time.time() + lease_seconds, owner)
+            )
+            conn.commit()
+
+    def get_progress(self, job_id: str):
+        with self._lock:
+            conn = self._connect()
+            job = conn.execute('SELECT created_at FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if job is None:
+                return None
+            counts = dict(conn.execute(
+                'SELECT status, COUNT(*) FROM job_items WHERE job_id = ? GROUP BY status', (job_id,)
+            ).fetchall())
+        return job[0], counts
+
+    def get_items(self, job_id: str, start: int = 0, limit: int = None) -> list:
+        """
+        Items of a job in submission order; `start` and `limit` select the
+        positions start..start+limit-1 (positions are numbered from 0 with no gaps).
+        """
+        end = start + limit if limit is not None else None
+        with self._lock:
+            rows = self._connect().execute(
+                'SELECT domain, status, result, error FROM job_items '
+                'WHERE job_id = ? AND position >= ? AND (? IS NULL OR position < ?) ORDER BY position',
+                (job_id, start, end, end)
+            ).fetchall()
+        return [
+            {"domain": domain, "status": status, "result": json.loads(result) if result else None, "error": error}
+            for domain, status, result, error in rows
+        ]
+
+
+class JobRunner:
+    """
+    Bounded worker pool running the reputation pipeline for queued bulk-job items.
+    Items are claimed from the JobStore, so every worker process shares one queue.
+    Started and stopped with the app; unfinished items of a previous process are
+    picked up again.
+    """
+
+    def __init__(self, store: JobStore, concurrency: int = BULK_CONCURRENCY, owner: str = WORKER_ID):
+        self.store = store
+        self.concurrency = concurrency
+        self.owner = owner
+        self._wakeup = None
+        self._workers = []
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        if not shared_state_enabled():
+            requeued = await asyncio.to_thread(self.store.requeue_interrupted)
+            if requeued:
+                logger.info(f"Resuming {requeued} unfinished bulk-job items")
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+        self._workers.append(asyncio.create_task(self._renew_leases()))
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, domains: list, refresh: bool = False) -> str:
+        """
+        Store a new job and queue its domains.
+
+        :param domains: Normalized domains (see parse_domains)
+        :param refresh: Bypass cached provider results and memoized analyses
+        :return: Job id
+        """
+        job_id = await asyncio.to_thread(self.store.create_job, domains, refresh)
+        self._wakeup.set()
+        logger.info(f"Queued bulk job {job_id} with {len(domains)} domains")
+        return job_id
+
+    async def _next_item(self):
+        while True:
+            item = await asyncio.to_thread(self.store.claim_next, self.owner)
+            if item is not None:
+                return item
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _renew_leases(self):
+        while True:
+            await asyncio.sleep(JOB_ITEM_LEASE_SECONDS / 3)
+            try:
+                await asyncio.to_thread(self.store.renew_leases, self.owner)
+            except Exception as e:
+                logger.error(f"Failed to renew bulk-job item leases: {e}")
+
+    async def _work(self):
+        while True:
+            job_id, position, domain, refresh, attempts = await self._next_item()
+            try:
+                result = await coalesced_reputation_analysis(domain, refresh=refresh)
+                analysis = result.get("analysis") or {}
+                if not analysis.get("error"):
+                    await asyncio.to_thread(self.store.set_item, job_id, position, 'done', result)
+                elif analysis.get("error_kind") in RETRY_ERROR_KINDS and attempts + 1 < JOB_ITEM_MAX_ATTEMPTS:
+                    delay = JOB_RETRY_SECONDS * (attempts + 1)
+                    logger.warning(f"Bulk job {job_id}: analysis of {domain} failed ({analysis['error']}); "
+                                   f"retrying in {delay:.0f}s")
+                    await asyncio.to_thread(self.store.retry_item, job_id, position, delay, analysis["error"])
+                else:
+                    logger.error(f"Bulk job {job_id}: analysis of {domain} failed: {analysis['error']}")
+                    await asyncio.to_thread(self.store.set_item, job_id, position, 'failed', None, analysis["error"])
+            except asyncio.CancelledError:
+                # Left as 'running'; picked up again on the next start or when its lease expires
+                raise
+            except Exception as e:
+                logger.error(f"Bulk job {job_id}: analysis of {domain} failed: {e}")
+                await asyncio.to_thread(self.store.set_item, job_id, position, 'failed', None, str(e))
+
+
+job_store = JobStore()
+job_runner = JobRunner(job_store)
+
+
+async def get_job_status(job_id: str):
+    """
+    Summarize a job's progress.
+
+    :return: Status dict, or None for an unknown job
+    """
+    progress = await asyncio.to_thread(job_store.get_progress, job_id)
+    if progress is None:
+        return None
+    created_at, counts = progress
+    total = sum(counts.values())
+    finished = counts.get('done', 0) + counts.get('failed', 0)
+    if finished == total:
+        status = 'completed'
+    elif finished or counts.get('running'):
+        status = 'running'
+    else:
+        status = 'queued'
+    return {
+        "job_id": job_id,
+        "status": status,
+        "created_at": created_at,
+        "total": total,
+        "done": counts.get('done', 0),
+        "failed": counts.get('failed', 0),
+        "running": counts.get('running', 0),
+        "pending": counts.get('pending', 0),
+        "progress": round(finished / total, 3) if total else 1.0
+    }
+
+
+async def get_job_results(job_id: str) -> list:
+    """
+    Get every item of a job so far, finished or not, in submission order.
+    """
+    return await asyncio.to_thread(job_store.get_items, job_id)
+
+
+async def iter_job_results(job_id: str, batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    Yield a job's items so far in submission order, reading EXPORT_BATCH_SIZE at
+    a time from the store, so exports of large jobs do not load every result.
+    """
+    start = 0
+    while True:
+        items = await asyncio.to_thread(job_store.get_items, job_id, start, batch_size)
+        for item in items:
+            yield item
+        if len(items) < batch_size:
+            return
+        start += batch_size
+
+
+def job_result_row(item: dict) -> dict:
+    """
+    Flatten a job item into one export row with the CSV_COLUMNS fields.
+    """
+    result = item["result"] or {}
+    analysis = result.get("analysis") or {}
+    return {
+        "domain": item["domain"],
+        "status": item["status"],
+        "risk_level": analysis.get("risk_level", ""),
+        "summary": analysis.get("summary", ""),
+        "key_issues": [str(issue) for issue in analysis.get("key_issues") or []],
+        "search_count": result.get("search_count", ""),
+        "trustpilot_count": result.get("trustpilot_count", ""),
+        "error": item["error"] or ""
+    }
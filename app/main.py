@@ -1,25 +1,101 @@
 from fastapi import FastAPI, Request, Form, Query
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse, StreamingResponse, Response
 from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
-from app.outscraper import get_negative_reviews, get_trustpilot_reviews
-from app.google_places import get_low_rated_places
-from app.apify_places import get_apify_low_rated_places
-from app.trustpilot import get_trustpilot_reviews
-from app.serp_search import search_negative_mentions, format_results_for_ai
-from app.ai_analyzer import analyze_reputation_data, get_risk_level_color, get_risk_level_bg
-from urllib.parse import urlparse
+from app.search import search_businesses, stream_businesses, search_page, iter_search_results
+from app.pagination import MAX_PAGE_SIZE
+from app.pagination import InvalidCursorError
+from app.federated import federated_search
+from app.providers import get_provider, provider_status
+from app.trustpilot import get_trustpilot_reviews, get_trustpilot_reviews_batch, normalize_trustpilot_domain
+from app.reputation import coalesced_reputation_analysis, reputation_flights, stream_reputation_events, normalize_domain
+from app.http_client import init_http_client, close_http_client
+from app.upstream import UpstreamError, error_payload, upstream_stats
+from app.jobs import job_runner, parse_domains, get_job_status, get_job_results, iter_job_results, job_result_row, CSV_COLUMNS, BULK_MAX_DOMAINS
+from app.cache import result_cache, analysis_cache
+from app.watchlist import watchlist_store, watchlist_runner, watchlist_entry_payload, WATCHLIST_INTERVAL_HOURS
+from app.metrics import MetricsMiddleware, timed_stage, render_metrics, cache_families, upstream_families
+from app.compression import CompressionMiddleware, CompressedStaticFiles, static_url
+from app.rendering import card_cache, conditional_response
+from app.sweep import (sweep_store, run_sweep, iter_sweep_results, expand_region, get_regions, sweep_status,
+                       UnknownRegionError, SWEEP_PROVIDERS)
+from app.export import export_response, EXPORT_FORMATS, EXPORT_MAX_ROWS, SEARCH_EXPORT_COLUMNS
+from contextlib import asynccontextmanager
+from jinja2 import Environment, FileSystemLoader
+from markupsafe import Markup
 import os
+import re
+import hmac
+import orjson
+import asyncio
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One keep-alive connection pool shared by every provider for the app's lifetime
+    await init_http_client()
+    # Bulk-job workers; picks up items left unfinished by a previous run
+    await job_runner.start()
+    # Scheduled watchlist checks
+    await watchlist_runner.start()
+    yield
+    await watchlist_runner.stop()
+    await job_runner.stop()
+    await close_http_client()
+
+app = FastAPI(lifespan=lifespan)
+# Request latency histograms for /metrics and the optional Server-Timing header
+app.add_middleware(MetricsMiddleware)
+# Brotli/gzip for pages and JSON, flushed per chunk for streamed results pages
+app.add_middleware(CompressionMiddleware)
 templates = Jinja2Templates(directory="templates")
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Async environment for chunked (streamed) page rendering over async generators
+stream_templates = Environment(loader=FileSystemLoader("templates"), autoescape=True, enable_async=True)
+
+def business_card(result: dict, card_index: int) -> Markup:
+    """Render one results-page business card as a single HTML fragment, cached per business record"""
+    return Markup(card_cache.render(templates.get_template("partials/business_card.html"), result, card_index=card_index))
+
+for environment in (templates.env, stream_templates):
+    environment.globals["business_card"] = business_card
+    environment.globals["static_url"] = static_url
+# Compressed, cacheable static assets (tailwind.min.css is most of a cold page load)
+app.mount("/static", CompressedStaticFiles(directory="static"), name="static")
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint for container orchestration"""
     return {"status": "healthy", "service": "LowRated"}
 
+@app.get("/api/providers")
+async def providers():
+    """Which providers are configured (have credentials) and loaded; unconfigured ones are skipped"""
+    return provider_status()
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Provider result and AI analysis cache hit/miss counters and size"""
+    stats = result_cache.get_stats()
+    stats['analysis'] = analysis_cache.get_stats()
+    stats['cards'] = card_cache.get_stats()
+    stats['coalesced'] = {
+        'ai_search': reputation_flights.stats,
+        'trustpilot': get_trustpilot_reviews.singleflight.stats
+    }
+    return stats
+
+@app.get("/api/upstream/stats")
+async def upstream_call_stats():
+    """Per-provider call, retry, rate-limit and failure counters and circuit state"""
+    return upstream_stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: request, stage and upstream latency, upstream call counts, cache hit ratios"""
+    families = cache_families(
+        {'results': result_cache, 'analysis': analysis_cache},
+        {'ai_search': reputation_flights, 'trustpilot': get_trustpilot_reviews.singleflight}
+    ) + upstream_families(upstream_stats())
+    return Response(render_metrics(families), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/", response_class=HTMLResponse)
 async def homepage(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
@@ -29,85 +105,483 @@ async def search(
     request: Request, 
     category: str = Form(...), 
     location: str = Form(...),
-    api_choice: str = Form(...)
+    api_choice: str = Form(...),
+    refresh: bool = Form(False),
+    stream: bool = Form(False)
 ):
-    query = f"{category} in {location}"
+    return await render_search(request, category, location, api_choice, refresh, stream)
+
+@app.get("/search", response_class=HTMLResponse)
+async def search_get(
+    request: Request,
+    category: str = Query(...),
+    location: str = Query(...),
+    api_choice: str = Query(...),
+    refresh: bool = Query(False),
+    stream: bool = Query(False)
+):
+    """
+    Same as POST /search, for the search form's GET submissions. Regular (not
+    streamed) pages carry an ETag, so repeating an identical search whose
+    results have not changed is answered 304 Not Modified.
+    """
+    response = await render_search(request, category, location, api_choice, refresh, stream)
+    return response if stream else conditional_response(request, response)
+
+async def render_search(request: Request, category: str, location: str, api_choice: str, refresh: bool, stream: bool):
+    if stream:
+        # Send the page head at once and each business card as soon as it is parsed
+        # Filled in by the generator if the provider fails; rendered after the last card
+        search_status = {}
+        businesses = stream_businesses(category, location, api_choice, refresh=refresh, status=search_status)
+        page = stream_templates.get_template("results.html").generate_async(
+            request=request, results=businesses, search_status=search_status
+        )
+        return StreamingResponse((chunk async for chunk in page if chunk), media_type="text/html; charset=utf-8")
     
-    if api_choice == "outscraper":
-        businesses = await get_negative_reviews(query)
-    elif api_choice == "google_places":
-        businesses = await get_low_rated_places(query)
-    elif api_choice == "apify":
-        businesses = await get_apify_low_rated_places(category, location)
-    else:
-        businesses = []
+    if api_choice == "all":
+        with timed_stage('search'):
+            federated = await federated_search(category, location, refresh=refresh)
+        with timed_stage('render'):
+            return templates.TemplateResponse("results.html", {
+                "request": request,
+                "results": federated["results"],
+                "provider_status": federated["providers"]
+            })
+
+    try:
+        with timed_stage('search'):
+            # First page only; the results page fetches the rest as it is scrolled
+            page = await search_page(category, location, api_choice, refresh=refresh)
+    except UpstreamError as e:
+        return templates.TemplateResponse(
+            "results.html",
+            {"request": request, "results": [], "search_status": {"error": str(e)}},
+            status_code=e.status_code
+        )
     
-    return templates.TemplateResponse("results.html", {"request": request, "results": businesses}) 
+    with timed_stage('render'):
+        return templates.TemplateResponse("results.html", {
+            "request": request, "results": page["results"], "next_cursor": page["next_cursor"]
+        })
+
+@app.get("/search/page", response_class=HTMLResponse)
+async def search_next_page(request: Request, cursor: str = Query(...), start: int = Query(0)):
+    """
+    Next page of a paginated search as business card fragments, for the results
+    page's infinite scroll. `start` numbers the cards after those already shown;
+    the cursor for the page after this one is in the X-Next-Cursor header
+    (absent after the last page).
+    """
+    try:
+        with timed_stage('search'):
+            page = await search_page(cursor=cursor)
+    except InvalidCursorError as e:
+        return HTMLResponse(str(e), status_code=400)
+    except UpstreamError as e:
+        return HTMLResponse(str(e), status_code=e.status_code)
+    with timed_stage('render'):
+        html = ''.join(business_card(result, start + index) for index, result in enumerate(page["results"]))
+    headers = {"X-Next-Cursor": page["next_cursor"]} if page["next_cursor"] else {}
+    return conditional_response(request, HTMLResponse(html, headers=headers))
+
+@app.get("/api/search")
+async def api_search(
+    request: Request,
+    category: str = Query(None),
+    location: str = Query(None),
+    api_choice: str = Query("google_places"),
+    cursor: str = Query(None),
+    page_size: int = Query(None),
+    refresh: bool = Query(False)
+):
+    """
+    Paginated business search as JSON. Start with category, location and
+    api_choice; pass the returned next_cursor to get the following page. Each
+    call fetches only the requested page from the provider.
+    Returns {"results": [...], "next_cursor": "..." or null}.
+    """
+    if not cursor and not (category and location):
+        return ORJSONResponse(content={"error": "category and location, or cursor, are required."}, status_code=400)
+    try:
+        page = await search_page(category, location, api_choice, cursor=cursor, page_size=page_size, refresh=refresh)
+    except InvalidCursorError as e:
+        return ORJSONResponse(content={"error": str(e)}, status_code=400)
+    except UpstreamError as e:
+        return ORJSONResponse(content={"results": [], **error_payload(e)}, status_code=e.status_code)
+    return conditional_response(request, ORJSONResponse(content=page))
+
+@app.get("/api/export/search")
+async def export_search(
+    category: str = Query(...),
+    location: str = Query(...),
+    api_choice: str = Query("google_places"),
+    format: str = Query("csv"),
+    limit: int = Query(None),
+    refresh: bool = Query(False)
+):
+    """
+    Download a search's businesses (name, address, rating, review count, website,
+    phone) as CSV or NDJSON. Rows are streamed as the provider's pages are
+    fetched (cached pages are reused), up to `limit` or EXPORT_MAX_ROWS.
+    """
+    if format not in EXPORT_FORMATS:
+        return ORJSONResponse(content={"error": "format must be csv or ndjson."}, status_code=400)
+    try:
+        page = await search_page(category, location, api_choice, page_size=MAX_PAGE_SIZE, refresh=refresh)
+    except UpstreamError as e:
+        return ORJSONResponse(content=error_payload(e), status_code=e.status_code)
+    rows = iter_search_results(page, refresh=refresh, limit=min(limit or EXPORT_MAX_ROWS, EXPORT_MAX_ROWS))
+    filename = re.sub(r'[^a-z0-9]+', '-', f"lowrated {category} {location}".lower()).strip('-')
+    return export_response(rows, SEARCH_EXPORT_COLUMNS, format, filename)
 
 @app.get("/trustpilot-reviews")
-async def trustpilot_reviews(domain: str = Query(...)):
-    reviews = get_trustpilot_reviews(domain)
-    return JSONResponse(content={"reviews": reviews}) 
+async def trustpilot_reviews(domain: str = Query(...), refresh: bool = Query(False)):
+    # Same per-domain cache entries as the batch endpoint the results page prefetches through
+    reviews, errors = await get_trustpilot_reviews_batch([domain], refresh=refresh)
+    if domain in errors:
+        return ORJSONResponse(content={"reviews": [], **error_payload(errors[domain])}, status_code=errors[domain].status_code)
+    return ORJSONResponse(content={"reviews": reviews.get(domain, [])}) 
 
 @app.get("/api/trustpilot-reviews")
 async def trustpilot_reviews(request: Request):
     url = request.query_params.get('url')
     if not url:
-        return JSONResponse(content={"error": "URL parameter is required."}, status_code=400)
-    reviews = get_trustpilot_reviews([url])
-    return JSONResponse(content={"reviews": reviews})
+        return ORJSONResponse(content={"error": "URL parameter is required."}, status_code=400)
+    refresh = request.query_params.get('refresh', '').lower() in ('1', 'true', 'yes')
+    try:
+        # Queried by normalized domain: the cache entry the results page's batch prefetch fills
+        reviews = await get_trustpilot_reviews([normalize_trustpilot_domain(url)], refresh=refresh)
+    except UpstreamError as e:
+        return ORJSONResponse(content={"reviews": [], **error_payload(e)}, status_code=e.status_code)
+    return ORJSONResponse(content={"reviews": reviews})
+
+@app.post("/api/trustpilot-reviews/batch")
+async def trustpilot_reviews_batch(request: Request):
+    """
+    Fetch Trustpilot reviews for every domain on a results page in as few
+    upstream calls as possible. Body: {"domains": [...], "refresh": false}.
+    Returns {"reviews": {domain: [...]}, "errors": {domain: {...}}} keyed by the
+    domains as sent; "errors" covers domains whose lookup was rate limited or failed.
+    """
+    data = await request.json()
+    domains = data.get('domains')
+    if not isinstance(domains, list) or not all(isinstance(domain, str) for domain in domains):
+        return ORJSONResponse(content={"error": "domains must be a list of strings."}, status_code=400)
+    reviews, errors = await get_trustpilot_reviews_batch(domains, refresh=bool(data.get('refresh', False)))
+    return ORJSONResponse(content={
+        "reviews": reviews,
+        "errors": {domain: error_payload(error) for domain, error in errors.items()}
+    })
 
 @app.post("/api/ai-search")
 async def ai_reputation_search(request: Request):
     """
     Perform AI-powered reputation analysis using SERP search and OpenAI analysis.
+    Concurrent requests for the same domain share one in-flight analysis.
     """
     try:
         data = await request.json()
         domain = data.get('domain')
+        refresh = bool(data.get('refresh', False))
         
         if not domain:
-            return JSONResponse(
+            return ORJSONResponse(
                 content={"error": "Domain parameter is required."}, 
                 status_code=400
             )
         
-        # Extract business name from domain
-        parsed_domain = urlparse(domain if domain.startswith('http') else f'https://{domain}')
-        business_name = parsed_domain.netloc.replace('www.', '').split('.')[0]
-        
-        # Get existing Trustpilot data if available
-        trustpilot_reviews = get_trustpilot_reviews([domain])
-        
-        # Perform SERP search for negative mentions
-        search_results = search_negative_mentions(business_name, limit=15)
-        formatted_search_results = format_results_for_ai(search_results, business_name)
-        
-        # Analyze with AI
-        ai_analysis = analyze_reputation_data(
-            business_name=business_name,
-            search_results=formatted_search_results,
-            trustpilot_data=trustpilot_reviews
-        )
-        
-        # Add UI styling classes
-        ai_analysis['risk_color'] = get_risk_level_color(ai_analysis.get('risk_level', 'Unknown'))
-        ai_analysis['risk_bg'] = get_risk_level_bg(ai_analysis.get('risk_level', 'Unknown'))
-        ai_analysis['search_results'] = search_results
-        ai_analysis['business_name'] = business_name
-        
-        return JSONResponse(content={
-            "success": True,
-            "analysis": ai_analysis,
-            "search_count": len(search_results),
-            "trustpilot_count": len(trustpilot_reviews) if trustpilot_reviews else 0
-        })
+        return ORJSONResponse(content=await coalesced_reputation_analysis(domain, refresh=refresh))
         
     except Exception as e:
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "success": False,
                 "error": f"AI search failed: {str(e)}"
             },
             status_code=500
-        ) 
\ No newline at end of file
+        )
+
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+@app.get("/api/ai-search/stream")
+async def ai_reputation_search_stream(domain: str = Query(...), refresh: bool = Query(False)):
+    """
+    Streaming variant of /api/ai-search (Server-Sent Events).
+    Pushes Trustpilot reviews, each SERP hit and the model's output tokens as they
+    arrive; the final 'result' event carries the same JSON as /api/ai-search.
+    """
+    async def event_stream():
+        try:
+            async for event, data in stream_reputation_events(domain, refresh=refresh):
+                yield sse_event(event, data)
+        except Exception as e:
+            yield sse_event("error", {"success": False, "error": f"AI search failed: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/sweep/regions")
+async def sweep_regions():
+    """Regions a sweep can cover by name, with their number of sub-locations"""
+    return ORJSONResponse(content={
+        name: len(region.get('locations') or []) for name, region in get_regions().items()
+    })
+
+@app.get("/api/sweep/stream")
+async def sweep_stream(
+    category: str = Query(None),
+    region: str = Query(None),
+    locations: list[str] = Query(None),
+    api_choice: str = Query("google_places"),
+    sweep_id: str = Query(None),
+    refresh: bool = Query(False)
+):
+    """
+    Search a category across a whole region in one request (Server-Sent Events).
+    The region (see /api/sweep/regions) is expanded into its sub-locations, or
+    pass them as repeated `locations`; each is searched with the chosen provider,
+    a few at a time, and businesses are pushed as found, without duplicates from
+    overlapping areas. The first event ('sweep') carries the sweep_id: pass it
+    instead of the search to resume an interrupted sweep.
+    """
+    if sweep_id:
+        if await asyncio.to_thread(sweep_store.get_sweep, sweep_id) is None:
+            return ORJSONResponse(content={"error": "Sweep not found."}, status_code=404)
+    else:
+        if not category or not (region or locations):
+            return ORJSONResponse(content={"error": "category and region (or locations) are required."}, status_code=400)
+        if api_choice not in SWEEP_PROVIDERS:
+            return ORJSONResponse(content={"error": f"api_choice must be one of {', '.join(SWEEP_PROVIDERS)}."}, status_code=400)
+        try:
+            region_name, sub_locations = expand_region(region, locations)
+            if api_choice != "all":
+                get_provider(api_choice)
+        except UnknownRegionError as e:
+            return ORJSONResponse(content={"error": str(e)}, status_code=400)
+        except UpstreamError as e:
+            return ORJSONResponse(content=error_payload(e), status_code=e.status_code)
+        if not sub_locations:
+            return ORJSONResponse(content={"error": "No locations to sweep."}, status_code=400)
+        sweep_id = await asyncio.to_thread(sweep_store.create_sweep, category, region_name, api_choice, sub_locations)
+
+    async def event_stream():
+        try:
+            async for event, data in run_sweep(sweep_id, refresh=refresh):
+                yield sse_event(event, data)
+        except Exception as e:
+            yield sse_event("error", {"sweep_id": sweep_id, "error": f"Sweep failed: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/sweeps/{sweep_id}")
+async def sweep_progress(sweep_id: str):
+    sweep = await asyncio.to_thread(sweep_store.get_sweep, sweep_id)
+    if sweep is None:
+        return ORJSONResponse(content={"error": "Sweep not found."}, status_code=404)
+    return ORJSONResponse(content=sweep_status(sweep))
+
+@app.get("/api/sweeps/{sweep_id}/results")
+async def sweep_results(sweep_id: str, format: str = Query("json")):
+    """
+    A sweep's de-duplicated businesses so far, as JSON, or as CSV or NDJSON rows
+    streamed from the sweep store (see /api/export/search for the columns).
+    """
+    sweep = await asyncio.to_thread(sweep_store.get_sweep, sweep_id)
+    if sweep is None:
+        return ORJSONResponse(content={"error": "Sweep not found."}, status_code=404)
+    if format in EXPORT_FORMATS:
+        return export_response(iter_sweep_results(sweep_id), SEARCH_EXPORT_COLUMNS, format, f"lowrated-sweep-{sweep_id}")
+    results = [record async for record in iter_sweep_results(sweep_id)]
+    return ORJSONResponse(content={**sweep_status(sweep), "results": results})
+
+@app.post("/api/jobs")
+async def create_bulk_job(request: Request):
+    """
+    Submit domains for bulk reputation analysis. Accepts JSON
+    {"domains": [...] or "csv": "...", "refresh": false}, or a text/csv body with
+    domains in the first column. Returns the job id and its initial status.
+    """
+    if request.headers.get('content-type', '').startswith('application/json'):
+        data = await request.json()
+        raw_domains = data.get('domains', data.get('csv'))
+        refresh = bool(data.get('refresh', False))
+    else:
+        raw_domains = (await request.body()).decode('utf-8-sig')
+        refresh = request.query_params.get('refresh', '').lower() in ('1', 'true', 'yes')
+
+    if not isinstance(raw_domains, (str, list)):
+        return ORJSONResponse(content={"error": "Provide domains as a list or CSV."}, status_code=400)
+    domains = parse_domains(raw_domains)
+    if not domains:
+        return ORJSONResponse(content={"error": "No domains found."}, status_code=400)
+    if len(domains) > BULK_MAX_DOMAINS:
+        return ORJSONResponse(content={"error": f"At most {BULK_MAX_DOMAINS} domains per job."}, status_code=400)
+
+    job_id = await job_runner.submit(domains, refresh=refresh)
+    return ORJSONResponse(content=await get_job_status(job_id), status_code=202)
+
+@app.get("/api/jobs/{job_id}")
+async def bulk_job_status(job_id: str):
+    status = await get_job_status(job_id)
+    if status is None:
+        return ORJSONResponse(content={"error": "Job not found."}, status_code=404)
+    return ORJSONResponse(content=status)
+
+@app.get("/api/jobs/{job_id}/results")
+async def bulk_job_results(job_id: str, format: str = Query("json")):
+    """
+    Download a job's results so far (partial while it runs) as JSON, or as CSV
+    or NDJSON rows (one per domain) streamed from the job store.
+    """
+    status = await get_job_status(job_id)
+    if status is None:
+        return ORJSONResponse(content={"error": "Job not found."}, status_code=404)
+    if format in EXPORT_FORMATS:
+        rows = (job_result_row(item) async for item in iter_job_results(job_id))
+        return export_response(rows, CSV_COLUMNS, format, f"lowrated-{job_id}")
+    items = await get_job_results(job_id)
+    return ORJSONResponse(content={**status, "results": items})
+
+def apify_run_payload(run: dict) -> dict:
+    """Run handle plus the URLs to follow it"""
+    return {
+        **run,
+        "status_url": f"/api/apify/runs/{run['run_id']}",
+        "results_url": f"/api/apify/runs/{run['run_id']}/results"
+    }
+
+@app.post("/api/apify/runs")
+async def create_apify_run(request: Request):
+    """
+    Start an Apify crawl without waiting for it. Body:
+    {"category": "...", "location": "...", "max_places": 100, "refresh": false}.
+    Returns a run handle right away (202; 200 when a finished crawl of the same
+    search is reused); poll status_url or configure APIFY_WEBHOOK_URL.
+    """
+    data = await request.json()
+    category, location = data.get('category'), data.get('location')
+    if not category or not location:
+        return ORJSONResponse(content={"error": "category and location are required."}, status_code=400)
+    try:
+        max_places = max(1, int(data['max_places'])) if data.get('max_places') else None
+    except (TypeError, ValueError):
+        return ORJSONResponse(content={"error": "max_places must be a number."}, status_code=400)
+    try:
+        apify = get_provider('apify')
+        run = await apify.start_apify_run(
+            category, location, max_places or apify.APIFY_PAGINATED_MAX_PLACES, refresh=bool(data.get('refresh', False))
+        )
+    except UpstreamError as e:
+        return ORJSONResponse(content=error_payload(e), status_code=e.status_code)
+    return ORJSONResponse(content=apify_run_payload(run), status_code=200 if run["status"] == "SUCCEEDED" else 202)
+
+@app.get("/api/apify/runs/{run_id}")
+async def apify_run_status(run_id: str):
+    try:
+        run = await get_provider('apify').get_apify_run(run_id)
+    except UpstreamError as e:
+        return ORJSONResponse(content=error_payload(e), status_code=e.status_code)
+    if run is None:
+        return ORJSONResponse(content={"error": "Run not found."}, status_code=404)
+    return ORJSONResponse(content=apify_run_payload(run))
+
+@app.get("/api/apify/runs/{run_id}/results")
+async def apify_run_results(run_id: str, limit: int = Query(None)):
+    """
+    Low-rated places (rating <= 3.0) from a finished crawl's dataset.
+    409 while the crawl is still running.
+    """
+    try:
+        apify = get_provider('apify')
+        run = await apify.get_apify_run(run_id)
+        if run is None:
+            return ORJSONResponse(content={"error": "Run not found."}, status_code=404)
+        if run["status"] != "SUCCEEDED":
+            return ORJSONResponse(content={**apify_run_payload(run), "results": []}, status_code=409)
+        results = await apify.get_apify_run_results(run, limit)
+    except UpstreamError as e:
+        return ORJSONResponse(content=error_payload(e), status_code=e.status_code)
+    return ORJSONResponse(content={**apify_run_payload(run), "results": results})
+
+@app.post("/api/apify/webhook")
+async def apify_webhook(request: Request):
+    """
+    Receiver for Apify's run-finished webhooks (see APIFY_WEBHOOK_URL). Marks the
+    run finished so status checks and identical searches no longer poll Apify.
+    """
+    try:
+        apify = get_provider('apify')
+        if apify.APIFY_WEBHOOK_SECRET and not hmac.compare_digest(
+            request.query_params.get('token', ''), apify.APIFY_WEBHOOK_SECRET
+        ):
+            return ORJSONResponse(content={"error": "Invalid token."}, status_code=403)
+        run = await apify.handle_apify_webhook(await request.json())
+    except UpstreamError as e:
+        return ORJSONResponse(content=error_payload(e), status_code=e.status_code)
+    if run is None:
+        return ORJSONResponse(content={"error": "Run not found."}, status_code=404)
+    return ORJSONResponse(content={"run_id": run["run_id"], "status": run["status"]})
+
+@app.post("/api/watchlist")
+async def add_to_watchlist(request: Request):
+    """
+    Watch domains for new reviews and mentions. Body:
+    {"domains": [...] or "csv": "...", "interval_hours": 24}. Each domain is
+    checked at once and then every interval; later checks only process what is
+    new since the previous one.
+    """
+    data = await request.json()
+    raw_domains = data.get('domains', data.get('csv'))
+    if not isinstance(raw_domains, (str, list)):
+        return ORJSONResponse(content={"error": "Provide domains as a list or CSV."}, status_code=400)
+    domains = parse_domains(raw_domains)
+    if not domains:
+        return ORJSONResponse(content={"error": "No domains found."}, status_code=400)
+    try:
+        interval_hours = float(data.get('interval_hours') or WATCHLIST_INTERVAL_HOURS)
+    except (TypeError, ValueError):
+        return ORJSONResponse(content={"error": "interval_hours must be a number."}, status_code=400)
+    if interval_hours < 1:
+        return ORJSONResponse(content={"error": "interval_hours must be at least 1."}, status_code=400)
+    added = await asyncio.to_thread(watchlist_store.add, domains, interval_hours * 3600)
+    watchlist_runner.wake()
+    return ORJSONResponse(content={"added": added, "domains": domains}, status_code=201)
+
+@app.get("/api/watchlist")
+async def list_watchlist():
+    entries = await asyncio.to_thread(watchlist_store.list)
+    return ORJSONResponse(content={"domains": [watchlist_entry_payload(entry) for entry in entries]})
+
+@app.get("/api/watchlist/{domain}")
+async def watchlist_domain(domain: str):
+    """A watched domain's latest analysis and its recent checks"""
+    entry = await asyncio.to_thread(watchlist_store.get, normalize_domain(domain))
+    if entry is None:
+        return ORJSONResponse(content={"error": "Domain not watched."}, status_code=404)
+    checks = await asyncio.to_thread(watchlist_store.get_checks, entry['domain'])
+    return ORJSONResponse(content=watchlist_entry_payload(entry, checks))
+
+@app.post("/api/watchlist/{domain}/check")
+async def check_watchlist_domain(domain: str):
+    """Check a watched domain now instead of at its next scheduled time"""
+    if not await asyncio.to_thread(watchlist_store.schedule_now, normalize_domain(domain)):
+        return ORJSONResponse(content={"error": "Domain not watched."}, status_code=404)
+    watchlist_runner.wake()
+    return ORJSONResponse(content={"domain": normalize_domain(domain), "status": "scheduled"}, status_code=202)
+
+@app.delete("/api/watchlist/{domain}")
+async def remove_from_watchlist(domain: str):
+    if not await asyncio.to_thread(watchlist_store.remove, normalize_domain(domain)):
+        return ORJSONResponse(content={"error": "Domain not watched."}, status_code=404)
+    return ORJSONResponse(content={"domain": normalize_domain(domain), "removed": True})
+
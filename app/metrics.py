@@ -0,0 +1,325 @@
+import os
+import time
+import asyncio
+import logging
+from contextvars import ContextVar
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Add a Server-Timing header (stage and provider-call durations) to every response
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'false').lower() in ('1', 'true', 'yes')
+
+# Histogram bucket upper bounds in seconds: provider calls range from ~100ms
+# (Google Places) to minutes (synchronous Outscraper scrapes, Apify crawls)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Timing entries of the request being handled, for the Server-Timing header.
+# Tasks started while handling a request inherit it, so concurrent provider
+# calls are recorded against the request that started them.
+_request_timings: ContextVar = ContextVar('request_timings', default=None)
+
+
+def _format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class Histogram:
+    """
+    Prometheus histogram keyed by label values (cumulative buckets, sum, count).
+    """
+
+    def __init__(self, name: str, description: str, labels: tuple, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, value: float, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series['buckets'][index] += 1
+        series['sum'] += value
+        series['count'] += 1
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        for label_values, series in sorted(self._series.items()):
+            for bound, count in zip(self.buckets, series['buckets']):
+                labels = _format_labels(self.labels + ('le',), label_values + (f'{bound:g}',))
+                lines.append(f'{self.name}_bucket{labels} {count}')
+            labels = _format_labels(self.labels + ('le',), label_values + ('+Inf',))
+            lines.append(f'{self.name}_bucket{labels} {series["count"]}')
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{labels} {series["sum"]:.6f}')
+            lines.append(f'{self.name}_count{labels} {series["count"]}')
+        return lines
+
+
+class Counter:
+    """
+    Prometheus counter (or, with `kind='gauge'`, a gauge) keyed by label values.
+    """
+
+    def __init__(self, name: str, description: str, labels: tuple = (), kind: str = 'counter'):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.kind = kind
+        self._values = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def dec(self, *label_values, amount: float = 1):
+        self.inc(*label_values, amount=-amount)
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}']
+        for label_values, value in sorted(self._values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {value:g}')
+        return lines
+
+
+def _sample_family(name: str, description: str, kind: str, labels: tuple, samples: dict) -> list:
+    """Render a metric family from a {label values: value} snapshot."""
+    lines = [f'# HELP {name} {description}', f'# TYPE {name} {kind}']
+    for label_values, value in sorted(samples.items()):
+        lines.append(f'{name}{_format_labels(labels, label_values)} {value:g}')
+    return lines
+
+
+http_request_seconds = Histogram(
+    'lowrated_http_request_duration_seconds', 'Time to first response byte by route and status.',
+    ('route', 'method', 'status')
+)
+http_in_flight = Counter('lowrated_http_requests_in_flight', 'Requests being handled.', kind='gauge')
+stage_seconds = Histogram(
+    'lowrated_stage_duration_seconds', 'Duration of request pipeline stages.', ('stage',)
+)
+upstream_call_seconds = Histogram(
+    'lowrated_upstream_call_duration_seconds',
+    'Upstream provider call duration including retries, by outcome.', ('provider', 'outcome')
+)
+upstream_in_flight = Counter(
+    'lowrated_upstream_in_flight', 'Upstream provider calls in progress.', ('provider',), kind='gauge'
+)
+
+
+def record_timing(name: str, seconds: float):
+    """Add an entry to the current request's Server-Timing header, if one is being collected."""
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+class timed_stage:
+    """
+    Context manager timing one pipeline stage (works across awaits): the duration
+    goes to the stage histogram and the request's Server-Timing header.
+
+        with timed_stage('serp'):
+            results = await search_negative_mentions(...)
+    """
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        stage_seconds.observe(elapsed, self.stage)
+        record_timing(self.stage, elapsed)
+        return False
+
+
+class upstream_call:
+    """
+    Context manager around one policy-governed provider call: tracks in-flight
+    calls and records the duration by outcome: 'ok', the UpstreamError kind
+    ('rate_limited', 'failed', 'unavailable'), 'error', 'cancelled', or an
+    `outcome` set by the caller.
+    """
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.outcome = 'ok'
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        upstream_in_flight.inc(self.provider)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        elapsed = time.perf_counter() - self.start
+        upstream_in_flight.dec(self.provider)
+        if exc_type is asyncio.CancelledError:
+            self.outcome = 'cancelled'
+        elif exc_type is not None and self.outcome == 'ok':
+            self.outcome = getattr(exc, 'kind', 'error')
+        upstream_call_seconds.observe(elapsed, self.provider, self.outcome)
+        record_timing(self.provider, elapsed)
+        return False
+
+
+def server_timing_header(timings: list, total: float) -> str:
+    """
+    Format Server-Timing entries. Repeated names (e.g. five SERP queries) are
+    numbered so devtools lists each call.
+    """
+    seen = {}
+    entries = []
+    for name, seconds in timings:
+        seen[name] = seen.get(name, 0) + 1
+        metric = name if seen[name] == 1 else f'{name}-{seen[name]}'
+        entries.append(f'{metric};dur={seconds * 1000:.1f}')
+    entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request by route template and status, and
+    adding the Server-Timing header when SERVER_TIMING is enabled. Durations are
+    measured to the start of the response, so streamed pages and SSE report their
+    time to first byte rather than their open time.
+    """
+
+    def __init__(self, app, server_timing: bool = SERVER_TIMING):
+        self.app = app
+        self.server_timing = server_timing
+        self._route_paths = {}
+
+    def _route(self, scope) -> str:
+        endpoint = scope.get('endpoint')
+        if endpoint is None:
+            return 'static' if scope.get('path', '').startswith('/static') else 'unmatched'
+        if endpoint not in self._route_paths:
+            routes = getattr(scope.get('app'), 'routes', [])
+            self._route_paths.update({route.endpoint: route.path for route in routes if hasattr(route, 'endpoint')})
+        return self._route_paths.get(endpoint, getattr(endpoint, '__name__', 'unknown'))
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timings = []
+        token = _request_timings.set(timings)
+        http_in_flight.inc()
+        recorded = False
+
+        def record(status: int) -> float:
+            nonlocal recorded
+            elapsed = time.perf_counter() - start
+            if not recorded:
+                recorded = True
+                http_request_seconds.observe(elapsed, self._route(scope), scope['method'], str(status))
+            return elapsed
+
+        async def send_with_timing(message):
+            if message['type'] == 'http.response.start':
+                elapsed = record(message['status'])
+                if self.server_timing:
+                    headers = list(message.get('headers', []))
+                    headers.append((b'server-timing', server_timing_header(timings, elapsed).encode('latin-1')))
+                    message = {**message, 'headers': headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        except BaseException:
+            record(500)
+            raise
+        finally:
+            http_in_flight.dec()
+            _request_timings.reset(token)
+
+
+def render_metrics(extra_families: list = ()) -> str:
+    """
+    Render every metric in the Prometheus text exposition format.
+
+    :param extra_families: Further lines (e.g. cache and upstream snapshots) to append
+    :return: Exposition text
+    """
+    lines = []
+    for metric in (http_request_seconds, http_in_flight, stage_seconds, upstream_call_seconds, upstream_in_flight):
+        lines.extend(metric.render())
+    lines.extend(extra_families)
+    return '\n'.join(lines) + '\n'
+
+
+def cache_families(caches: dict, flights: dict) -> list:
+    """
+    Metric families for cache hit/miss counters and request coalescing.
+
+    :param caches: Cache label -> ResultCache
+    :param flights: Coalescing group label -> SingleFlight
+    """
+    hits, misses, ratios, entries = {}, {}, {}, {}
+    for cache_name, cache in caches.items():
+        stats = cache.get_stats()
+        entries[(cache_name,)] = stats['entries']
+        for provider, counters in stats['providers'].items():
+            hits[(cache_name, provider)] = counters['hits']
+            misses[(cache_name, provider)] = counters['misses']
+            ratios[(cache_name, provider)] = counters['hit_ratio']
+    started = {(name,): group.stats['started'] for name, group in flights.items()}
+    joined = {(name,): group.stats['joined'] for name, group in flights.items()}
+    in_flight = {(name,): group.in_flight() for name, group in flights.items()}
+    return (
+        _sample_family('lowrated_cache_hits_total', 'Cache hits.', 'counter', ('cache', 'provider'), hits)
+        + _sample_family('lowrated_cache_misses_total', 'Cache misses.', 'counter', ('cache', 'provider'), misses)
+        + _sample_family('lowrated_cache_hit_ratio', 'Cache hit ratio since start.', 'gauge', ('cache', 'provider'), ratios)
+        + _sample_family('lowrated_cache_entries', 'Entries in the cache.', 'gauge', ('cache',), entries)
+        + _sample_family('lowrated_coalesced_started_total', 'Calls that ran.', 'counter', ('group',), started)
+        + _sample_family('lowrated_coalesced_joined_total', 'Calls that joined one in flight.', 'counter', ('group',), joined)
+        + _sample_family('lowrated_coalesced_in_flight', 'Coalesced calls in flight.', 'gauge', ('group',), in_flight)
+    )
+
+
+def upstream_families(stats: dict) -> list:
+    """
+    Metric families from the upstream policies' counters and circuit states.
+
+    :param stats: upstream_stats() snapshot
+    """
+    counters = ('calls', 'retries', 'rate_limited', 'failed', 'short_circuited')
+    lines = []
+    for counter in counters:
+        samples = {(provider,): provider_stats[counter] for provider, provider_stats in stats.items()}
+        lines += _sample_family(
+            f'lowrated_upstream_{counter}_total', f'Upstream policy {counter.replace("_", " ")} count.',
+            'counter', ('provider',), samples
+        )
+    # Every call is one request plus its retries; each request is billed
+    attempts = {(provider,): s['calls'] + s['retries'] for provider, s in stats.items()}
+    lines += _sample_family(
+        'lowrated_upstream_requests_total', 'Upstream requests sent, retries included (a proxy for API spend).',
+        'counter', ('provider',), attempts
+    )
+    circuit = {(provider,): int(provider_stats['circuit'] != 'closed') for provider, provider_stats in stats.items()}
+    lines += _sample_family(
+        'lowrated_upstream_circuit_open', '1 while the provider circuit is open or half-open.',
+        'gauge', ('provider',), circuit
+    )
+    return lines
@@ -0,0 +1,152 @@
+from dataclasses import dataclass, field
+
+# The normalized shapes every provider module maps its raw results onto, so every
+# provider's businesses and reviews share one set of keys. Results leave the
+# provider modules as the dicts from to_dict() (the form cached, merged and
+# rendered by the templates); the classes are a schema, not a memory saving.
+
+
+def _first(raw: dict, *keys):
+    """Value of the first of `keys` that `raw` has a non-empty value for."""
+    for key in keys:
+        value = raw.get(key)
+        if value not in (None, ''):
+            return value
+    return None
+
+
+@dataclass(slots=True)
+class Review:
+    """One customer review, from Google Maps (via Outscraper or Apify) or Trustpilot."""
+
+    author: str = None
+    rating: float = None
+    text: str = None
+    date: str = None
+    title: str = None
+    id: str = None
+
+    @classmethod
+    def from_outscraper(cls, raw: dict) -> 'Review':
+        """Google Maps review from Outscraper's reviews-v3 `reviews_data`."""
+        return cls(
+            author=_first(raw, 'autor_name', 'author_title'),
+            rating=raw.get('review_rating'),
+            text=raw.get('review_text'),
+            date=raw.get('review_datetime_utc'),
+            id=raw.get('review_id')
+        )
+
+    @classmethod
+    def from_trustpilot(cls, raw: dict) -> 'Review':
+        """Trustpilot review from Outscraper's trustpilot/reviews endpoint."""
+        return cls(
+            author=_first(raw, 'author_title', 'consumer_name', 'author_name'),
+            rating=_first(raw, 'review_rating', 'rating'),
+            text=_first(raw, 'review_text', 'text'),
+            date=_first(raw, 'review_datetime_utc', 'review_date', 'date'),
+            title=raw.get('review_title'),
+            id=_first(raw, 'review_id', 'id')
+        )
+
+    @classmethod
+    def from_apify(cls, raw: dict) -> 'Review':
+        """Google Maps review from a compass/crawler-google-places dataset item."""
+        return cls(
+            author=raw.get('name'),
+            rating=raw.get('stars'),
+            text=raw.get('text'),
+            date=raw.get('publishedAtDate'),
+            id=raw.get('reviewId')
+        )
+
+    def to_dict(self) -> dict:
+        # Fields the provider does not supply (often title and id) are left out
+        return {name: getattr(self, name) for name in self.__slots__ if getattr(self, name) is not None}
+
+
+@dataclass(slots=True)
+class Business:
+    """A business listing with its (lowest-rated) reviews."""
+
+    name: str = None
+    address: str = None
+    rating: float = None
+    reviews_count: int = None
+    website: str = None
+    phone: str = None
+    reviews: list = field(default_factory=list)
+
+    @classmethod
+    def from_outscraper(cls, place: dict) -> 'Business':
+        """Place from Outscraper's reviews-v3 endpoint, with its `reviews_data`."""
+        return cls(
+            name=place.get('name'),
+            address=place.get('full_address'),
+            rating=place.get('rating'),
+            reviews_count=place.get('reviews'),
+            website=_first(place, 'site', 'website', 'domain'),
+            phone=place.get('phone'),
+            reviews=[Review.from_outscraper(review) for review in place.get('reviews_data') or []]
+        )
+
+    @classmethod
+    def from_google_places(cls, place: dict) -> 'Business':
+        """Place from the Places API (New) searchText endpoint."""
+        return cls(
+            name=(place.get('displayName') or {}).get('text'),
+            address=place.get('formattedAddress'),
+            rating=place.get('rating'),
+            reviews_count=place.get('userRatingCount'),
+            website=place.get('websiteUri'),
+            phone=place.get('nationalPhoneNumber')
+        )
+
+    @classmethod
+    def from_apify(cls, item: dict) -> 'Business':
+        """Dataset item from the compass/crawler-google-places actor."""
+        return cls(
+            name=item.get('title'),
+            address=item.get('address'),
+            rating=item.get('totalScore'),
+            reviews_count=item.get('reviewsCount'),
+            website=item.get('website'),
+            phone=item.get('phone'),
+            reviews=[Review.from_apify(review) for review in item.get('reviews') or []]
+        )
+
+    def to_dict(self) -> dict:
+        business = {name: getattr(self, name) for name in self.__slots__}
+        business['reviews'] = [review.to_dict() for review in self.reviews]
+        return business
+
+
+@dataclass(slots=True)
+class SearchHit:
+    """A web search result mentioning a business."""
+
+    title: str = ''
+    link: str = ''
+    snippet: str = ''
+    source: str = ''
+    date: str = ''
+    search_query: str = None
+    search_queries: list = field(default_factory=list)
+    negativity_score: float = None
+
+    @classmethod
+    def from_serp(cls, result: dict, query: str) -> 'SearchHit':
+        """Organic result from SerpAPI's Google engine, found by `query`."""
+        return cls(
+            title=result.get('title', ''),
+            link=result.get('link', ''),
+            snippet=result.get('snippet', ''),
+            source=result.get('source', ''),
+            date=result.get('date', ''),
+            search_query=query,
+            search_queries=[query]
+        )
+
+    def to_dict(self) -> dict:
+        # Shallow: search_queries stays shared, so later hits for other queries show up
+        return {name: getattr(self, name) for name in self.__slots__}
@@ -0,0 +1,152 @@
+import os
+import re
+import json
+import logging
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# JSON file with {"keyword or phrase": weight, ...} (or a plain list, weight 1 each)
+NEGATIVITY_LEXICON_PATH = os.getenv('NEGATIVITY_LEXICON_PATH')
+
+# Weight reflects how damaging a mention is: accusations of crime outrank rudeness
+DEFAULT_LEXICON = {
+    'scam': 3.0, 'scammer': 3.0, 'fraud': 3.0, 'fraudulent': 3.0, 'stolen': 3.0, 'theft': 3.0,
+    'lawsuit': 3.0, 'legal action': 3.0,
+    'rip off': 2.5, 'ripoff': 2.5, 'dishonest': 2.5,
+    'beware': 2.0, 'avoid': 2.0, 'worst': 2.0, 'terrible': 2.0, 'awful': 2.0, 'horrible': 2.0,
+    'complaint': 1.5, 'warning': 1.5, 'unprofessional': 1.5, 'rude': 1.5,
+    'refund': 1.0, 'money back': 1.0, 'disappointing': 1.0, 'poor': 1.0, 'negative': 1.0, 'bad': 1.0,
+}
+
+# Inflections matched after a keyword ("complaints", "refunded"); anything else
+# must end at a word boundary, so "bad" does not match "badminton" or "badge"
+_SUFFIXES = r'(?:s|es|ed|ing|er|ers)?'
+
+
+def _trie_pattern(keywords) -> str:
+    """
+    Regex alternation for a set of keywords, nested by shared prefix (a trie), so
+    the regex engine branches on each character instead of trying every keyword.
+    Spaces in phrases match any run of whitespace.
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node) -> str:
+        branches = [
+            (r'\s+' if char == ' ' else re.escape(char)) + build(child)
+            for char, child in sorted(node.items()) if char
+        ]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+
+class NegativityScorer:
+    """
+    Weighted negativity scoring with one compiled word-boundary regex: a text is
+    scanned once whatever the lexicon size. The score is the sum of the weights of
+    the distinct keywords found, so repeating one word does not inflate it.
+    """
+
+    def __init__(self, lexicon: dict):
+        self.weights = {
+            ' '.join(keyword.lower().split()): float(weight) for keyword, weight in lexicon.items() if keyword.strip()
+        }
+        # Texts are lowercased before matching (faster than re.IGNORECASE); the
+        # lookahead skips positions that cannot start a keyword
+        first_chars = re.escape(''.join(sorted({keyword[0] for keyword in self.weights})))
+        # An empty lexicon matches nothing (an empty character class would not compile)
+        self._pattern = (re.compile(rf'\b(?=[{first_chars}])({_trie_pattern(self.weights)}){_SUFFIXES}\b')
+                         if self.weights else re.compile(r'(?!)'))
+
+    def matches(self, text: str) -> set:
+        """Distinct lexicon keywords found in a text."""
+        weights = self.weights
+        # The captured keyword is the lexicon entry itself unless a phrase matched
+        # across other whitespace than one space ("rip  off", "money\nback")
+        return {
+            found if found in weights else ' '.join(found.split())
+            for found in self._pattern.findall((text or '').lower())
+        }
+
+    def score(self, text: str) -> float:
+        """Weighted negativity score of a text (0 when no keyword is found)."""
+        found = self.matches(text)
+        return sum(self.weights[keyword] for keyword in found) if found else 0.0
+
+    def is_negative(self, text: str) -> bool:
+        """Whether a text contains any lexicon keyword; stops at the first match."""
+        return self._pattern.search((text or '').lower()) is not None
+
+
+def _validate_lexicon(lexicon):
+    """
+    Check a loaded lexicon maps at least one keyword to a numeric weight.
+
+    :raises ValueError: The lexicon is empty, or has a blank keyword or a non-numeric weight
+    """
+    if not isinstance(lexicon, dict):
+        raise ValueError("expected a JSON object or list")
+    if not lexicon:
+        raise ValueError("the lexicon is empty")
+    for keyword, weight in lexicon.items():
+        if not isinstance(keyword, str) or not keyword.strip():
+            raise ValueError(f"blank or non-text keyword {keyword!r}")
+        if isinstance(weight, bool) or not isinstance(weight, (int, float)):
+            raise ValueError(f"weight of {keyword!r} is not a number: {weight!r}")
+
+
+def load_lexicon(path: str = None) -> dict:
+    """
+    Load a keyword lexicon from a JSON file, falling back to DEFAULT_LEXICON.
+
+    :param path: JSON file path (default: NEGATIVITY_LEXICON_PATH)
+    :return: Dict of keyword -> weight (DEFAULT_LEXICON when the file is missing,
+             unreadable, empty, or has a non-numeric weight)
+    """
+    path = path or NEGATIVITY_LEXICON_PATH
+    if not path:
+        return DEFAULT_LEXICON
+    try:
+        with open(path, encoding='utf-8') as lexicon_file:
+            lexicon = json.load(lexicon_file)
+        if isinstance(lexicon, list):
+            lexicon = {keyword: 1.0 for keyword in lexicon}
+        _validate_lexicon(lexicon)
+        logger.info(f"Loaded {len(lexicon)} negativity keywords from {path}")
+        return lexicon
+    except (OSError, ValueError, TypeError) as e:
+        logger.error(f"Could not load negativity lexicon from {path}, using defaults: {e}")
+        return DEFAULT_LEXICON
+
+
+_scorer = None
+
+
+def get_scorer() -> NegativityScorer:
+    """
+    Return the shared scorer, compiling the configured lexicon on first use.
+    """
+    global _scorer
+    if _scorer is None:
+        _scorer = NegativityScorer(load_lexicon())
+    return _scorer
+
+
+def negativity_score(text: str) -> float:
+    """Weighted negativity score of a text using the configured lexicon."""
+    return get_scorer().score(text)
+
@@ -1,7 +1,10 @@
 import os
 from dotenv import load_dotenv
 import logging
-from outscraper import ApiClient
+from app.upstream import get_policy, UpstreamError
+from app.providers import provider_errors
+from app.cache import cached, cached_stream
+from app.models import Business
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -10,64 +13,143 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 API_KEY = os.getenv("OUTSCRAPER_API_KEY")
-client = ApiClient(api_key=API_KEY)
+API_URL = "https://api.app.outscraper.com"
 
+# Synchronous (async=false) Outscraper requests hold the connection open until the
+# scrape finishes, which can take a few minutes for review-heavy queries.
+REQUEST_TIMEOUT = 300.0
+
+
+async def _outscraper_get(path: str, params: dict) -> list:
+    """
+    Issue a synchronous-mode GET against the Outscraper API and return its `data` list.
+    """
+    response = await get_policy('outscraper').request(
+        "GET",
+        f"{API_URL}{path}",
+        params={key: value for key, value in params.items() if value is not None},
+        headers={"X-API-KEY": API_KEY or ""},
+        timeout=REQUEST_TIMEOUT
+    )
+    response.raise_for_status()
+    return response.json().get("data", [])
+
+
+async def _iter_places(query: str, limit: int):
+    """
+    Yield lowest-rated businesses matching the query.
+    """
+    logger.info(f"Making API request to Outscraper with query: {query}")
+
+    # Use the reviews-v3 endpoint with proper parameters
+    results = await _outscraper_get("/maps/reviews-v3", {
+        "query": query,
+        "reviewsLimit": 5,  # Get 5 reviews per business
+        "limit": limit,      # Number of businesses to return
+        "sort": "lowest_rating",  # Sort by lowest rating
+        "cutoffRating": 2,  # Only include businesses with rating below 4
+        "language": "en",
+        "async": False,
+        #"reviewsQuery": "the"
+    })
+
+    logger.info(f"Received results from API")
+
+    if not results or not isinstance(results, list):
+        logger.error(f"Invalid response format: {results}")
+        return
+
+    for place in results:
+        if not place:
+            continue
+
+        yield Business.from_outscraper(place).to_dict()
+
+
+async def iter_negative_reviews(query: str, limit: int = 5):
+    """
+    Yield lowest-rated businesses matching the query, one at a time as each is parsed.
+    Upstream errors propagate to the caller.
+    """
+    async for business in _iter_places(query, limit):
+        yield business
+
+
+async def _search_place_ids(query: str, limit: int, skip: int) -> list:
+    """
+    Place ids of the businesses matching the query, skipping the first `skip`.
+    search-v3 is the endpoint that documents `skip`; reviews-v3 takes no offset.
+    """
+    results = await _outscraper_get("/maps/search-v3", {
+        "query": query,
+        "limit": limit,
+        "skip": skip or None,
+        "language": "en",
+        "async": False,
+    })
+    # One list of places per query
+    places = results[0] if results and isinstance(results[0], list) else results
+    return [place["place_id"] for place in places or [] if place and place.get("place_id")]
+
+
+async def _places_reviews(place_ids: list) -> list:
+    """
+    Lowest-rated businesses for a list of place ids, in that order, each with its
+    lowest-rated reviews (one reviews-v3 request for the whole list).
+    """
+    results = await _outscraper_get("/maps/reviews-v3", {
+        "query": place_ids,
+        "reviewsLimit": 5,
+        "limit": 1,  # One place per place id
+        "sort": "lowest_rating",
+        "cutoffRating": 2,
+        "language": "en",
+        "async": False,
+    })
+    # Each place echoes the place id it was requested by as `query`
+    places = {place.get("place_id") or place.get("query"): place for place in results or [] if place}
+    return [Business.from_outscraper(places[place_id]).to_dict() for place_id in place_ids if place_id in places]
+
+
+@cached('outscraper')
+async def get_negative_reviews_page(query: str, offset: int = 0, page_size: int = 5) -> dict:
+    """
+    Get one page of lowest-rated businesses, starting after the first `offset`.
+    The page's places are listed with search-v3 (which pages by `skip`) and their
+    reviews fetched with reviews-v3.
+
+    :return: {"results": [...], "place_ids": ids of the page's places,
+              "next_offset": offset of the next page, or None after the last}
+    :raises UpstreamError: Outscraper is rate limiting, unavailable or rejected the request
+    """
+    logger.info(f"Fetching Outscraper page for query: {query} (offset {offset})")
+    with provider_errors('outscraper'):
+        place_ids = await _search_place_ids(query, page_size, offset)
+        businesses = await _places_reviews(place_ids) if place_ids else []
+    next_offset = offset + len(place_ids) if len(place_ids) >= page_size else None
+    return {"results": businesses, "place_ids": place_ids, "next_offset": next_offset}
+
+
+@cached('outscraper')
 async def get_negative_reviews(query: str, limit: int = 5):
     """
     Get lowest-rated businesses matching the query using the reviews-v3 endpoint.
     """
     try:
-        logger.info(f"Making API request to Outscraper with query: {query}")
-        
-        # Use the reviews-v3 endpoint with proper parameters
-        results = client.google_maps_reviews(
-            query,
-            reviews_limit=5,  # Get 5 reviews per business
-            limit=limit,      # Number of businesses to return
-            sort="lowest_rating",  # Sort by lowest rating
-            cutoff_rating=2,  # Only include businesses with rating below 4
-            language="en",
-            #reviews_query="the"
-        )
-        
-        logger.info(f"Received results from API")
-        
-        if not results or not isinstance(results, list):
-            logger.error(f"Invalid response format: {results}")
-            return []
-            
-        businesses = []
-        for place in results:
-            if not place:
-                continue
-                
-            business = {
-                "name": place.get("name"),
-                "address": place.get("full_address"),
-                "rating": place.get("rating"),
-                "reviews_count": place.get("reviews"),
-                "website": place.get("site") or place.get("website") or place.get("domain"),
-                "reviews": []
-            }
-            
-            # Add reviews if available
-            reviews_data = place.get("reviews_data", [])
-            for review in reviews_data:
-                business["reviews"].append({
-                    "author": review.get("autor_name"),
-                    "rating": review.get("review_rating"),
-                    "text": review.get("review_text"),
-                    "date": review.get("review_datetime_utc")
-                })
-            
-            businesses.append(business)
-        
+        businesses = [business async for business in iter_negative_reviews(query, limit)]
         logger.info(f"Processed {len(businesses)} businesses")
         return businesses
-        
+
+    except UpstreamError:
+        # Rate limits and outages are reported to the caller, not shown as "no results"
+        raise
     except Exception as e:
         logger.error(f"Error occurred: {str(e)}")
-        return [] 
+        return []
+
+
+# Streaming search mode: same cache entries as get_negative_reviews
+stream_negative_reviews = cached_stream('outscraper', 'get_negative_reviews')(iter_negative_reviews)
 
 async def get_trustpilot_reviews(domain: str, limit: int = 10):
     """
@@ -75,13 +157,13 @@ async def get_trustpilot_reviews(domain: str, limit: int = 10):
     """
     try:
         logger.info(f"Fetching Trustpilot reviews for domain: {domain}")
-        results = client.trustpilot_reviews(
-            [domain],
-            limit=limit,
-            sort="recency",
-            language="en",
-            async_req=False
-        )
+        results = await _outscraper_get("/trustpilot/reviews", {
+            "query": [domain],
+            "limit": limit,
+            "sort": "recency",
+            "languages": "en",
+            "async": False
+        })
         logger.info(f"Trustpilot API response: {results}")
         reviews = []
         if results and isinstance(results, list) and len(results) > 0:
@@ -94,6 +176,8 @@ async def get_trustpilot_reviews(domain: str, limit: int = 10):
                     "date": review.get("date")
                 })
         return reviews
+    except UpstreamError:
+        raise
     except Exception as e:
         logger.error(f"Trustpilot error: {str(e)}")
-        return [] 
\ No newline at end of file
+        return []
@@ -0,0 +1,51 @@
+import os
+import json
+import base64
+import binascii
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Results per page of a paginated search, per provider (Google Places allows at most 20)
+DEFAULT_PAGE_SIZES = {
+    'outscraper': int(os.getenv('PAGE_SIZE_OUTSCRAPER', '5')),
+    'google_places': min(20, int(os.getenv('PAGE_SIZE_GOOGLE_PLACES', '20'))),
+    'apify': int(os.getenv('PAGE_SIZE_APIFY', '5')),
+}
+MAX_PAGE_SIZE = 50
+
+
+class InvalidCursorError(ValueError):
+    """A cursor that was not issued by this app or was altered."""
+
+
+def encode_cursor(state: dict) -> str:
+    """
+    Turn a provider's position (page token, offset, dataset offset) plus the
+    search it belongs to into an opaque URL-safe cursor.
+    """
+    payload = json.dumps(state, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> dict:
+    """
+    Read a cursor made by encode_cursor.
+
+    :raises InvalidCursorError: The cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, UnicodeError, binascii.Error) as e:
+        raise InvalidCursorError("Invalid cursor") from e
+    if not isinstance(state, dict) or state.get('provider') not in DEFAULT_PAGE_SIZES:
+        raise InvalidCursorError("Invalid cursor")
+    return state
+
+
+def page_size_for(provider: str, page_size: int = None) -> int:
+    """Requested page size clamped to 1..MAX_PAGE_SIZE (Google Places: 20), or the provider default."""
+    if not page_size:
+        return DEFAULT_PAGE_SIZES[provider]
+    return max(1, min(page_size, 20 if provider == 'google_places' else MAX_PAGE_SIZE))
@@ -0,0 +1,124 @@
+import os
+import sys
+import time
+import logging
+import importlib
+from contextlib import contextmanager
+import httpx
+from dotenv import load_dotenv
+from app.upstream import UpstreamError, UpstreamFailedError
+
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ProviderNotConfiguredError(UpstreamError):
+    """A provider was asked for whose credentials are not set."""
+    kind = 'not_configured'
+    status_code = 503
+
+
+# Error responses meaning the provider rejected our credentials
+AUTH_STATUSES = {401, 403}
+
+
+def provider_error(name: str, message: str, status_code: int = None) -> UpstreamError:
+    """
+    The UpstreamError for an error response the upstream policy does not retry
+    (bad key, bad request, failed crawl), so callers report it like an outage.
+
+    :param status_code: HTTP status of the response, if any
+    :return: ProviderNotConfiguredError when the credentials were rejected, else UpstreamFailedError
+    """
+    if status_code in AUTH_STATUSES:
+        return ProviderNotConfiguredError(name, f"{message} (check {', '.join(PROVIDERS[name].credentials)})")
+    return UpstreamFailedError(name, message)
+
+
+@contextmanager
+def provider_errors(name: str):
+    """Raise error responses (httpx.HTTPStatusError) from the block as provider_error."""
+    try:
+        yield
+    except httpx.HTTPStatusError as e:
+        raise provider_error(name, f"{name} request failed: HTTP {e.response.status_code}",
+                             e.response.status_code) from e
+
+
+class Provider:
+    """
+    A provider integration: the module implementing it and the environment
+    variables it needs. Search provider modules are imported on first use, not at
+    startup; the reputation pipeline's (lazy=False) are imported at startup and
+    registered for the readiness report.
+    """
+
+    def __init__(self, name: str, module: str, credentials: tuple, label: str, lazy: bool = True):
+        self.name = name
+        self.module = module
+        self.credentials = credentials
+        self.label = label
+        self.lazy = lazy
+
+    @property
+    def configured(self) -> bool:
+        return all(os.getenv(variable) for variable in self.credentials)
+
+    @property
+    def loaded(self) -> bool:
+        return self.module in sys.modules
+
+
+PROVIDERS = {provider.name: provider for provider in (
+    Provider('outscraper', 'app.outscraper', ('OUTSCRAPER_API_KEY',), 'Outscraper (Google Maps reviews)'),
+    Provider('google_places', 'app.google_places', ('GOOGLE_API_KEY',), 'Google Places'),
+    Provider('apify', 'app.apify_places', ('APIFY_TOKEN',), 'Apify (Google Maps crawler)'),
+    # Reputation pipeline; Trustpilot reviews are fetched through Outscraper
+    Provider('trustpilot', 'app.trustpilot', ('OUTSCRAPER_API_KEY',), 'Trustpilot (via Outscraper)', lazy=False),
+    Provider('serpapi', 'app.serp_search', ('SERPAPI_KEY',), 'SerpAPI web mentions', lazy=False),
+    Provider('openai', 'app.ai_analyzer', ('OPENAI_API_KEY',), 'OpenAI analysis', lazy=False),
+)}
+
+
+def is_configured(name: str) -> bool:
+    provider = PROVIDERS.get(name)
+    return provider is not None and provider.configured
+
+
+def get_provider(name: str):
+    """
+    Get a provider's module, importing it on first use.
+
+    :param name: Provider name, e.g. 'outscraper'
+    :return: The provider module
+    :raises ProviderNotConfiguredError: The provider's credentials are not set
+    :raises KeyError: Unknown provider
+    """
+    provider = PROVIDERS[name]
+    if not provider.configured:
+        raise ProviderNotConfiguredError(
+            name, f"{provider.label} is not configured (set {', '.join(provider.credentials)})"
+        )
+    module = sys.modules.get(provider.module)
+    if module is None:
+        start = time.perf_counter()
+        module = importlib.import_module(provider.module)
+        logger.info(f"Loaded provider {name} in {(time.perf_counter() - start) * 1000:.1f}ms")
+    return module
+
+
+def provider_status() -> dict:
+    """
+    Which providers are configured (usable), already loaded, and imported on
+    first use rather than at startup, for the readiness report.
+
+    :return: Dict of provider name -> {"label", "configured", "loaded", "lazy"}
+    """
+    return {
+        name: {"label": provider.label, "configured": provider.configured, "loaded": provider.loaded,
+               "lazy": provider.lazy}
+        for name, provider in PROVIDERS.items()
+    }
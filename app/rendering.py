@@ -0,0 +1,106 @@
+import os
+import hashlib
+import logging
+from collections import OrderedDict
+import orjson
+from dotenv import load_dotenv
+from starlette.requests import Request
+from starlette.responses import Response
+
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Rendered business cards kept in memory (0 disables the fragment cache)
+CARD_CACHE_MAX_ENTRIES = int(os.getenv('CARD_CACHE_MAX_ENTRIES', '2000'))
+
+
+def record_hash(record) -> str:
+    """Stable hash of a JSON-like record (dict key order does not matter)."""
+    return hashlib.sha1(orjson.dumps(record, option=orjson.OPT_SORT_KEYS, default=str)).hexdigest()
+
+
+class FragmentCache:
+    """
+    In-memory LRU cache of rendered template fragments, keyed by template, a hash
+    of the record rendered and any extra render arguments. Repeated searches and
+    pages re-render only the cards whose data changed.
+    """
+
+    def __init__(self, max_entries: int = CARD_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._fragments = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, template, record: dict, **kwargs) -> str:
+        """
+        Render `template` with `record` and `kwargs`, or return the fragment
+        rendered last time for the same record and arguments.
+
+        :param template: Jinja2 template; rendered as template.render(result=record, **kwargs)
+        :param record: Record the fragment shows
+        :return: Rendered HTML
+        """
+        if self.max_entries <= 0:
+            return template.render(result=record, **kwargs)
+        key = (template.name, record_hash(record), tuple(sorted(kwargs.items())))
+        fragment = self._fragments.get(key)
+        if fragment is not None:
+            self._fragments.move_to_end(key)
+            self.hits += 1
+            return fragment
+        self.misses += 1
+        fragment = template.render(result=record, **kwargs)
+        self._fragments[key] = fragment
+        while len(self._fragments) > self.max_entries:
+            self._fragments.popitem(last=False)
+        return fragment
+
+    def clear(self):
+        self._fragments.clear()
+
+    def get_stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._fragments)}
+
+
+card_cache = FragmentCache()
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak If-None-Match comparison (W/ prefixes ignored), as for GET requests."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    bare = etag[2:] if etag.startswith('W/') else etag
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith('W/') else tag) == bare:
+            return True
+    return False
+
+
+def conditional_response(request: Request, response: Response) -> Response:
+    """
+    Add an ETag (a hash of the body) to a fully rendered 200 response, and answer
+    304 Not Modified when the request's If-None-Match already has it. The page
+    is marked no-cache, so browsers revalidate a repeated search instead of
+    reusing stale results, and a revalidation that matches costs no body.
+
+    :param request: The request being answered
+    :param response: Rendered response (not streamed)
+    :return: `response` with ETag and Cache-Control, or a 304 response
+    """
+    if response.status_code != 200:
+        return response
+    etag = f'"{hashlib.sha1(response.body).hexdigest()}"'
+    response.headers['etag'] = etag
+    response.headers['cache-control'] = 'no-cache'
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        headers = {name: value for name, value in response.headers.items()
+                   if name not in ('content-length', 'content-type')}
+        return Response(status_code=304, headers=headers)
+    return response
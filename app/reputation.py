@@ -0,0 +1,163 @@
+import os
+import logging
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+from app.trustpilot import get_trustpilot_reviews
+from app.serp_search import search_negative_mentions, iter_negative_mentions, order_mentions
+from app.ai_analyzer import analyze_reputation_data, stream_reputation_analysis, get_risk_level_color, get_risk_level_bg
+from app.singleflight import SingleFlight
+from app.upstream import UpstreamError, error_payload
+from app.metrics import timed_stage
+
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Trustpilot reviews fetched per reputation search; more than fit in one prompt are analyzed by map-reduce
+REPUTATION_TRUSTPILOT_LIMIT = int(os.getenv('REPUTATION_TRUSTPILOT_LIMIT', '3'))
+
+reputation_flights = SingleFlight('ai-search')
+
+
+def normalize_domain(domain: str) -> str:
+    """
+    Reduce a URL or domain to a bare lowercase host, e.g. 'https://www.Acme.com/about' -> 'acme.com'.
+
+    :param domain: URL or domain name
+    :return: Normalized domain
+    """
+    domain = domain.strip()
+    parsed = urlparse(domain if '://' in domain else f'https://{domain}')
+    host = (parsed.netloc or parsed.path).lower().split('@')[-1].split(':')[0].rstrip('.')
+    return host[4:] if host.startswith('www.') else host
+
+
+def business_name_from_domain(domain: str) -> str:
+    """
+    Extract the business name used for web searches from a domain.
+
+    :param domain: URL or domain name
+    :return: Business name (first label of the host)
+    """
+    parsed_domain = urlparse(domain if domain.startswith('http') else f'https://{domain}')
+    return parsed_domain.netloc.replace('www.', '').split('.')[0]
+
+
+async def fetch_trustpilot_reviews(domain: str, refresh: bool, errors: list) -> list:
+    """
+    Get Trustpilot reviews for the pipeline. A rate-limited or unavailable
+    Trustpilot lookup is recorded in `errors` and the analysis goes on without it.
+    """
+    try:
+        return await get_trustpilot_reviews([domain], limit=REPUTATION_TRUSTPILOT_LIMIT, refresh=refresh)
+    except UpstreamError as e:
+        logger.error(f"Trustpilot lookup for {domain} failed: {e}")
+        errors.append(e)
+        return []
+
+
+async def run_reputation_analysis(domain: str, refresh: bool = False) -> dict:
+    """
+    Run the Trustpilot -> SERP -> OpenAI pipeline for one domain.
+
+    :param domain: URL or domain name of the business
+    :param refresh: Bypass cached provider results and memoized analyses
+    :return: Response payload for /api/ai-search
+    """
+    # Extract business name from domain
+    business_name = business_name_from_domain(domain)
+    upstream_errors = []
+
+    # Get existing Trustpilot data if available
+    with timed_stage('trustpilot'):
+        trustpilot_reviews = await fetch_trustpilot_reviews(domain, refresh, upstream_errors)
+
+    # Perform SERP search for negative mentions
+    with timed_stage('serp'):
+        search_results = await search_negative_mentions(business_name, limit=15, errors=upstream_errors)
+
+    # Analyze with AI
+    with timed_stage('analysis'):
+        ai_analysis = await analyze_reputation_data(
+            business_name=business_name,
+            search_results=search_results,
+            trustpilot_data=trustpilot_reviews,
+            refresh=refresh
+        )
+
+    return build_response(ai_analysis, business_name, search_results, trustpilot_reviews, upstream_errors)
+
+
+def build_response(ai_analysis: dict, business_name: str, search_results: list, trustpilot_reviews: list,
+                   upstream_errors: list = None) -> dict:
+    """
+    Decorate an analysis for the UI and wrap it in the /api/ai-search payload.
+    `upstream_errors` lists the provider calls that were rate limited or failed, so
+    missing data is not mistaken for a clean record.
+    """
+    # Add UI styling classes
+    ai_analysis['risk_color'] = get_risk_level_color(ai_analysis.get('risk_level', 'Unknown'))
+    ai_analysis['risk_bg'] = get_risk_level_bg(ai_analysis.get('risk_level', 'Unknown'))
+    ai_analysis['search_results'] = search_results
+    ai_analysis['business_name'] = business_name
+
+    return {
+        "success": True,
+        "analysis": ai_analysis,
+        "search_count": len(search_results),
+        "trustpilot_count": len(trustpilot_reviews) if trustpilot_reviews else 0,
+        "upstream_errors": list({
+            (error.provider, error.kind): error_payload(error) for error in upstream_errors or []
+        }.values())
+    }
+
+
+async def stream_reputation_events(domain: str, refresh: bool = False):
+    """
+    Run the reputation pipeline, yielding each stage's output as soon as it is ready.
+
+    Yields (event, data) pairs: 'stage' markers, 'trustpilot' with the reviews,
+    one 'serp' per negative mention as its query returns, 'token' chunks of the
+    model output, and finally 'result' with the same payload as /api/ai-search.
+
+    :param domain: URL or domain name of the business
+    :param refresh: Bypass cached provider results and memoized analyses
+    """
+    business_name = business_name_from_domain(domain)
+    upstream_errors = []
+
+    yield 'stage', {"stage": "trustpilot", "business_name": business_name}
+    with timed_stage('trustpilot'):
+        trustpilot_reviews = await fetch_trustpilot_reviews(domain, refresh, upstream_errors)
+    yield 'trustpilot', {"reviews": trustpilot_reviews, "count": len(trustpilot_reviews)}
+
+    yield 'stage', {"stage": "serp"}
+    entries = []
+    with timed_stage('serp'):
+        async for entry in iter_negative_mentions(business_name, limit=15, errors=upstream_errors):
+            entries.append(entry)
+            yield 'serp', entry[1]
+    search_results = order_mentions(entries)
+
+    yield 'stage', {"stage": "analysis"}
+    ai_analysis = None
+    with timed_stage('analysis'):
+        async for event in stream_reputation_analysis(business_name, search_results, trustpilot_reviews, refresh):
+            if event["type"] == "token":
+                yield 'token', {"content": event["content"]}
+            else:
+                ai_analysis = event["analysis"]
+
+    yield 'result', build_response(ai_analysis, business_name, search_results, trustpilot_reviews, upstream_errors)
+
+
+async def coalesced_reputation_analysis(domain: str, refresh: bool = False) -> dict:
+    """
+    Run the reputation pipeline, sharing one in-flight run between concurrent
+    requests for the same normalized domain.
+    """
+    return await reputation_flights.do(
+        normalize_domain(domain), run_reputation_analysis, domain, refresh, fresh=refresh
+    )
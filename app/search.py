@@ -0,0 +1,163 @@
+import logging
+from app.federated import federated_search, stream_federated_search
+from app.providers import get_provider
+from app.pagination import encode_cursor, decode_cursor, page_size_for
+from app.upstream import UpstreamError
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def search_businesses(category: str, location: str, api_choice: str, refresh: bool = False) -> list:
+    """
+    Run a business search against the selected provider.
+
+    :param category: Business category, e.g. 'Dentist'
+    :param location: Location, e.g. 'Dubai'
+    :param api_choice: 'outscraper', 'google_places', 'apify' or 'all'
+    :param refresh: Bypass cached provider results
+    :return: List of business dicts
+    :raises UpstreamError: The provider is rate limiting, unavailable or not configured
+    """
+    query = f"{category} in {location}"
+
+    if api_choice == "outscraper":
+        return await get_provider('outscraper').get_negative_reviews(query, refresh=refresh)
+    elif api_choice == "google_places":
+        return await get_provider('google_places').get_low_rated_places(query, refresh=refresh)
+    elif api_choice == "apify":
+        return await get_provider('apify').get_apify_low_rated_places(category, location, refresh=refresh)
+    elif api_choice == "all":
+        return (await federated_search(category, location, refresh=refresh))["results"]
+    return []
+
+
+async def stream_businesses(category: str, location: str, api_choice: str, refresh: bool = False, status: dict = None):
+    """
+    Yield businesses from the selected provider as soon as each one is parsed.
+    A provider error ends the stream early, mirroring the empty list returned by
+    search_businesses; a rate limit or outage is also recorded as status['error'].
+
+    :param category: Business category, e.g. 'Dentist'
+    :param location: Location, e.g. 'Dubai'
+    :param api_choice: 'outscraper', 'google_places', 'apify' or 'all'
+    :param refresh: Bypass cached provider results
+    :param status: Optional dict receiving an 'error' message for rate limits and outages
+    """
+    query = f"{category} in {location}"
+    if api_choice not in ("outscraper", "google_places", "apify", "all"):
+        return
+
+    try:
+        if api_choice == "outscraper":
+            businesses = get_provider('outscraper').stream_negative_reviews(query, refresh=refresh)
+        elif api_choice == "google_places":
+            businesses = get_provider('google_places').stream_low_rated_places(query, refresh=refresh)
+        elif api_choice == "apify":
+            businesses = get_provider('apify').stream_apify_low_rated_places(category, location, refresh=refresh)
+        else:
+            businesses = stream_federated_search(category, location, refresh=refresh)
+        async for business in businesses:
+            yield business
+    except UpstreamError as e:
+        logger.error(f"Streaming search via {api_choice} failed: {e}")
+        if status is not None:
+            status['error'] = str(e)
+    except Exception as e:
+        logger.error(f"Streaming search via {api_choice} failed: {e}")
+
+
+async def search_page(category: str = None, location: str = None, api_choice: str = None, cursor: str = None,
+                      page_size: int = None, refresh: bool = False) -> dict:
+    """
+    Get one page of a paginated business search. The first page is requested by
+    category, location and provider; later pages by the returned cursor alone,
+    which records the search and the provider's position (Google page token,
+    Outscraper offset and last page's place ids, Apify run and dataset offset).
+    Only the requested page is fetched, so deep result sets cost nothing until
+    they are asked for.
+
+    "All providers" searches are not paginated: their merged first page is
+    returned with no cursor.
+
+    :param category: Business category, e.g. 'Dentist' (first page)
+    :param location: Location, e.g. 'Dubai' (first page)
+    :param api_choice: 'outscraper', 'google_places', 'apify' or 'all' (first page)
+    :param cursor: next_cursor of the previous page
+    :param page_size: Results per page (default per provider, see app/pagination.py)
+    :param refresh: Bypass cached pages
+    :return: {"results": [...], "next_cursor": str, or None after the last page}
+    :raises InvalidCursorError: The cursor is malformed
+    :raises UpstreamError: The provider is rate limiting, unavailable or not configured
+    """
+    if cursor:
+        state = decode_cursor(cursor)
+        category, location, api_choice = state['category'], state['location'], state['provider']
+        page_size = state.get('page_size') or page_size
+    else:
+        state = {'category': category, 'location': location, 'provider': api_choice}
+        if api_choice == "all":
+            return {"results": await search_businesses(category, location, api_choice, refresh=refresh), "next_cursor": None}
+        if api_choice not in ("outscraper", "google_places", "apify"):
+            return {"results": [], "next_cursor": None}
+    page_size = page_size_for(api_choice, page_size)
+    state['page_size'] = page_size
+    query = f"{category} in {location}"
+
+    if api_choice == "outscraper":
+        page = await get_provider('outscraper').get_negative_reviews_page(query, state.get('offset', 0), page_size, refresh=refresh)
+        results, more = page["results"], page["next_offset"] is not None
+        # A page repeating the previous page's places means the offset was not
+        # applied; stop rather than serve the same page forever
+        previous = set(state.get('place_ids') or ())
+        if previous and previous.issuperset(page["place_ids"]):
+            results, more = [], False
+        state.update(offset=page["next_offset"], place_ids=page["place_ids"])
+    elif api_choice == "google_places":
+        results, token = await get_provider('google_places').get_low_rated_places_page(query, state.get('page_token'), page_size)
+        more = bool(token)
+        state['page_token'] = token
+    else:
+        page = await get_provider('apify').get_apify_low_rated_page(
+            category, location, state.get('run_id'), state.get('dataset_id'), state.get('offset', 0), page_size,
+            refresh=refresh
+        )
+        results, more = page["results"], page["next_offset"] is not None
+        state.update(run_id=page["run_id"], dataset_id=page["dataset_id"], offset=page["next_offset"])
+
+    logger.info(f"Search page via {api_choice}: {len(results)} results, {'more' if more else 'last page'}")
+    return {"results": results, "next_cursor": encode_cursor(state) if more else None}
+
+
+async def iter_search_results(page: dict, refresh: bool = False, limit: int = None, status: dict = None):
+    """
+    Yield every result of a paginated search, from `page` (as returned by
+    search_page) onward. The next page is fetched only once the results before
+    it have been consumed, so at most one page is held in memory however deep
+    the search goes; pages already fetched are read from the cache.
+
+    A provider error on a later page ends the iteration, like stream_businesses;
+    it is recorded as status['error'].
+
+    :param page: First page, from search_page
+    :param refresh: Bypass cached pages
+    :param limit: Stop after this many results
+    :param status: Optional dict receiving an 'error' message
+    """
+    count = 0
+    while True:
+        for result in page["results"]:
+            if limit is not None and count >= limit:
+                return
+            count += 1
+            yield result
+        if not page["next_cursor"]:
+            return
+        try:
+            page = await search_page(cursor=page["next_cursor"], refresh=refresh)
+        except Exception as e:
+            logger.error(f"Search results stopped after {count}: {e}")
+            if status is not None:
+                status['error'] = str(e)
+            return
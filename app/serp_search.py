@@ -1,7 +1,10 @@
 import os
+import asyncio
 import logging
-import serpapi
 from dotenv import load_dotenv
+from app.upstream import get_policy, UpstreamError
+from app.negativity import get_scorer
+from app.models import SearchHit
 
 load_dotenv()
 
@@ -11,35 +14,58 @@ logger = logging.getLogger(__name__)
 
 # SerpAPI key
 SERPAPI_KEY = os.getenv('SERPAPI_KEY')
+SERPAPI_URL = 'https://serpapi.com/search.json'
 
+# Maximum number of SerpAPI requests in flight per search_negative_mentions call
+SERP_CONCURRENCY = int(os.getenv('SERP_CONCURRENCY', '5'))
 
-def search_negative_mentions(business_name: str, limit: int = 10):
+
+async def serpapi_search(params: dict) -> dict:
     """
-    Search for negative mentions, reviews, and complaints about a business.
-    
+    Run a single SerpAPI search over the shared HTTP client.
+
+    :param params: SerpAPI query parameters (api_key is added if missing)
+    :return: Parsed JSON response
+    """
+    response = await get_policy('serpapi').request("GET", SERPAPI_URL, params={"api_key": SERPAPI_KEY, **params})
+    response.raise_for_status()
+    return response.json()
+
+
+async def iter_negative_mentions(business_name: str, limit: int = 10, concurrency: int = None, errors: list = None,
+                                 recency: str = None):
+    """
+    Yield negative mentions of a business as soon as each SERP query returns.
+
+    All query templates are sent concurrently (at most `concurrency` in flight) and
+    the remaining queries are cancelled once `limit` negative results are in. A link
+    returned by several queries is yielded once; later matches are added to its
+    `search_queries` list in place.
+
     :param business_name: Name of the business to search for
-    :param limit: Maximum number of results to return
-    :return: List of search results with negative mentions
+    :param limit: Maximum number of results to yield
+    :param concurrency: Maximum simultaneous SerpAPI requests (default: SERP_CONCURRENCY)
+    :param errors: Optional list collecting UpstreamErrors of failed queries
+    :param recency: Only pages indexed in the past 'd'ay, 'w'eek, 'm'onth or 'y'ear
+    :return: Async iterator of ((query_index, rank), result) pairs
     """
     if not SERPAPI_KEY:
         logger.error("SERPAPI_KEY not found in environment variables")
-        return []
-        
-    try:
-        # Search queries for negative mentions
-        search_queries = [
-            f'"{business_name}" negative reviews',
-            f'"{business_name}" complaints',
-            f'"{business_name}" scam',
-            f'"{business_name}" bad service',
-            f'"{business_name}" fraud'
-        ]
-        
-        all_results = []
-        
-        for query in search_queries:
+        return
+
+    # Search queries for negative mentions
+    search_queries = [
+        f'"{business_name}" negative reviews',
+        f'"{business_name}" complaints',
+        f'"{business_name}" scam',
+        f'"{business_name}" bad service',
+        f'"{business_name}" fraud'
+    ]
+    semaphore = asyncio.Semaphore(max(1, concurrency or SERP_CONCURRENCY))
+
+    async def run_query(query: str):
+        async with semaphore:
             logger.info(f"Searching: {query}")
-            
             params = {
                 "q": query,
                 "api_key": SERPAPI_KEY,
@@ -48,57 +74,88 @@ def search_negative_mentions(business_name: str, limit: int = 10):
                 "hl": "en",   # Language
                 "engine": "google"  # Specify Google search engine
             }
-            
-            results = serpapi.search(params)
-            
+            if recency:
+                params["tbs"] = f"qdr:{recency}"
+            return query, await serpapi_search(params)
+
+    query_order = {query: index for index, query in enumerate(search_queries)}
+    tasks = [asyncio.create_task(run_query(query)) for query in search_queries]
+    seen = {}
+
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                query, results = await next_done
+            except UpstreamError as e:
+                logger.error(f"SERP query failed for {business_name}: {e}")
+                if errors is not None:
+                    errors.append(e)
+                continue
+            except Exception as e:
+                logger.error(f"SERP query failed for {business_name}: {e}")
+                continue
+
             # Extract organic results
-            organic_results = results.get("organic_results", [])
-            
-            for result in organic_results:
-                result_data = {
-                    "title": result.get("title", ""),
-                    "link": result.get("link", ""),
-                    "snippet": result.get("snippet", ""),
-                    "search_query": query,
-                    "source": result.get("source", "")
-                }
-                
+            for rank, result in enumerate(results.get("organic_results", [])):
+                hit = SearchHit.from_serp(result, query)
+
                 # Filter for potentially negative content
-                if is_potentially_negative(result_data):
-                    all_results.append(result_data)
-                    
-                if len(all_results) >= limit:
-                    break
-                    
-            if len(all_results) >= limit:
-                break
-                
-        logger.info(f"Found {len(all_results)} potentially negative results for {business_name}")
-        return all_results[:limit]
-        
-    except Exception as e:
-        logger.error(f"Error during SERP search for {business_name}: {e}")
-        return []
-
-
-def is_potentially_negative(result_data: dict) -> bool:
+                hit.negativity_score = get_scorer().score(f"{hit.title} {hit.snippet}")
+                if not hit.negativity_score:
+                    continue
+
+                key = hit.link or (hit.title, hit.snippet)
+                existing = seen.get(key)
+                if existing is not None:
+                    if query not in existing["search_queries"]:
+                        existing["search_queries"].append(query)
+                    continue
+
+                result_data = hit.to_dict()
+                seen[key] = result_data
+                yield (query_order[query], rank), result_data
+                if len(seen) >= limit:
+                    return
+
+    finally:
+        # Early cutoff: drop queries whose results are no longer needed
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def order_mentions(entries: list) -> list:
     """
-    Check if a search result potentially contains negative content.
-    
-    :param result_data: Dictionary containing search result data
-    :return: True if potentially negative, False otherwise
+    Sort ((query_index, rank), result) pairs from iter_negative_mentions most
+    damaging first (by negativity score), then in query-template order, so
+    identical result sets always format to the same AI prompt.
+
+    :param entries: Pairs yielded by iter_negative_mentions
+    :return: List of search results
     """
-    negative_keywords = [
-        'complaint', 'scam', 'fraud', 'terrible', 'awful', 'worst', 'horrible',
-        'bad', 'negative', 'poor', 'disappointing', 'unprofessional', 'rude',
-        'dishonest', 'avoid', 'warning', 'beware', 'lawsuit', 'legal action',
-        'refund', 'money back', 'rip off', 'ripoff', 'stolen', 'theft'
-    ]
-    
-    # Check title and snippet for negative keywords
-    text_to_check = (result_data.get("title", "") + " " + result_data.get("snippet", "")).lower()
-    
-    return any(keyword in text_to_check for keyword in negative_keywords)
+    ordered = sorted(entries, key=lambda entry: (-entry[1].get("negativity_score", 0), entry[0]))
+    return [result_data for _, result_data in ordered]
+
+
+async def search_negative_mentions(business_name: str, limit: int = 10, concurrency: int = None, errors: list = None,
+                                   recency: str = None):
+    """
+    Search for negative mentions, reviews, and complaints about a business.
+
+    Queries run concurrently with early cutoff and link de-duplication; see
+    iter_negative_mentions.
+
+    :param business_name: Name of the business to search for
+    :param limit: Maximum number of results to return
+    :param concurrency: Maximum simultaneous SerpAPI requests (default: SERP_CONCURRENCY)
+    :param errors: Optional list collecting UpstreamErrors of failed queries
+    :param recency: Only pages indexed in the past 'd'ay, 'w'eek, 'm'onth or 'y'ear
+    :return: List of search results with negative mentions
+    """
+    entries = [entry async for entry in iter_negative_mentions(business_name, limit, concurrency, errors, recency)]
+    all_results = order_mentions(entries)
+    logger.info(f"Found {len(all_results)} potentially negative results for {business_name}")
+    return all_results
 
 
 def format_results_for_ai(results: list, business_name: str) -> str:
@@ -118,6 +175,6 @@ def format_results_for_ai(results: list, business_name: str) -> str:
         formatted_text += f"{i}. **{result['title']}**\n"
         formatted_text += f"   Source: {result['link']}\n"
         formatted_text += f"   Content: {result['snippet']}\n"
-        formatted_text += f"   Search Query: {result['search_query']}\n\n"
+        formatted_text += f"   Search Query: {'; '.join(result.get('search_queries') or [result['search_query']])}\n\n"
     
     return formatted_text 
\ No newline at end of file
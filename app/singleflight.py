@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import functools
+from app.cache import make_key
+from app.coordination import shared_flights, shared_state_enabled
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    In-process request coalescing: concurrent calls with the same key share one
+    in-flight computation and all receive its result (or its exception).
+    With several worker processes (see app/coordination.py) the computation is
+    also shared with the other workers.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stats = {'started': 0, 'joined': 0}
+        self._inflight = {}
+
+    async def do(self, key: str, func, *args, fresh: bool = False, **kwargs):
+        """
+        Run `func(*args, **kwargs)` unless a call for `key` is already in flight,
+        in which case wait for that call instead.
+
+        :param key: Coalescing key
+        :param func: Coroutine function to run
+        :param fresh: The caller asked for a refresh: coalesce only with other
+            refreshing calls, and never take a result another worker already published
+        :return: The shared result
+        """
+        if fresh:
+            key = f"{key}:fresh"
+        task = self._inflight.get(key)
+        if task is None:
+            self.stats['started'] += 1
+            if shared_state_enabled():
+                task = asyncio.ensure_future(
+                    shared_flights.do(f"{self.name}:{key}", func, *args, fresh=fresh, **kwargs)
+                )
+            else:
+                task = asyncio.ensure_future(func(*args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _, key=key: self._inflight.pop(key, None))
+        else:
+            self.stats['joined'] += 1
+            logger.info(f"Joining in-flight {self.name} call")
+        # Shield so one caller disconnecting does not cancel the work for the others
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+
+def coalesced(name: str):
+    """
+    Decorator coalescing concurrent calls of an async function with equal
+    normalized arguments. A `refresh` keyword is passed through and ignored
+    for the key, so it composes with the @cached decorator; refreshing calls
+    coalesce only with each other.
+
+    :param name: Name used for the coalescing group and statistics
+    """
+    group = SingleFlight(name)
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key_kwargs = {key: value for key, value in kwargs.items() if key != 'refresh'}
+            key = make_key(name, func.__qualname__, {'args': list(args), 'kwargs': key_kwargs})
+            return await group.do(key, func, *args, fresh=bool(kwargs.get('refresh')), **kwargs)
+
+        wrapper.singleflight = group
+        return wrapper
+    return decorator
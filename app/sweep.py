@@ -0,0 +1,320 @@
+import os
+import re
+import json
+import time
+import uuid
+import asyncio
+import logging
+import sqlite3
+import threading
+from dotenv import load_dotenv
+from app.cache import connect_sqlite
+from app.federated import BusinessMerger, normalize_business
+from app.search import search_businesses
+from app.upstream import UpstreamError
+
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SWEEPS_PATH = os.getenv('SWEEPS_PATH', 'data/sweeps.sqlite3')
+# Regions and their sub-locations (default: the list bundled with the app)
+SWEEP_REGIONS_PATH = os.getenv('SWEEP_REGIONS_PATH') or os.path.join(os.path.dirname(__file__), 'regions.json')
+# Sub-locations searched at the same time, per sweep
+SWEEP_CONCURRENCY = int(os.getenv('SWEEP_CONCURRENCY', '4'))
+SWEEP_MAX_LOCATIONS = int(os.getenv('SWEEP_MAX_LOCATIONS', '100'))
+# Finished sub-locations read from the store at a time when replaying a sweep
+REPLAY_BATCH_SIZE = 20
+
+SWEEP_PROVIDERS = ('outscraper', 'google_places', 'apify', 'all')
+
+
+class UnknownRegionError(ValueError):
+    """A region that is not in the regions list, with no sub-locations given."""
+
+
+def _region_key(name: str) -> str:
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', (name or '').lower()).split())
+
+
+def load_regions(path: str = None) -> dict:
+    """
+    Load the regions list: a JSON object of region name -> {"aliases": [...],
+    "locations": [...]}, or just the list of locations.
+
+    :param path: JSON file path (default: SWEEP_REGIONS_PATH)
+    :return: Dict of region name -> {"aliases": [...], "locations": [...]}
+    """
+    path = path or SWEEP_REGIONS_PATH
+    try:
+        with open(path, encoding='utf-8') as regions_file:
+            raw = json.load(regions_file)
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not load sweep regions from {path}: {e}")
+        return {}
+    return {name: region if isinstance(region, dict) else {'locations': region} for name, region in raw.items()}
+
+
+_regions = None
+_region_names = None
+
+
+def get_regions() -> dict:
+    """Return the configured regions, loading them on first use."""
+    global _regions, _region_names
+    if _regions is None:
+        regions = load_regions()
+        _region_names = {}
+        for name, region in regions.items():
+            for alias in [name] + list(region.get('aliases') or []):
+                _region_names.setdefault(_region_key(alias), name)
+        _regions = regions
+    return _regions
+
+
+def expand_region(region: str = None, locations: list = None) -> tuple:
+    """
+    Sub-locations to sweep: `locations` when given, otherwise the regions list's
+    entry for `region` (matched case-insensitively, aliases included).
+    Duplicates are dropped and at most SWEEP_MAX_LOCATIONS are kept.
+
+    :return: (region name, list of sub-locations)
+    :raises UnknownRegionError: No locations were given and the region is not listed
+    """
+    if locations:
+        cleaned = [location.strip() for location in locations if location and location.strip()]
+        return region or 'custom', list(dict.fromkeys(cleaned))[:SWEEP_MAX_LOCATIONS]
+    regions = get_regions()
+    name = _region_names.get(_region_key(region))
+    if name is None:
+        raise UnknownRegionError(f"Unknown region: {region!r}. Pass its sub-locations, or one of: {', '.join(regions)}")
+    return name, list(dict.fromkeys(regions[name].get('locations') or []))[:SWEEP_MAX_LOCATIONS]
+
+
+class SweepStore:
+    """
+    SQLite storage for sweeps: the search, its sub-locations and each finished
+    sub-location's results, so an interrupted sweep resumes where it stopped.
+    """
+
+    def __init__(self, path: str = SWEEPS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = connect_sqlite(self.path)
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS sweeps ('
+                'id TEXT PRIMARY KEY, category TEXT NOT NULL, region TEXT NOT NULL, provider TEXT NOT NULL, '
+                'created_at REAL NOT NULL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS sweep_locations ('
+                'sweep_id TEXT NOT NULL, position INTEGER NOT NULL, location TEXT NOT NULL, '
+                'status TEXT NOT NULL, results TEXT, error TEXT, updated_at REAL NOT NULL, '
+                'PRIMARY KEY (sweep_id, position))'
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def create_sweep(self, category: str, region: str, provider: str, locations: list) -> str:
+        sweep_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                'INSERT INTO sweeps (id, category, region, provider, created_at) VALUES (?, ?, ?, ?, ?)',
+                (sweep_id, category, region, provider, now)
+            )
+            conn.executemany(
+                'INSERT INTO sweep_locations (sweep_id, position, location, status, updated_at) VALUES (?, ?, ?, ?, ?)',
+                [(sweep_id, position, location, 'pending', now) for position, location in enumerate(locations)]
+            )
+            conn.commit()
+        return sweep_id
+
+    def get_sweep(self, sweep_id: str):
+        """
+        A sweep and the status of each sub-location (without their results).
+
+        :return: Dict, or None for an unknown sweep
+        """
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                'SELECT category, region, provider, created_at FROM sweeps WHERE id = ?', (sweep_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            locations = conn.execute(
+                'SELECT position, location, status, error FROM sweep_locations WHERE sweep_id = ? ORDER BY position',
+                (sweep_id,)
+            ).fetchall()
+        category, region, provider, created_at = row
+        return {
+            "sweep_id": sweep_id, "category": category, "region": region, "provider": provider,
+            "created_at": created_at,
+            "locations": [
+                {"position": position, "location": location, "status": status, "error": error}
+                for position, location, status, error in locations
+            ]
+        }
+
+    def get_finished(self, sweep_id: str, start: int = 0, limit: int = None) -> list:
+        """
+        Finished sub-locations at positions start..start+limit-1 with their results.
+
+        :return: List of (position, location, businesses)
+        """
+        end = start + limit if limit is not None else None
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT position, location, results FROM sweep_locations WHERE sweep_id = ? AND status = 'done' "
+                'AND position >= ? AND (? IS NULL OR position < ?) ORDER BY position',
+                (sweep_id, start, end, end)
+            ).fetchall()
+        return [(position, location, json.loads(results)) for position, location, results in rows]
+
+    def finish_location(self, sweep_id: str, position: int, status: str, businesses: list = None, error: str = None):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                'UPDATE sweep_locations SET status = ?, results = ?, error = ?, updated_at = ? '
+                'WHERE sweep_id = ? AND position = ?',
+                (status, json.dumps(businesses) if businesses is not None else None, error, time.time(),
+                 sweep_id, position)
+            )
+            conn.commit()
+
+
+sweep_store = SweepStore()
+
+
+def sweep_status(sweep: dict) -> dict:
+    """Sweep payload for the API: the sweep, its sub-locations and counts per status."""
+    counts = {}
+    for location in sweep["locations"]:
+        counts[location["status"]] = counts.get(location["status"], 0) + 1
+    return {**sweep, "total": len(sweep["locations"]), "counts": counts,
+            "complete": counts.get('done', 0) == len(sweep["locations"])}
+
+
+def _sweep_record(business: dict, provider: str) -> dict:
+    # "All providers" results are already normalized and list their sources
+    if provider == 'all':
+        return {**business, 'reviews': list(business.get('reviews') or []), 'sources': list(business.get('sources') or [])}
+    return normalize_business(business, provider)
+
+
+async def _search_location(sweep: dict, position: int, location: str, refresh: bool, semaphore: asyncio.Semaphore):
+    """
+    Search one sub-location and store its results (or its error).
+
+    :return: (position, location, status, businesses)
+    """
+    async with semaphore:
+        try:
+            businesses = await search_businesses(sweep["category"], location, sweep["provider"], refresh=refresh)
+            status, error = 'done', None
+        except UpstreamError as e:
+            logger.error(f"Sweep {sweep['sweep_id']}: {location} failed: {e}")
+            businesses, status, error = [], e.kind, str(e)
+        except Exception as e:
+            logger.error(f"Sweep {sweep['sweep_id']}: {location} failed: {e}")
+            businesses, status, error = [], 'failed', str(e)
+    await asyncio.to_thread(
+        sweep_store.finish_location, sweep["sweep_id"], position, status, businesses if status == 'done' else None, error
+    )
+    return position, location, status, businesses
+
+
+async def _iter_finished(sweep: dict):
+    """Yield (location, businesses) of a sweep's finished sub-locations, REPLAY_BATCH_SIZE read at a time."""
+    for start in range(0, len(sweep["locations"]), REPLAY_BATCH_SIZE):
+        for _, location, businesses in await asyncio.to_thread(
+            sweep_store.get_finished, sweep["sweep_id"], start, REPLAY_BATCH_SIZE
+        ):
+            yield location, businesses
+
+
+async def iter_sweep_results(sweep_id: str):
+    """
+    Yield the de-duplicated businesses of a sweep's finished sub-locations, read
+    from the store in position order.
+    """
+    sweep = await asyncio.to_thread(sweep_store.get_sweep, sweep_id)
+    merger = BusinessMerger()
+    async for _, businesses in _iter_finished(sweep):
+        for business in businesses:
+            record, is_new = merger.add(_sweep_record(business, sweep["provider"]))
+            if is_new:
+                yield record
+
+
+async def run_sweep(sweep_id: str, refresh: bool = False):
+    """
+    Run (or resume) a sweep, yielding its progress as (event, data) pairs:
+    'sweep' with the sweep and how many sub-locations remain, one 'business'
+    per business not seen in an earlier sub-location, one 'location' per
+    sub-location as it finishes, and finally 'done' with the totals.
+
+    Sub-locations finished by an earlier run are replayed from the store first,
+    without provider calls; the rest are searched SWEEP_CONCURRENCY at a time,
+    and each one's results are stored as it finishes. If the client goes away,
+    the searches still running are cancelled and the sweep can be resumed later.
+
+    :param sweep_id: Sweep created with sweep_store.create_sweep
+    :param refresh: Bypass cached provider results for the sub-locations searched now
+    """
+    sweep = await asyncio.to_thread(sweep_store.get_sweep, sweep_id)
+    locations = sweep["locations"]
+    remaining = [location for location in locations if location["status"] != 'done']
+    yield 'sweep', {**{key: sweep[key] for key in ('sweep_id', 'category', 'region', 'provider')},
+                    "locations": len(locations), "remaining": len(remaining)}
+
+    merger = BusinessMerger()
+    finished = 0
+    statuses = {}
+
+    def add(location: str, status: str, businesses: list, resumed: bool):
+        nonlocal finished
+        new = []
+        for business in businesses:
+            record, is_new = merger.add(_sweep_record(business, sweep["provider"]))
+            if is_new:
+                new.append(record)
+        finished += 1
+        statuses[status] = statuses.get(status, 0) + 1
+        progress = {"location": location, "status": status, "found": len(businesses), "new": len(new),
+                    "finished": finished, "total": len(locations), "resumed": resumed}
+        return new, progress
+
+    async for location, businesses in _iter_finished(sweep):
+        new, progress = add(location, 'done', businesses, True)
+        for record in new:
+            yield 'business', record
+        yield 'location', progress
+
+    semaphore = asyncio.Semaphore(SWEEP_CONCURRENCY)
+    tasks = [
+        asyncio.create_task(_search_location(sweep, location["position"], location["location"], refresh, semaphore))
+        for location in remaining
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            _, location, status, businesses = await next_done
+            new, progress = add(location, status, businesses, False)
+            for record in new:
+                yield 'business', record
+            yield 'location', progress
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    logger.info(f"Sweep {sweep_id}: {len(merger.records)} businesses from {len(locations)} sub-locations ({statuses})")
+    yield 'done', {"sweep_id": sweep_id, "businesses": len(merger.records), "locations": statuses}
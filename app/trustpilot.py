@@ -1,8 +1,13 @@
 import os
+import asyncio
 import logging
-import requests
+import httpx
 from urllib.parse import urlparse
 from dotenv import load_dotenv
+from app.upstream import get_policy, UpstreamError
+from app.cache import cached, read_cached, store_cached
+from app.singleflight import coalesced
+from app.models import Review
 
 # Load environment variables
 load_dotenv()
@@ -12,6 +17,9 @@ logging.basicConfig(level=logging.INFO)
 
 # Outscraper API key
 OUTSCRAPER_API_KEY = os.getenv('OUTSCRAPER_API_KEY')
+TRUSTPILOT_REVIEWS_URL = 'https://api.outscraper.cloud/trustpilot/reviews'
+# Domains per upstream request when fetching reviews for a whole results page
+TRUSTPILOT_BATCH_SIZE = int(os.getenv('TRUSTPILOT_BATCH_SIZE', '10'))
 
 
 def extract_domain(url):
@@ -20,7 +28,9 @@ def extract_domain(url):
     return parsed.netloc or parsed.path
 
 
-def get_trustpilot_reviews(queries, limit=3, async_mode='false'):
+@coalesced('trustpilot')
+@cached('trustpilot')
+async def get_trustpilot_reviews(queries, limit=3, async_mode='false'):
     """
     Fetch reviews from Trustpilot using the Outscraper API.
 
@@ -28,9 +38,10 @@ def get_trustpilot_reviews(queries, limit=3, async_mode='false'):
     :param limit: Max reviews per query.
     :param async_mode: Whether to run async (default: 'false').
     :return: List of reviews or empty list.
+    :raises UpstreamError: Outscraper is rate limiting or unavailable.
     """
     headers = {
-        'X-API-KEY': OUTSCRAPER_API_KEY
+        'X-API-KEY': OUTSCRAPER_API_KEY or ''
     }
 
     if isinstance(queries, str):
@@ -45,8 +56,9 @@ def get_trustpilot_reviews(queries, limit=3, async_mode='false'):
 
     try:
         logging.info(f"Making Trustpilot API request with params: {params}")
-        response = requests.get(
-            'https://api.outscraper.cloud/trustpilot/reviews',
+        response = await get_policy('outscraper').request(
+            "GET",
+            TRUSTPILOT_REVIEWS_URL,
             headers=headers,
             params=params
         )
@@ -60,15 +72,142 @@ def get_trustpilot_reviews(queries, limit=3, async_mode='false'):
             reviews = data['data'][0]
             if isinstance(reviews, list) and reviews:
                 logging.info(f"Fetched {len(reviews)} reviews from Outscraper.")
-                return reviews
+                return parse_reviews(reviews)
 
         logging.warning("No reviews data found in API response")
         return []
 
-    except requests.exceptions.RequestException as e:
+    except UpstreamError:
+        raise
+    except httpx.HTTPError as e:
         logging.error(f"HTTP error during Trustpilot review fetch: {e}")
         return []
     except Exception as e:
         logging.error(f"Unexpected error: {e}")
         return []
 
+
+async def get_trustpilot_reviews_since(domain: str, cutoff: float = None, limit: int = 100) -> list:
+    """
+    Fetch a domain's reviews newest first, stopping at `cutoff`, for monitoring
+    that only wants what is new since the last check. Not cached: the answer
+    changes as reviews are posted.
+
+    :param domain: Website URL or domain name
+    :param cutoff: Unix timestamp; reviews posted before it are not fetched
+    :param limit: Max reviews
+    :return: List of reviews, newest first
+    :raises UpstreamError: Outscraper is rate limiting or unavailable
+    """
+    params = [('query', normalize_trustpilot_domain(domain)), ('limit', limit), ('sort', 'recency'), ('async', 'false')]
+    if cutoff:
+        params.append(('cutoff', int(cutoff)))
+
+    logging.info(f"Fetching Trustpilot reviews for {domain} since {cutoff or 'the start'}")
+    response = await get_policy('outscraper').request(
+        "GET",
+        TRUSTPILOT_REVIEWS_URL,
+        headers={'X-API-KEY': OUTSCRAPER_API_KEY or ''},
+        params=params
+    )
+    response.raise_for_status()
+    data = response.json().get('data') or []
+    return parse_reviews(data[0] if data and isinstance(data[0], list) else [])
+
+
+def parse_reviews(reviews: list) -> list:
+    """Map Outscraper's Trustpilot reviews onto the shared review dict (app.models.Review)."""
+    return [Review.from_trustpilot(review).to_dict() for review in reviews if review]
+
+
+def normalize_trustpilot_domain(url: str) -> str:
+    """Reduce a website URL to the lowercase host used as a Trustpilot query."""
+    domain = extract_domain(url.strip()).lower().split('/')[0]
+    return domain[4:] if domain.startswith('www.') else domain
+
+
+async def _fetch_trustpilot_chunk(domains: list, limit: int) -> dict:
+    """
+    Fetch reviews for several domains in one Outscraper request. The API returns
+    one review list per query, in query order.
+
+    :return: Dict of domain -> list of reviews ([] for failures)
+    :raises UpstreamError: Outscraper is rate limiting or unavailable
+    """
+    params = [('query', domain) for domain in domains]
+    params.append(('limit', limit))
+    params.append(('async', 'false'))
+
+    try:
+        logging.info(f"Making batched Trustpilot API request for {len(domains)} domains")
+        response = await get_policy('outscraper').request(
+            "GET",
+            TRUSTPILOT_REVIEWS_URL,
+            headers={'X-API-KEY': OUTSCRAPER_API_KEY or ''},
+            params=params
+        )
+        response.raise_for_status()
+        data = response.json().get('data') or []
+    except UpstreamError:
+        raise
+    except httpx.HTTPError as e:
+        logging.error(f"HTTP error during batched Trustpilot review fetch: {e}")
+        return {domain: [] for domain in domains}
+    except Exception as e:
+        logging.error(f"Unexpected error: {e}")
+        return {domain: [] for domain in domains}
+
+    results = {}
+    for index, domain in enumerate(domains):
+        reviews = data[index] if index < len(data) else []
+        results[domain] = parse_reviews(reviews if isinstance(reviews, list) else [])
+    return results
+
+
+async def get_trustpilot_reviews_batch(domains: list, limit: int = 3, refresh: bool = False) -> tuple:
+    """
+    Fetch Trustpilot reviews for many domains, e.g. every business on a results page.
+
+    Each domain is cached on its own, under the entry get_trustpilot_reviews([domain])
+    reads, so a page only pays for domains it has not seen before (and a card's
+    own lookup afterwards is a cache hit); those are fetched in chunks of TRUSTPILOT_BATCH_SIZE domains per
+    upstream request, with the chunks running concurrently.
+
+    :param domains: Website URLs or domain names
+    :param limit: Max reviews per domain
+    :param refresh: Bypass cached reviews
+    :return: (reviews, errors): dicts keyed by each requested value, holding its list of
+             reviews, and the UpstreamError for domains whose chunk was rate limited or failed
+    """
+    normalized = {domain: normalize_trustpilot_domain(domain) for domain in domains if domain and domain.strip()}
+    unique = [domain for domain in dict.fromkeys(normalized.values()) if domain]
+
+    reviews = {}
+    failed = {}
+    if not refresh:
+        for domain in unique:
+            hit = await read_cached(get_trustpilot_reviews, [domain], limit=limit)
+            if hit is not None:
+                reviews[domain] = hit
+
+    missing = [domain for domain in unique if domain not in reviews]
+    if missing:
+        chunks = [missing[i:i + TRUSTPILOT_BATCH_SIZE] for i in range(0, len(missing), TRUSTPILOT_BATCH_SIZE)]
+        logging.info(f"Trustpilot batch: {len(unique) - len(missing)} cached, {len(missing)} fetched in {len(chunks)} requests")
+        fetched_chunks = await asyncio.gather(
+            *(_fetch_trustpilot_chunk(chunk, limit) for chunk in chunks), return_exceptions=True
+        )
+        for chunk, fetched in zip(chunks, fetched_chunks):
+            if isinstance(fetched, UpstreamError):
+                failed.update({domain: fetched for domain in chunk})
+                continue
+            if isinstance(fetched, BaseException):
+                raise fetched
+            for domain, domain_reviews in fetched.items():
+                reviews[domain] = domain_reviews
+                await store_cached(get_trustpilot_reviews, domain_reviews, [domain], limit=limit)
+
+    return (
+        {domain: reviews.get(normalized_domain, []) for domain, normalized_domain in normalized.items()},
+        {domain: failed[normalized_domain] for domain, normalized_domain in normalized.items() if normalized_domain in failed}
+    )
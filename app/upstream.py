@@ -0,0 +1,315 @@
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import httpx
+from dotenv import load_dotenv
+from app.http_client import get_http_client
+from app.metrics import upstream_call
+from app.coordination import SharedTokenBucket, shared_state_enabled
+
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Default (requests per second, burst) per provider. Override with
+# RATE_LIMIT_<PROVIDER> and RATE_BURST_<PROVIDER>. Trustpilot lookups go through
+# Outscraper and share its budget.
+DEFAULT_RATE_LIMITS = {
+    'outscraper': (2.0, 4),
+    'google_places': (10.0, 10),
+    'apify': (5.0, 5),
+    'serpapi': (5.0, 5),
+    'openai': (2.0, 4),
+}
+
+UPSTREAM_MAX_RETRIES = int(os.getenv('UPSTREAM_MAX_RETRIES', '3'))
+UPSTREAM_BACKOFF_BASE = float(os.getenv('UPSTREAM_BACKOFF_BASE', '0.5'))
+UPSTREAM_BACKOFF_MAX = float(os.getenv('UPSTREAM_BACKOFF_MAX', '20'))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+CIRCUIT_RESET_SECONDS = float(os.getenv('CIRCUIT_RESET_SECONDS', '30'))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Statuses meaning the provider turned the request away without doing the work, so
+# a non-idempotent call (starting a crawl, a completion) can be retried without repeating it
+UNSAFE_RETRY_STATUSES = {429, 503}
+# Errors raised before the request reached the provider, so a retry cannot
+# repeat work (or spend) on the provider's side
+RETRY_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def _openai_errors() -> tuple:
+    """
+    The openai SDK's (timeout, connection, status) exception classes, or empty
+    tuples (which match nothing) while the SDK has not been imported: only its
+    client raises them, and it is imported on first use.
+    """
+    openai = sys.modules.get('openai')
+    if openai is None:
+        return (), (), ()
+    return (openai.APITimeoutError,), (openai.APIConnectionError,), (openai.APIStatusError,)
+
+
+class UpstreamError(Exception):
+    """
+    A provider call that failed after the policy's retries, as opposed to one that
+    succeeded with no results. `kind` and `status_code` tell callers how to report it.
+    """
+    kind = 'failed'
+    status_code = 502
+
+    def __init__(self, provider: str, message: str):
+        super().__init__(message)
+        self.provider = provider
+
+
+class RateLimitedError(UpstreamError):
+    kind = 'rate_limited'
+    status_code = 429
+
+
+class CircuitOpenError(UpstreamError):
+    kind = 'unavailable'
+    status_code = 503
+
+
+class UpstreamFailedError(UpstreamError):
+    pass
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter: `rate` tokens per second, holding at most `burst`.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failed calls and rejects calls for
+    `reset_timeout` seconds; then lets a single trial call through (half-open),
+    closing again if it succeeds.
+    """
+
+    def __init__(self, threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_timeout: float = CIRCUIT_RESET_SECONDS):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def retry_in(self) -> float:
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)) if self.opened_at else 0.0
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == 'closed':
+            return True
+        if state == 'half-open' and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def release(self):
+        """Give up a half-open trial without recording an outcome."""
+        self._trial_running = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_running or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+        self._trial_running = False
+
+
+def _retry_after(response) -> float:
+    """Seconds requested by a Retry-After header, if any."""
+    value = response.headers.get('retry-after') if response is not None else None
+    try:
+        return float(value) if value else 0.0
+    except ValueError:
+        return 0.0
+
+
+class ProviderPolicy:
+    """
+    Upstream-call policy for one provider: rate limiting, jittered exponential
+    backoff on 429/5xx and connection errors, and a circuit breaker.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int, max_retries: int = UPSTREAM_MAX_RETRIES, bucket=None):
+        self.name = name
+        self.bucket = bucket or TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker()
+        self.max_retries = max_retries
+        self.stats = {'calls': 0, 'retries': 0, 'rate_limited': 0, 'failed': 0, 'short_circuited': 0}
+
+    def _backoff(self, attempt: int, response=None) -> float:
+        delay = random.uniform(0, min(UPSTREAM_BACKOFF_MAX, UPSTREAM_BACKOFF_BASE * 2 ** attempt))
+        return min(UPSTREAM_BACKOFF_MAX, max(delay, _retry_after(response)))
+
+    async def call(self, func, *args, idempotent: bool = True, **kwargs):
+        """
+        Run one upstream call under the policy. `func` may return an httpx.Response
+        (retried on 429/5xx) or raise (openai errors are classified by status code).
+
+        :param idempotent: Whether repeating the call is harmless. Calls that are
+            not (starting a crawl, a completion) are retried only on 429, 503 and
+            connection failures; after a 500, 502, 504, read timeout or dropped
+            connection the provider may have done the work, so they fail at once.
+        :return: The call's result; non-retryable error responses are returned as-is
+        :raises RateLimitedError: Still rate limited after all retries
+        :raises CircuitOpenError: The provider's circuit is open
+        :raises UpstreamFailedError: 5xx or network errors after all retries
+        """
+        with upstream_call(self.name) as timing:
+            result = await self._call(func, idempotent, *args, **kwargs)
+            if isinstance(result, httpx.Response) and result.is_error:
+                timing.outcome = 'http_error'
+            return result
+
+    async def _call(self, func, idempotent: bool, *args, **kwargs):
+        # Only the call let through a half-open circuit holds its trial
+        trial = self.breaker.state == 'half-open'
+        if not self.breaker.allow():
+            self.stats['short_circuited'] += 1
+            raise CircuitOpenError(
+                self.name, f"{self.name} is temporarily unavailable; retrying in {self.breaker.retry_in():.0f}s"
+            )
+
+        self.stats['calls'] += 1
+        retry_statuses = RETRY_STATUSES if idempotent else UNSAFE_RETRY_STATUSES
+        status, detail, response = None, None, None
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            openai_timeout, openai_connection, openai_status = _openai_errors()
+            try:
+                result = await func(*args, **kwargs)
+            except openai_timeout as e:
+                # Timed out waiting for the provider, which may still be doing the work
+                status, detail, response = None, str(e), None
+                if not idempotent:
+                    break
+            except RETRY_EXCEPTIONS + openai_connection as e:
+                status, detail, response = None, str(e) or type(e).__name__, None
+            except openai_status as e:
+                if e.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    raise
+                status, detail, response = e.status_code, str(e), e.response
+                if status not in retry_statuses:
+                    break
+            except httpx.TransportError as e:
+                # Read timeouts and dropped connections: the provider may have done the
+                # work, so only calls that are harmless to repeat are retried
+                status, detail, response = None, str(e) or type(e).__name__, None
+                if not idempotent:
+                    break
+            except BaseException:
+                # Not a provider failure (bad arguments, cancellation)
+                if trial:
+                    self.breaker.release()
+                raise
+            else:
+                if isinstance(result, httpx.Response) and result.status_code in RETRY_STATUSES:
+                    status, detail, response = result.status_code, f"HTTP {result.status_code}", result
+                    if status not in retry_statuses:
+                        break
+                else:
+                    self.breaker.record_success()
+                    return result
+
+            if attempt < self.max_retries:
+                delay = self._backoff(attempt, response)
+                self.stats['retries'] += 1
+                logger.warning(f"{self.name}: {detail}; retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+        if status == 429:
+            # The provider is up, just throttling us; this does not trip the breaker
+            self.breaker.record_success()
+            self.stats['rate_limited'] += 1
+            raise RateLimitedError(self.name, f"{self.name} is rate limiting requests (HTTP 429); try again shortly")
+        self.breaker.record_failure()
+        self.stats['failed'] += 1
+        raise UpstreamFailedError(self.name, f"{self.name} request failed: {detail}")
+
+    async def request(self, method: str, url: str, idempotent: bool = None, **kwargs) -> httpx.Response:
+        """
+        Send a request over the shared HTTP client under the policy.
+
+        :param idempotent: Whether repeating the request is harmless (default: for any method but POST and PATCH)
+        """
+        if idempotent is None:
+            idempotent = method.upper() not in ('POST', 'PATCH')
+        return await self.call(get_http_client().request, method, url, idempotent=idempotent, **kwargs)
+
+    def get_stats(self) -> dict:
+        return {**self.stats, 'circuit': self.breaker.state}
+
+
+def error_payload(error: UpstreamError) -> dict:
+    """
+    JSON-ready description of an UpstreamError for API responses.
+    """
+    return {"provider": error.provider, "kind": error.kind, "error": str(error)}
+
+
+_policies = {}
+
+
+def get_policy(provider: str) -> ProviderPolicy:
+    """
+    Get the shared policy for a provider, creating it from configuration on first use.
+    With several worker processes the rate budget is shared between them; the
+    circuit breaker stays per process.
+    """
+    policy = _policies.get(provider)
+    if policy is None:
+        rate, burst = DEFAULT_RATE_LIMITS.get(provider, (5.0, 5))
+        rate = float(os.getenv(f'RATE_LIMIT_{provider.upper()}', rate))
+        burst = int(os.getenv(f'RATE_BURST_{provider.upper()}', burst))
+        bucket = SharedTokenBucket(provider, rate, burst) if shared_state_enabled() else None
+        policy = _policies[provider] = ProviderPolicy(provider, rate, burst, bucket=bucket)
+    return policy
+
+
+def upstream_stats() -> dict:
+    """
+    Get call, retry, rate-limit and failure counters plus circuit state per provider.
+    """
+    return {name: policy.get_stats() for name, policy in _policies.items()}
@@ -0,0 +1,411 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from dotenv import load_dotenv
+from app.cache import connect_sqlite
+from app.coordination import WORKER_ID
+from app.context_builder import parse_date
+from app.trustpilot import get_trustpilot_reviews_since
+from app.serp_search import search_negative_mentions
+from app.ai_analyzer import analyze_reputation_data, update_reputation_analysis, normalize_analysis
+from app.reputation import business_name_from_domain
+from app.upstream import UpstreamError
+
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+WATCHLIST_PATH = os.getenv('WATCHLIST_PATH', 'data/watchlist.sqlite3')
+# Default time between checks of a watched domain
+WATCHLIST_INTERVAL_HOURS = float(os.getenv('WATCHLIST_INTERVAL_HOURS', '24'))
+# Domains checked at the same time, per worker process
+WATCHLIST_CONCURRENCY = int(os.getenv('WATCHLIST_CONCURRENCY', '2'))
+# Reviews read on a domain's first check, and at most per later check
+WATCHLIST_INITIAL_REVIEWS = int(os.getenv('WATCHLIST_INITIAL_REVIEWS', '20'))
+WATCHLIST_REVIEW_LIMIT = int(os.getenv('WATCHLIST_REVIEW_LIMIT', '100'))
+# How often the runner looks for domains that are due
+WATCHLIST_POLL_SECONDS = 60.0
+# A worker renews the lease on the domains it is checking; a domain whose lease
+# ran out (the worker died) is checked again by any worker
+WATCHLIST_LEASE_SECONDS = 60.0
+# Review ids and mention links remembered per domain to recognise items already analyzed
+MAX_SEEN_ITEMS = 500
+CHECK_HISTORY = 30
+
+
+def review_id(review: dict) -> str:
+    """Provider id of a review, or a hash of its author, date and text."""
+    if review.get('id'):
+        return str(review['id'])
+    content = json.dumps(
+        [review.get('author'), review.get('date'), review.get('text')], ensure_ascii=False
+    )
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def serp_recency(period: float) -> str:
+    """SerpAPI recency window ('d', 'w', 'm', 'y') covering the past `period` seconds."""
+    for window, seconds in (('d', 86400), ('w', 7 * 86400), ('m', 31 * 86400)):
+        if period <= seconds:
+            return window
+    return 'y'
+
+
+class WatchlistStore:
+    """
+    SQLite storage for watched domains: each one's schedule, high-water mark
+    (newest review date plus the review ids and mention links already analyzed)
+    and latest analysis, plus a short history of checks.
+    """
+
+    COLUMNS = (
+        'domain', 'interval', 'added_at', 'next_check_at', 'last_checked_at', 'high_water_at', 'seen_reviews',
+        'seen_links', 'analysis', 'review_count', 'mention_count', 'last_error', 'analyzed_at'
+    )
+
+    def __init__(self, path: str = WATCHLIST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = connect_sqlite(self.path)
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS watchlist ('
+                'domain TEXT PRIMARY KEY, interval REAL NOT NULL, added_at REAL NOT NULL, '
+                'next_check_at REAL NOT NULL, last_checked_at REAL, high_water_at REAL, '
+                "seen_reviews TEXT NOT NULL DEFAULT '[]', seen_links TEXT NOT NULL DEFAULT '[]', analysis TEXT, "
+                'review_count INTEGER NOT NULL DEFAULT 0, mention_count INTEGER NOT NULL DEFAULT 0, '
+                'last_error TEXT, owner TEXT, lease_until REAL, '
+                # Start of the last check whose items were analyzed (failed checks leave it)
+                'analyzed_at REAL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS watch_checks ('
+                'domain TEXT NOT NULL, checked_at REAL NOT NULL, mode TEXT NOT NULL, new_reviews INTEGER NOT NULL, '
+                'new_mentions INTEGER NOT NULL, seconds REAL NOT NULL, error TEXT)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_watchlist_due ON watchlist (next_check_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_watch_checks_domain ON watch_checks (domain, checked_at)')
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _entry(self, row) -> dict:
+        if row is None:
+            return None
+        entry = dict(zip(self.COLUMNS, row))
+        for field in ('seen_reviews', 'seen_links'):
+            entry[field] = json.loads(entry[field])
+        entry['analysis'] = json.loads(entry['analysis']) if entry['analysis'] else None
+        return entry
+
+    def add(self, domains: list, interval: float) -> int:
+        """
+        Watch domains; already watched ones get the new interval.
+
+        :return: Number of domains newly added
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            before = conn.total_changes
+            conn.executemany(
+                'INSERT OR IGNORE INTO watchlist (domain, interval, added_at, next_check_at) VALUES (?, ?, ?, ?)',
+                [(domain, interval, now, now) for domain in domains]
+            )
+            added = conn.total_changes - before
+            conn.executemany('UPDATE watchlist SET interval = ? WHERE domain = ?', [(interval, d) for d in domains])
+            conn.commit()
+        return added
+
+    def remove(self, domain: str) -> bool:
+        with self._lock:
+            conn = self._connect()
+            removed = conn.execute('DELETE FROM watchlist WHERE domain = ?', (domain,)).rowcount
+            conn.execute('DELETE FROM watch_checks WHERE domain = ?', (domain,))
+            conn.commit()
+        return bool(removed)
+
+    def get(self, domain: str):
+        with self._lock:
+            row = self._connect().execute(
+                f'SELECT {", ".join(self.COLUMNS)} FROM watchlist WHERE domain = ?', (domain,)
+            ).fetchone()
+        return self._entry(row)
+
+    def list(self) -> list:
+        with self._lock:
+            rows = self._connect().execute(
+                f'SELECT {", ".join(self.COLUMNS)} FROM watchlist ORDER BY domain'
+            ).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def schedule_now(self, domain: str) -> bool:
+        with self._lock:
+            conn = self._connect()
+            updated = conn.execute(
+                'UPDATE watchlist SET next_check_at = ? WHERE domain = ?', (time.time(), domain)
+            ).rowcount
+            conn.commit()
+        return bool(updated)
+
+    def claim_due(self, owner: str, lease_seconds: float = WATCHLIST_LEASE_SECONDS):
+        """
+        Atomically take the most overdue domain that no live worker is checking.
+
+        :return: Watchlist entry, or None if nothing is due
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                f'SELECT {", ".join(self.COLUMNS)} FROM watchlist '
+                'WHERE next_check_at <= ? AND COALESCE(lease_until, 0) < ? ORDER BY next_check_at LIMIT 1',
+                (now, now)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    'UPDATE watchlist SET owner = ?, lease_until = ? WHERE domain = ?',
+                    (owner, now + lease_seconds, row[0])
+                )
+            conn.commit()
+        return self._entry(row)
+
+    def renew_leases(self, owner: str, lease_seconds: float = WATCHLIST_LEASE_SECONDS):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                'UPDATE watchlist SET lease_until = ? WHERE owner = ? AND lease_until IS NOT NULL',
+                (time.time() + lease_seconds, owner)
+            )
+            conn.commit()
+
+    def finish_check(self, domain: str, updates: dict, check: dict):
+        """Store a check's outcome, schedule the next one and release the lease."""
+        now = time.time()
+        values = dict(updates)
+        for field in ('seen_reviews', 'seen_links', 'analysis'):
+            if field in values:
+                values[field] = json.dumps(values[field]) if values[field] is not None else None
+        assignments = ''.join(f'{field} = ?, ' for field in values)
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                f'UPDATE watchlist SET {assignments}last_checked_at = ?, next_check_at = ? + interval, '
+                'owner = NULL, lease_until = NULL WHERE domain = ?',
+                (*values.values(), now, now, domain)
+            )
+            conn.execute(
+                'INSERT INTO watch_checks (domain, checked_at, mode, new_reviews, new_mentions, seconds, error) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (domain, now, check['mode'], check['new_reviews'], check['new_mentions'], check['seconds'],
+                 check.get('error'))
+            )
+            conn.execute(
+                'DELETE FROM watch_checks WHERE domain = ? AND checked_at < ('
+                'SELECT MIN(checked_at) FROM (SELECT checked_at FROM watch_checks WHERE domain = ? '
+                'ORDER BY checked_at DESC LIMIT ?))',
+                (domain, domain, CHECK_HISTORY)
+            )
+            conn.commit()
+
+    def get_checks(self, domain: str) -> list:
+        with self._lock:
+            rows = self._connect().execute(
+                'SELECT checked_at, mode, new_reviews, new_mentions, seconds, error FROM watch_checks '
+                'WHERE domain = ? ORDER BY checked_at DESC', (domain,)
+            ).fetchall()
+        return [
+            {"checked_at": checked_at, "mode": mode, "new_reviews": new_reviews, "new_mentions": new_mentions,
+             "seconds": round(seconds, 3), "error": error}
+            for checked_at, mode, new_reviews, new_mentions, seconds, error in rows
+        ]
+
+
+async def check_domain(entry: dict) -> tuple:
+    """
+    Check one watched domain, processing only what is new since its last check:
+    Trustpilot reviews from its high-water mark on (newest first, cut off at the
+    newest review already analyzed) and negative mentions indexed since the
+    last analyzed check whose links were not seen before. The first check runs a full
+    analysis; later ones update the previous analysis from the new items alone,
+    and skip the model when there are none.
+
+    :param entry: Watchlist entry (see WatchlistStore)
+    :return: (updates for the entry, check record)
+    """
+    start = time.perf_counter()
+    started_at = time.time()
+    domain = entry['domain']
+    business_name = business_name_from_domain(domain)
+    previous = entry['analysis']
+    upstream_errors = []
+
+    try:
+        limit = WATCHLIST_REVIEW_LIMIT if previous else WATCHLIST_INITIAL_REVIEWS
+        reviews = await get_trustpilot_reviews_since(domain, entry['high_water_at'], limit)
+    except UpstreamError as e:
+        logger.error(f"Watchlist: Trustpilot lookup for {domain} failed: {e}")
+        upstream_errors.append(e)
+        reviews = []
+    seen_reviews = set(entry['seen_reviews'])
+    new_reviews = []
+    for review in reviews:
+        identifier = review_id(review)
+        posted_at = parse_date(review.get('date'))
+        # Older than the high-water mark: analyzed before, or outside the history first read
+        if entry['high_water_at'] and posted_at and posted_at < entry['high_water_at']:
+            continue
+        if identifier not in seen_reviews:
+            seen_reviews.add(identifier)
+            new_reviews.append(review)
+
+    # Mentions since the last check that was analyzed, however long ago (downtime, failed checks)
+    analyzed_at = entry['analyzed_at'] or entry['last_checked_at']
+    mentions = await search_negative_mentions(
+        business_name, limit=15, errors=upstream_errors,
+        recency=serp_recency(started_at - analyzed_at if analyzed_at else entry['interval']) if previous else None
+    )
+    seen_links = set(entry['seen_links'])
+    new_mentions = [mention for mention in mentions if mention.get('link') not in seen_links]
+
+    if previous is None:
+        mode = 'full'
+        analysis = await analyze_reputation_data(business_name, new_mentions, new_reviews)
+    elif new_reviews or new_mentions:
+        mode = 'incremental'
+        analysis = await update_reputation_analysis(business_name, previous, new_mentions, new_reviews)
+    else:
+        mode = 'unchanged'
+        analysis = previous
+
+    check = {
+        "mode": mode,
+        "new_reviews": len(new_reviews),
+        "new_mentions": len(new_mentions),
+        "seconds": time.perf_counter() - start
+    }
+    errors = [str(error) for error in upstream_errors]
+    if analysis.get('error'):
+        # Keep the high-water mark, so the next check analyzes these items again
+        check["error"] = analysis['error']
+        return {"last_error": analysis['error']}, check
+
+    review_dates = [parse_date(review.get('date')) for review in new_reviews]
+    high_water_at = max([entry['high_water_at'] or 0] + [date for date in review_dates if date]) or None
+    analysis = normalize_analysis({key: value for key, value in analysis.items() if key != 'cached'})
+    if errors:
+        check["error"] = '; '.join(dict.fromkeys(errors))
+    updates = {
+        "high_water_at": high_water_at,
+        "seen_reviews": ([review_id(review) for review in new_reviews] + entry['seen_reviews'])[:MAX_SEEN_ITEMS],
+        "seen_links": ([mention['link'] for mention in new_mentions if mention.get('link')]
+                       + entry['seen_links'])[:MAX_SEEN_ITEMS],
+        "analysis": analysis,
+        "review_count": entry['review_count'] + len(new_reviews),
+        "mention_count": entry['mention_count'] + len(new_mentions),
+        "last_error": check.get("error"),
+        "analyzed_at": started_at
+    }
+    logger.info(
+        f"Watchlist: checked {domain} ({mode}): {len(new_reviews)} new reviews, {len(new_mentions)} new mentions "
+        f"in {check['seconds']:.1f}s"
+    )
+    return updates, check
+
+
+class WatchlistRunner:
+    """
+    Scheduled local runner checking watched domains when they are due. Domains
+    are claimed from the WatchlistStore with a lease, so several worker
+    processes share one schedule without checking a domain twice.
+    """
+
+    def __init__(self, store: WatchlistStore, concurrency: int = WATCHLIST_CONCURRENCY, owner: str = WORKER_ID):
+        self.store = store
+        self.concurrency = concurrency
+        self.owner = owner
+        self._wakeup = None
+        self._workers = []
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+        self._workers.append(asyncio.create_task(self._renew_leases()))
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _next_entry(self) -> dict:
+        while True:
+            entry = await asyncio.to_thread(self.store.claim_due, self.owner)
+            if entry is not None:
+                return entry
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), WATCHLIST_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _renew_leases(self):
+        while True:
+            await asyncio.sleep(WATCHLIST_LEASE_SECONDS / 3)
+            try:
+                await asyncio.to_thread(self.store.renew_leases, self.owner)
+            except Exception as e:
+                logger.error(f"Failed to renew watchlist leases: {e}")
+
+    async def _work(self):
+        while True:
+            entry = await self._next_entry()
+            start = time.perf_counter()
+            try:
+                updates, check = await check_domain(entry)
+            except asyncio.CancelledError:
+                # The lease runs out and the domain is checked again
+                raise
+            except Exception as e:
+                logger.error(f"Watchlist: check of {entry['domain']} failed: {e}")
+                updates = {"last_error": str(e)}
+                check = {"mode": "failed", "new_reviews": 0, "new_mentions": 0,
+                         "seconds": time.perf_counter() - start, "error": str(e)}
+            await asyncio.to_thread(self.store.finish_check, entry['domain'], updates, check)
+
+
+watchlist_store = WatchlistStore()
+watchlist_runner = WatchlistRunner(watchlist_store)
+
+
+def watchlist_entry_payload(entry: dict, checks: list = None) -> dict:
+    """The API view of a watched domain."""
+    payload = {
+        "domain": entry['domain'],
+        "interval_hours": round(entry['interval'] / 3600, 3),
+        "added_at": entry['added_at'],
+        "last_checked_at": entry['last_checked_at'],
+        "next_check_at": entry['next_check_at'],
+        "review_count": entry['review_count'],
+        "mention_count": entry['mention_count'],
+        "analysis": entry['analysis'],
+        "last_error": entry['last_error']
+    }
+    if checks is not None:
+        payload["checks"] = checks
+    return payload
@@ -0,0 +1,90 @@
+"""
+Check that a slow upstream call no longer freezes the app.
+
+Runs the FastAPI app in-process with every provider routed to a mock transport
+(no network, no API spend). An Apify search is held open for several seconds
+while /health and a Google Places search are issued; both must answer promptly.
+
+Usage (from the repository root):
+    python -m bench.concurrency_check
+"""
+import asyncio
+import os
+import sys
+import time
+import tempfile
+
+import httpx
+
+from app.cache import result_cache
+from app.apify_runs import apify_run_store
+from app.http_client import init_http_client, close_http_client
+from app.main import app
+
+SLOW_PROVIDER_SECONDS = 3.0
+MAX_FAST_SECONDS = 0.5
+
+
+async def mock_upstream(request: httpx.Request) -> httpx.Response:
+    host = request.url.host
+    path = request.url.path
+    if host == "api.apify.com" and path.endswith("/runs"):
+        await asyncio.sleep(SLOW_PROVIDER_SECONDS)
+        return httpx.Response(200, json={"data": {"id": "run1", "status": "SUCCEEDED", "defaultDatasetId": "ds1"}})
+    if host == "api.apify.com" and "/datasets/" in path:
+        return httpx.Response(200, json=[{"title": "Slow Plumbing", "address": "1 Main St", "totalScore": 2.1}])
+    if host == "places.googleapis.com":
+        return httpx.Response(200, json={"places": [{
+            "displayName": {"text": "Fast Plumbing"},
+            "formattedAddress": "2 Main St",
+            "rating": 2.5,
+            "userRatingCount": 12
+        }]})
+    return httpx.Response(404, json={"error": f"unmocked upstream {host}{path}"})
+
+
+async def timed(coro):
+    start = time.perf_counter()
+    response = await coro
+    return response, time.perf_counter() - start
+
+
+async def main() -> int:
+    # Keep the run isolated from (and out of) the persistent result cache and Apify run records
+    directory = tempfile.mkdtemp()
+    result_cache.path = os.path.join(directory, "cache.sqlite3")
+    apify_run_store.path = os.path.join(directory, "apify_runs.sqlite3")
+    await init_http_client(transport=httpx.MockTransport(mock_upstream))
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://lowrated.test", timeout=30) as client:
+            slow = asyncio.create_task(timed(client.post("/search", data={
+                "category": "plumbers", "location": "Austin", "api_choice": "apify"
+            })))
+            await asyncio.sleep(0.2)
+
+            health, health_time = await timed(client.get("/health"))
+            search, search_time = await timed(client.post("/search", data={
+                "category": "plumbers", "location": "Austin", "api_choice": "google_places"
+            }))
+            slow_response, slow_time = await slow
+    finally:
+        await close_http_client()
+
+    print(f"/health while Apify is running:        {health.status_code} in {health_time:.3f}s")
+    print(f"google_places search while Apify runs: {search.status_code} in {search_time:.3f}s")
+    print(f"slow apify search:                     {slow_response.status_code} in {slow_time:.3f}s")
+
+    ok = (
+        health.status_code == 200 and health_time < MAX_FAST_SECONDS
+        and search.status_code == 200 and search_time < MAX_FAST_SECONDS
+        and "Fast Plumbing" in search.text
+        and slow_response.status_code == 200 and "Slow Plumbing" in slow_response.text
+        and slow_time >= SLOW_PROVIDER_SECONDS
+    )
+    print("PASS" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
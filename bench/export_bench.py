@@ -0,0 +1,162 @@
+"""
+Measure memory use of CSV/NDJSON exports as the row count grows.
+
+Exports ROW_COUNTS businesses of an Outscraper search (offline stubs,
+bench/stubs.py) through GET /api/export/search, first as CSV (every page fetched
+from the provider) and then as NDJSON (pages read from the result cache), and as
+many bulk-job results through GET /api/jobs/{id}/results. The app is called
+directly, so each chunk is discarded as soon as it is sent (as a client
+downloading the file would). Peak Python memory during each download is traced,
+next to the peak of building the same CSV as one list and one string, as the job
+CSV download did before.
+
+The check passes when every export has all its rows and the streaming peak at
+the largest row count is under twice the peak at the smallest.
+
+Usage (from the repository root):
+    python -m bench.export_bench
+"""
+import io
+import os
+import csv
+import gc
+import sys
+import json
+import time
+import asyncio
+import logging
+import tempfile
+import tracemalloc
+from urllib.parse import urlencode
+
+ROW_COUNTS = (1000, 10000)
+SEARCH = {"category": "plumber", "api_choice": "outscraper"}
+
+
+async def download(app, path: str, params: dict) -> tuple:
+    """GET `path` from the ASGI app, discarding the body; return (status, bytes, lines)."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": urlencode(params).encode(), "root_path": "",
+        "headers": [(b"host", b"lowrated.test")], "client": ("127.0.0.1", 1), "server": ("lowrated.test", 80),
+    }
+    received = {"status": None, "bytes": 0, "lines": 0}
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if requested:
+            # The client stays connected until the response is complete
+            await asyncio.Event().wait()
+        requested = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            received["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            received["bytes"] += len(message.get("body", b""))
+            received["lines"] += message.get("body", b"").count(b"\n")
+
+    await app(scope, receive, send)
+    return received["status"], received["bytes"], received["lines"]
+
+
+def fill_job(rows: int) -> str:
+    """Store a finished bulk job with `rows` analyzed domains; return its id."""
+    from bench.stubs import ANALYSIS
+    from app.jobs import job_store
+    job_id = job_store.create_job([f"business-{index}.example" for index in range(rows)])
+    conn = job_store._connect()
+    result = {"success": True, "analysis": ANALYSIS, "search_count": 15, "trustpilot_count": 3}
+    conn.execute("UPDATE job_items SET status = 'done', result = ? WHERE job_id = ?", (json.dumps(result), job_id))
+    conn.commit()
+    return job_id
+
+
+async def traced(coroutine) -> tuple:
+    """Run `coroutine`; return its result, peak traced memory above the start, and seconds."""
+    gc.collect()
+    tracemalloc.reset_peak()
+    start_memory = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    result = await coroutine
+    return result, tracemalloc.get_traced_memory()[1] - start_memory, time.perf_counter() - start
+
+
+async def build_in_memory(job_id: str) -> int:
+    """The job CSV as it was built before: every item loaded, then one string."""
+    from app.jobs import job_store, job_result_row, CSV_COLUMNS
+    items = job_store.get_items(job_id)
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=CSV_COLUMNS)
+    writer.writeheader()
+    for item in items:
+        row = job_result_row(item)
+        writer.writerow({**row, "key_issues": '; '.join(row["key_issues"])})
+    return len(output.getvalue())
+
+
+async def run() -> int:
+    import bench.stubs
+    from bench.stubs import StubTransport, StubProfile
+    from app.http_client import init_http_client, close_http_client
+    from app.main import app
+
+    bench.stubs.OUTSCRAPER_RESULTS_TOTAL = max(ROW_COUNTS)
+    await init_http_client(transport=StubTransport({'outscraper': StubProfile(0.0)}))
+    # Warm-up, so imports and first-use allocations are not counted
+    await download(app, "/api/export/search", {**SEARCH, "location": "Warmup", "format": "csv", "limit": 100})
+    tracemalloc.start()
+    peaks, job_ids = {}, {}
+    ok = True
+    print(f"{'export':<22} {'rows':>6} {'status':>6} {'lines':>6} {'KiB sent':>9} {'peak KiB':>9} {'seconds':>8}")
+    try:
+        for rows in ROW_COUNTS:
+            job_id = fill_job(rows)
+            # The CSV export fetches every page from the provider; the NDJSON one reads them from the cache
+            search = {**SEARCH, "location": f"Springfield {rows}", "limit": rows}
+            exports = [
+                ("search csv", download(app, "/api/export/search", {**search, "format": "csv"})),
+                ("search ndjson (cached)", download(app, "/api/export/search", {**search, "format": "ndjson"})),
+                ("job csv", download(app, f"/api/jobs/{job_id}/results", {"format": "csv"})),
+                ("job ndjson", download(app, f"/api/jobs/{job_id}/results", {"format": "ndjson"})),
+            ]
+            for name, coroutine in exports:
+                (status, size, lines), peak, seconds = await traced(coroutine)
+                # CSV has a header line; every row is a line
+                expected = rows + (1 if name.endswith("csv") else 0)
+                ok = ok and status == 200 and lines == expected
+                peaks[(name, rows)] = peak
+                print(f"{name:<22} {rows:6d} {status:6d} {lines:6d} {size / 1024:9.0f} {peak / 1024:9.0f} {seconds:8.2f}")
+            job_ids[rows] = job_id
+        # Measured last, so memory it leaves allocated does not skew the streaming peaks
+        for rows, job_id in job_ids.items():
+            size, peak, seconds = await traced(build_in_memory(job_id))
+            print(f"{'job csv (in memory)':<22} {rows:6d} {'-':>6} {'-':>6} {size / 1024:9.0f} {peak / 1024:9.0f} {seconds:8.2f}")
+    finally:
+        tracemalloc.stop()
+        await close_http_client()
+    smallest, largest = min(ROW_COUNTS), max(ROW_COUNTS)
+    for name in ("search csv", "search ndjson (cached)", "job csv", "job ndjson"):
+        ok = ok and peaks[(name, largest)] < 2 * peaks[(name, smallest)]
+    print("PASS" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+def main() -> int:
+    # Stub credentials set before the app loads .env, so real keys are never read or sent
+    for name in ('OUTSCRAPER_API_KEY', 'GOOGLE_API_KEY', 'APIFY_TOKEN', 'SERPAPI_KEY', 'OPENAI_API_KEY'):
+        os.environ[name] = 'stub'
+    directory = tempfile.mkdtemp()
+    os.environ['CACHE_PATH'] = os.path.join(directory, 'cache.sqlite3')
+    os.environ['JOBS_PATH'] = os.path.join(directory, 'jobs.sqlite3')
+    # Measure the export, not the configured upstream rate limits
+    os.environ['RATE_LIMIT_OUTSCRAPER'] = '100000'
+    os.environ['RATE_BURST_OUTSCRAPER'] = '100000'
+    logging.disable(logging.CRITICAL)
+    return asyncio.run(run())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
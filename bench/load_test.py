@@ -0,0 +1,216 @@
+"""
+Load test for /search and /api/ai-search against the offline provider stubs.
+
+Runs the FastAPI app in-process with every upstream call answered by
+bench/stubs.py (no network, no API spend), sends a fixed number of requests at
+a chosen concurrency and reports throughput and p50/p95/p99 latency per endpoint,
+plus the upstream requests, errors and 429s each stub served.
+
+Before the load test, the app is started in a fresh process to report its
+cold-start time (import, and until the lifespan startup completes, i.e. ready to
+serve), its resident memory once ready, and which lazily loaded provider modules
+were imported.
+
+Requests cycle through `--distinct` different queries: the default makes every
+request a cache miss; a small value measures the cached and coalesced path.
+Upstream rate limits apply as configured (RATE_LIMIT_<PROVIDER>); pass
+--unthrottled to measure the app rather than the configured budgets.
+
+Usage (from the repository root):
+    python -m bench.load_test [--endpoint search|ai-search|all] [--requests 200]
+        [--concurrency 20] [--distinct N] [--api-choice google_places]
+        [--latency-scale 1.0] [--profile provider=latency,jitter,error_rate,throttle_rate ...]
+        [--unthrottled] [--seed 0] [--verbose]
+
+Example: 5% SerpAPI errors with latency scaled down tenfold:
+    python -m bench.load_test --endpoint ai-search --latency-scale 0.1 --profile serpapi=0.8,0.3,0.05
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+import subprocess
+
+import httpx
+
+from bench.stubs import StubTransport, DEFAULT_PROFILES, parse_profile
+
+STUB_CREDENTIALS = ('OUTSCRAPER_API_KEY', 'GOOGLE_API_KEY', 'APIFY_TOKEN', 'SERPAPI_KEY', 'OPENAI_API_KEY')
+CATEGORIES = ["plumbers", "dentists", "roofers", "movers", "electricians", "locksmiths", "car repair", "hvac"]
+LOCATIONS = ["Austin", "Denver", "Springfield", "Portland", "Tampa", "Columbus", "Reno", "Boise"]
+# Run in a fresh interpreter: time to import the app and to finish its startup, then memory
+STARTUP_PROBE = """
+import sys, json, time, asyncio
+start = time.perf_counter()
+from app.main import app
+imported = time.perf_counter() - start
+async def ready():
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter() - start
+        rss = next(int(line.split()[1]) for line in open('/proc/self/status') if line.startswith('VmRSS'))
+        from app.providers import PROVIDERS
+        loaded = [name for name, provider in PROVIDERS.items() if provider.lazy and provider.loaded]
+        print(json.dumps({"import": imported, "ready": ready, "rss_kb": rss, "loaded": loaded}))
+asyncio.run(ready())
+"""
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def search_request(index: int) -> tuple:
+    category = CATEGORIES[index % len(CATEGORIES)]
+    location = LOCATIONS[index // len(CATEGORIES) % len(LOCATIONS)]
+    round_ = index // (len(CATEGORIES) * len(LOCATIONS))
+    return category, f"{location} {round_}" if round_ else location
+
+
+async def run_endpoint(client: httpx.AsyncClient, endpoint: str, args) -> dict:
+    """Send args.requests requests at args.concurrency and collect latencies and status codes."""
+    queue = asyncio.Queue()
+    for index in range(args.requests):
+        queue.put_nowait(index % args.distinct)
+    latencies, statuses = [], {}
+
+    async def worker():
+        while not queue.empty():
+            index = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                if endpoint == 'search':
+                    category, location = search_request(index)
+                    response = await client.post("/search", data={
+                        "category": category, "location": location, "api_choice": args.api_choice
+                    })
+                else:
+                    response = await client.post("/api/ai-search", json={"domain": f"business{index}.example"})
+                status = response.status_code
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": latencies[-1] if latencies else 0.0,
+        "statuses": statuses,
+    }
+
+
+def measure_startup() -> dict:
+    """
+    Cold-start the app in a subprocess with stub credentials and throwaway stores.
+
+    :return: {"import": seconds, "ready": seconds, "rss_kb": int, "loaded": [provider, ...]},
+             or {} where /proc is not available
+    """
+    import json
+    directory = tempfile.mkdtemp()
+    env = {**os.environ, **{name: 'stub' for name in STUB_CREDENTIALS}}
+    for name in ('CACHE_PATH', 'JOBS_PATH', 'APIFY_RUNS_PATH', 'WATCHLIST_PATH', 'SHARED_STATE_PATH'):
+        env[name] = os.path.join(directory, f"{name.lower()}.sqlite3")
+    probe = subprocess.run([sys.executable, '-c', STARTUP_PROBE], env=env, capture_output=True, text=True)
+    if probe.returncode != 0:
+        return {}
+    return json.loads(probe.stdout.strip().splitlines()[-1])
+
+
+def parse_args(argv: list):
+    parser = argparse.ArgumentParser(prog="python -m bench.load_test", description=__doc__.split('\n\n')[0])
+    parser.add_argument('--endpoint', choices=['search', 'ai-search', 'all'], default='all')
+    parser.add_argument('--requests', type=int, default=200, help="requests per endpoint")
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--distinct', type=int, help="distinct queries (default: one per request)")
+    parser.add_argument('--api-choice', default='google_places',
+                        choices=['outscraper', 'google_places', 'apify', 'all'], help="/search provider")
+    parser.add_argument('--latency-scale', type=float, default=1.0, help="multiply every stub latency")
+    parser.add_argument('--profile', action='append', default=[], type=parse_profile,
+                        help="provider=latency[,jitter[,error_rate[,throttle_rate]]]")
+    parser.add_argument('--unthrottled', action='store_true', help="lift the app's upstream rate limits")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verbose', action='store_true', help="show the app's logs")
+    args = parser.parse_args(argv)
+    args.distinct = max(1, min(args.distinct or args.requests, args.requests))
+    args.concurrency = max(1, args.concurrency)
+    return args
+
+
+async def main(argv: list = None) -> int:
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    # Stub credentials set before the app loads .env, so real keys are never read or sent
+    for name in STUB_CREDENTIALS:
+        os.environ[name] = 'stub'
+    if args.unthrottled:
+        for provider in DEFAULT_PROFILES:
+            os.environ[f'RATE_LIMIT_{provider.upper()}'] = '100000'
+            os.environ[f'RATE_BURST_{provider.upper()}'] = '100000'
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    startup = measure_startup()
+
+    from app.cache import result_cache, analysis_cache
+    from app.apify_runs import apify_run_store
+    from app.http_client import init_http_client, close_http_client
+    from app.main import app
+
+    # Keep the run isolated from (and out of) the persistent caches and Apify run records
+    directory = tempfile.mkdtemp()
+    result_cache.path = analysis_cache.path = os.path.join(directory, "cache.sqlite3")
+    apify_run_store.path = os.path.join(directory, "apify_runs.sqlite3")
+
+    stubs = StubTransport(dict(args.profile), latency_scale=args.latency_scale, seed=args.seed)
+    await init_http_client(transport=stubs)
+    endpoints = ['search', 'ai-search'] if args.endpoint == 'all' else [args.endpoint]
+    results = {}
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://lowrated.test", timeout=None) as client:
+            for endpoint in endpoints:
+                results[endpoint] = await run_endpoint(client, endpoint, args)
+    finally:
+        await close_http_client()
+
+    print(
+        f"{args.requests} requests per endpoint, concurrency {args.concurrency}, {args.distinct} distinct queries, "
+        f"latency x{args.latency_scale}{', unthrottled' if args.unthrottled else ''}"
+    )
+    if startup:
+        print(
+            f"startup: import {startup['import']:.2f}s, ready {startup['ready']:.2f}s, "
+            f"RSS {startup['rss_kb'] / 1024:.0f} MB, lazy providers loaded: {', '.join(startup['loaded']) or 'none'}"
+        )
+    print(f"{'endpoint':<12} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  statuses")
+    for endpoint, result in results.items():
+        statuses = ', '.join(f"{status}: {count}" for status, count in sorted(result['statuses'].items(), key=str))
+        print(
+            f"{endpoint:<12} {result['throughput']:8.1f} {result['p50']:7.3f}s {result['p95']:7.3f}s "
+            f"{result['p99']:7.3f}s {result['max']:7.3f}s  {statuses}"
+        )
+    print("\nupstream stub calls")
+    for provider, stats in stubs.get_stats().items():
+        if stats['requests']:
+            print(f"  {provider:<14} {stats['requests']:6d} requests  {stats['errors']:5d} errors  {stats['throttled']:5d} 429s")
+
+    ok = all(result['statuses'].get(200, 0) for result in results.values())
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,149 @@
+"""
+Measure map-reduce AI analysis of large review corpora.
+
+Analyzes a business with CORPUS_SIZES Trustpilot reviews plus MENTIONS web
+mentions against the offline OpenAI stub (bench/stubs.py), each model call taking
+MODEL_LATENCY seconds. For each size it reports the chunks, model calls and time
+of a first analysis (corpora under AI_MAP_REDUCE_MIN_TOKENS are analyzed in one
+prompt, shown as one chunk), of a rerun on the same data, and of a rerun after
+NEW_REVIEWS more reviews arrive, next to how many reviews the single prompt used
+before held (the rest were dropped over the token budget).
+
+The check passes when the first analysis's time grows sublinearly with the corpus
+(chunks are extracted concurrently), a rerun makes no model calls, and a rerun
+with new reviews repeats fewer than half of the calls.
+
+Usage (from the repository root):
+    python -m bench.mapreduce_bench
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import tempfile
+from datetime import datetime, timezone
+
+CORPUS_SIZES = (50, 200, 800)
+MENTIONS = 15
+NEW_REVIEWS = 3
+MODEL_LATENCY = 0.2
+BUSINESS = "acme"
+# Words for the details that make each simulated review distinct
+DETAIL_WORDS = (
+    "invoice technician appointment kitchen bathroom leak boiler quote deposit warranty manager weekend "
+    "callback parts estimate heater drain pipe install schedule office receipt inspection tuesday contract"
+).split()
+
+
+def make_review(index: int, now: float) -> dict:
+    from bench.stubs import REVIEW_TEXTS
+    rng = random.Random(index)
+    details = ' '.join(rng.choice(DETAIL_WORDS) for _ in range(20))
+    # One review every six hours, the newest at `now`
+    timestamp = now - (10000 - index) * 6 * 3600
+    return {
+        "author": f"Customer {index}",
+        "rating": 1 + index % 5,
+        "text": f"{REVIEW_TEXTS[index % len(REVIEW_TEXTS)]} {details}",
+        "date": datetime.fromtimestamp(timestamp, timezone.utc).strftime('%m/%d/%Y %H:%M:%S'),
+    }
+
+
+def make_mentions() -> list:
+    from bench.stubs import MENTION_TEMPLATES
+    mentions = []
+    for index in range(MENTIONS):
+        title, snippet = MENTION_TEMPLATES[index % len(MENTION_TEMPLATES)]
+        query = f'"{BUSINESS}" complaints'
+        mentions.append({
+            "title": title.format(name=BUSINESS), "link": f"https://forum.example/{BUSINESS}/{index}",
+            "snippet": snippet.format(name=BUSINESS), "source": "forum.example", "date": "",
+            "search_query": query, "search_queries": [query],
+        })
+    return mentions
+
+
+async def measure(size: int) -> dict:
+    """Time a first analysis, a rerun and a rerun with new reviews of a `size`-review corpus."""
+    from bench.stubs import StubTransport, StubProfile, openai_response
+    from app.http_client import init_http_client, close_http_client
+    from app.cache import analysis_cache
+    from app.context_builder import build_context, build_chunks, needs_map_reduce
+    from app.ai_analyzer import analyze_reputation_data
+
+    analysis_cache.path = os.path.join(tempfile.mkdtemp(), "cache.sqlite3")
+    calls = []
+
+    def respond_openai(request):
+        calls.append(request)
+        return openai_response(request)
+
+    await init_http_client(transport=StubTransport(
+        {'openai': StubProfile(MODEL_LATENCY)}, responders={'openai': respond_openai}
+    ))
+    now = time.time()
+    reviews = [make_review(index, now) for index in range(size)]
+    mentions = make_mentions()
+    runs = {}
+    try:
+        for run in ('first', 'rerun', 'new reviews'):
+            if run == 'new reviews':
+                reviews += [make_review(size + index, now + (index + 1) * 3600) for index in range(NEW_REVIEWS)]
+            before = len(calls)
+            start = time.perf_counter()
+            analysis = await analyze_reputation_data(BUSINESS, mentions, reviews)
+            runs[run] = {"calls": len(calls) - before, "seconds": time.perf_counter() - start,
+                         "error": analysis.get("error")}
+    finally:
+        await close_http_client()
+    chunks = build_chunks(BUSINESS, mentions, reviews)
+    return {
+        # One budgeted prompt below AI_MAP_REDUCE_MIN_TOKENS
+        "chunks": len(chunks) if needs_map_reduce(BUSINESS, chunks) else 1,
+        # Reviews the single-prompt analysis would have seen
+        "single_prompt_reviews": build_context(BUSINESS, mentions, reviews).count("Rating: "),
+        "runs": runs,
+    }
+
+
+async def run() -> int:
+    # Imported up front so the SDK's import time is not counted in the first measurement
+    import openai  # noqa: F401
+    print(f"{MENTIONS} mentions plus N reviews; {MODEL_LATENCY * 1000:.0f} ms per model call")
+    print(f"{'reviews':>8} {'single prompt':>14} {'chunks':>7} {'run':<12} {'model calls':>12} {'ms':>8}")
+    results = {}
+    for size in CORPUS_SIZES:
+        results[size] = result = await measure(size)
+        for name, measured in result["runs"].items():
+            print(
+                f"{size:8d} {result['single_prompt_reviews']:14d} {result['chunks']:7d} {name:<12} "
+                f"{measured['calls']:12d} {measured['seconds'] * 1000:8.0f}"
+                + (f"  error: {measured['error']}" if measured['error'] else "")
+            )
+    smallest, largest = results[CORPUS_SIZES[0]], results[CORPUS_SIZES[-1]]
+    growth = largest["runs"]["first"]["seconds"] / smallest["runs"]["first"]["seconds"]
+    print(f"corpus x{CORPUS_SIZES[-1] / CORPUS_SIZES[0]:.0f}: first-analysis time x{growth:.1f}")
+    ok = (growth < CORPUS_SIZES[-1] / CORPUS_SIZES[0] / 2
+          and all(not measured["error"] for result in results.values() for measured in result["runs"].values())
+          and all(result["runs"]["rerun"]["calls"] == 0 for result in results.values())
+          and all(result["runs"]["new reviews"]["calls"] * 2 < result["runs"]["first"]["calls"]
+                  for result in results.values() if result["chunks"] > 3))
+    print("PASS" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+def main() -> int:
+    # Stub credentials set before the app loads .env, so real keys are never read or sent
+    for name in ('OUTSCRAPER_API_KEY', 'GOOGLE_API_KEY', 'APIFY_TOKEN', 'SERPAPI_KEY', 'OPENAI_API_KEY'):
+        os.environ[name] = 'stub'
+    # Measure the analysis, not the configured upstream rate limits
+    os.environ['RATE_LIMIT_OPENAI'] = '100000'
+    os.environ['RATE_BURST_OPENAI'] = '100000'
+    logging.disable(logging.CRITICAL)
+    return asyncio.run(run())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
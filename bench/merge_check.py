@@ -0,0 +1,55 @@
+"""
+Check which businesses the federated merger treats as one.
+
+Feeds pairs of provider records through BusinessMerger (no network) and checks
+each pair is merged or kept apart as expected: businesses whose only website is
+a page on a shared host (Facebook, Yelp...) and branches of one chain stay
+apart, while one business reported by two providers is merged.
+
+Usage (from the repository root):
+    python -m bench.merge_check
+"""
+import sys
+
+from app.federated import BusinessMerger, normalize_business
+
+# (description, first record, second record, expected number of businesses)
+CASES = [
+    ("social pages of two businesses",
+     {"name": "Joe Dental", "address": "12 Oak St, Austin, TX", "website": "https://facebook.com/joedental"},
+     {"name": "Smile Clinic", "address": "40 Elm St, Austin, TX", "website": "https://www.facebook.com/smileclinic"},
+     2),
+    ("two branches of a chain, branch pages",
+     {"name": "Starbucks", "address": "1 A St, Austin, TX", "website": "https://starbucks.com/store/1"},
+     {"name": "Starbucks", "address": "500 B Ave, Austin, TX", "website": "https://starbucks.com/store/2"},
+     2),
+    ("two branches of a chain, one website",
+     {"name": "Starbucks", "address": "1 A St, Austin, TX", "website": "https://starbucks.com"},
+     {"name": "Starbucks", "address": "500 B Ave, Austin, TX", "website": "https://www.starbucks.com/"},
+     2),
+    ("one business, two providers",
+     {"name": "Acme Plumbing", "address": "7 Main Street, Austin, TX", "website": "https://acmeplumbing.com"},
+     {"name": "Acme Plumbing LLC", "address": "7 Main St, Austin, TX 78701", "website": "http://www.acmeplumbing.com/"},
+     1),
+    ("one business, no address from one provider",
+     {"name": "Acme Plumbing", "address": None, "website": "https://acmeplumbing.com"},
+     {"name": "Acme Plumbing", "address": "7 Main St, Austin, TX", "website": "https://acmeplumbing.com"},
+     1),
+]
+
+
+def main() -> int:
+    ok = True
+    for description, first, second, expected in CASES:
+        merger = BusinessMerger()
+        merger.add(normalize_business(first, 'google_places'))
+        merger.add(normalize_business(second, 'outscraper'))
+        passed = len(merger.records) == expected
+        ok = ok and passed
+        print(f"{'ok' if passed else 'FAIL':<5} {description}: {len(merger.records)} businesses (expected {expected})")
+    print("PASS" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
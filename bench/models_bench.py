@@ -0,0 +1,129 @@
+"""
+Measure the memory and JSON serialization cost of search results per 10k reviews.
+
+Builds BUSINESSES businesses with REVIEWS_PER_BUSINESS reviews each from
+Outscraper-shaped provider data (bench/stubs.py), in three forms:
+
+- ad-hoc dicts: the per-provider dicts the provider modules built before
+  app/models.py (4 keys per review)
+- model dicts: Business.to_dict(), the normalized form results leave the
+  provider modules in and are cached, merged and rendered in
+- models: the __slots__ Business/Review objects themselves, for reference only
+  (nothing in the app keeps results in this form)
+
+For each it reports the memory the structures allocate (the strings are shared
+with the provider data and not counted) and the time to render them as a
+response body with Starlette's stdlib JSONResponse and with ORJSONResponse.
+The models normalize the schema; they are not a memory saving, since the app
+holds model dicts. The check passes when model dicts take no more memory than
+the ad-hoc dicts and ORJSONResponse renders faster than JSONResponse.
+
+Usage (from the repository root):
+    python -m bench.models_bench
+"""
+import sys
+import time
+import random
+import tracemalloc
+
+BUSINESSES = 2000
+REVIEWS_PER_BUSINESS = 5
+REPEATS = 5
+
+
+def provider_places() -> list:
+    """Raw Outscraper reviews-v3 places, as bench.stubs serves them."""
+    from bench.stubs import _business, _review
+    places = []
+    for index in range(BUSINESSES):
+        rng = random.Random(index)
+        business = _business(rng, "plumber", index)
+        places.append({
+            "name": business["name"],
+            "full_address": business["address"],
+            "rating": business["rating"],
+            "reviews": business["reviews_count"],
+            "site": business["website"],
+            "phone": business["phone"],
+            "reviews_data": [
+                {**review, "autor_name": review["author_title"]}
+                for review in (_review(rng) for _ in range(REVIEWS_PER_BUSINESS))
+            ],
+        })
+    return places
+
+
+def adhoc_business(place: dict) -> dict:
+    """The dict app/outscraper.py built per place before the shared models."""
+    return {
+        "name": place.get("name"),
+        "address": place.get("full_address"),
+        "rating": place.get("rating"),
+        "reviews_count": place.get("reviews"),
+        "website": place.get("site") or place.get("website") or place.get("domain"),
+        "reviews": [
+            {
+                "author": review.get("autor_name"),
+                "rating": review.get("review_rating"),
+                "text": review.get("review_text"),
+                "date": review.get("review_datetime_utc")
+            }
+            for review in place.get("reviews_data", [])
+        ]
+    }
+
+
+def measure_memory(build) -> tuple:
+    """(result, bytes allocated while building it)"""
+    tracemalloc.start()
+    result = build()
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, allocated
+
+
+def measure_render(response_class, content) -> float:
+    """Best-of-REPEATS seconds to render `content` as a response body."""
+    best = float('inf')
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        response_class(content={"results": content})
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> int:
+    from fastapi.responses import JSONResponse, ORJSONResponse
+    from app.models import Business
+
+    places = provider_places()
+    reviews = BUSINESSES * REVIEWS_PER_BUSINESS
+    forms = {
+        "ad-hoc dicts": lambda: [adhoc_business(place) for place in places],
+        "model dicts": lambda: [Business.from_outscraper(place).to_dict() for place in places],
+        "models": lambda: [Business.from_outscraper(place) for place in places],
+    }
+
+    print(f"{BUSINESSES} businesses x {REVIEWS_PER_BUSINESS} reviews; figures per 10k reviews")
+    print(f"{'form':<14} {'memory KiB':>11} {'JSONResponse ms':>16} {'ORJSONResponse ms':>18}")
+    memory, stdlib_ms, orjson_ms = {}, {}, {}
+    for name, build in forms.items():
+        content, allocated = measure_memory(build)
+        memory[name] = allocated * 10000 / reviews
+        # The stdlib encoder cannot serialize dataclasses; they go through to_dict() first
+        if name == "models":
+            stdlib_ms[name] = measure_render(JSONResponse, [business.to_dict() for business in content])
+        else:
+            stdlib_ms[name] = measure_render(JSONResponse, content)
+        orjson_ms[name] = measure_render(ORJSONResponse, content)
+        scale = 10000 / reviews * 1000
+        print(f"{name:<14} {memory[name] / 1024:11.0f} {stdlib_ms[name] * scale:16.1f} {orjson_ms[name] * scale:18.1f}")
+
+    ok = (memory["model dicts"] <= memory["ad-hoc dicts"]
+          and all(orjson_ms[name] < stdlib_ms[name] for name in forms))
+    print("PASS" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Check that several worker processes share caching, in-flight calls and rate budgets.
+
+Starts worker processes that each run the app in-process against the offline
+provider stubs (bench/stubs.py), all pointed at the same cache and shared-state
+databases, as uvicorn workers would be:
+
+1. De-duplication: every worker requests the same AI searches at the same moment.
+   With shared state the providers must see as many Trustpilot and OpenAI calls
+   as a single worker makes (and at most five SERP queries per search); without
+   it, each worker calls them itself.
+2. Rate budget: every worker runs different Google Places searches with a budget
+   of RATE_PER_SECOND; the combined upstream rate must stay within it.
+3. Throughput: cached results pages rendered by 1, 2 and 4 workers (this scales
+   with CPU cores, so it is reported but not checked).
+
+Usage (from the repository root):
+    python -m bench.multiworker_check [workers]
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import tempfile
+import multiprocessing
+
+DEFAULT_WORKERS = 3
+DOMAINS = ["acme-plumbing.example", "budget-movers.example", "summit-dental.example"]
+RATE_PER_SECOND = 5
+RATE_SEARCHES_PER_WORKER = 10
+THROUGHPUT_REQUESTS = 300
+
+
+def configure(directory: str, shared: bool, rate: float = None):
+    """Environment for a worker process; set before the app is imported."""
+    for name in ('OUTSCRAPER_API_KEY', 'GOOGLE_API_KEY', 'APIFY_TOKEN', 'SERPAPI_KEY', 'OPENAI_API_KEY'):
+        os.environ[name] = 'stub'
+    os.environ['SHARED_STATE'] = 'true' if shared else 'false'
+    os.environ['SHARED_STATE_PATH'] = os.path.join(directory, 'shared.sqlite3')
+    os.environ['CACHE_PATH'] = os.path.join(directory, 'cache.sqlite3')
+    os.environ['JOBS_PATH'] = os.path.join(directory, 'jobs.sqlite3')
+    os.environ['APIFY_RUNS_PATH'] = os.path.join(directory, 'apify_runs.sqlite3')
+    if rate:
+        os.environ['RATE_LIMIT_GOOGLE_PLACES'] = str(rate)
+        os.environ['RATE_BURST_GOOGLE_PLACES'] = '1'
+    logging.disable(logging.CRITICAL)
+
+
+async def run_worker(scenario: str, index: int, barrier) -> dict:
+    import httpx
+    from bench.stubs import StubTransport, StubProfile
+    from app.http_client import init_http_client, close_http_client
+    from app.main import app
+
+    stubs = StubTransport({
+        'trustpilot': StubProfile(0.3, 0.05), 'serpapi': StubProfile(0.2, 0.05),
+        'openai': StubProfile(0.5, 0.1), 'google_places': StubProfile(0.05, 0.01),
+    }, seed=index)
+    await init_http_client(transport=stubs)
+    times = []
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://lowrated.test", timeout=None) as client:
+            if scenario == 'throughput':
+                # Warm the cache, then time rendering of cached pages
+                await client.post("/search", data={"category": "plumbers", "location": "Austin", "api_choice": "google_places"})
+            barrier.wait()
+            start = time.time()
+            if scenario == 'dedupe':
+                await asyncio.gather(*(client.post("/api/ai-search", json={"domain": domain}) for domain in DOMAINS))
+            elif scenario == 'rate':
+                for search in range(RATE_SEARCHES_PER_WORKER):
+                    await client.post("/search", data={
+                        "category": f"category {index}-{search}", "location": "Austin", "api_choice": "google_places"
+                    })
+                    times.append(time.time())
+            else:
+                async def page():
+                    await client.post("/search", data={
+                        "category": "plumbers", "location": "Austin", "api_choice": "google_places"
+                    })
+                for _ in range(THROUGHPUT_REQUESTS // 10):
+                    await asyncio.gather(*(page() for _ in range(10)))
+            elapsed = time.time() - start
+    finally:
+        await close_http_client()
+    return {"stubs": stubs.get_stats(), "elapsed": elapsed, "start": start, "times": times}
+
+
+def worker_main(scenario: str, index: int, directory: str, shared: bool, rate, barrier, results):
+    configure(directory, shared, rate)
+    results.put((index, asyncio.run(run_worker(scenario, index, barrier))))
+
+
+def run(scenario: str, workers: int, shared: bool, rate: float = None) -> list:
+    context = multiprocessing.get_context('spawn')
+    directory = tempfile.mkdtemp()
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker_main, args=(scenario, index, directory, shared, rate, barrier, results))
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    outcome = [results.get(timeout=300)[1] for _ in processes]
+    for process in processes:
+        process.join()
+    return outcome
+
+
+def upstream_calls(outcome: list) -> dict:
+    totals = {}
+    for result in outcome:
+        for provider, stats in result["stubs"].items():
+            totals[provider] = totals.get(provider, 0) + stats["requests"]
+    return {provider: count for provider, count in totals.items() if count}
+
+
+def main() -> int:
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_WORKERS
+    ok = True
+
+    single = upstream_calls(run('dedupe', 1, shared=True))
+    shared = upstream_calls(run('dedupe', workers, shared=True))
+    separate = upstream_calls(run('dedupe', workers, shared=False))
+    print(f"{len(DOMAINS)} AI searches requested by every worker at once (upstream calls)")
+    print(f"  1 worker:                         {single}")
+    print(f"  {workers} workers, shared state:        {shared}")
+    print(f"  {workers} workers, per-process state:   {separate}")
+    # SERP queries still running once enough mentions are in are cancelled, so their count varies by a call or two
+    ok = ok and all(shared.get(provider) == single.get(provider) for provider in ('trustpilot', 'openai'))
+    ok = ok and shared.get('serpapi', 0) <= 5 * len(DOMAINS)
+
+    limit_ok = True
+    for label, is_shared in (("shared state", True), ("per-process state", False)):
+        outcome = run('rate', workers, shared=is_shared, rate=RATE_PER_SECOND)
+        stamps = sorted(stamp for result in outcome for stamp in result["times"])
+        rate = (len(stamps) - 1) / (stamps[-1] - stamps[0]) if len(stamps) > 1 else 0.0
+        print(f"{workers} workers x {RATE_SEARCHES_PER_WORKER} Google Places searches, budget {RATE_PER_SECOND}/s, "
+              f"{label}: {rate:.1f} searches/s")
+        if is_shared:
+            limit_ok = rate <= RATE_PER_SECOND * 1.1
+    ok = ok and limit_ok
+
+    print(f"cached results pages, {THROUGHPUT_REQUESTS} per worker ({os.cpu_count()} CPU cores)")
+    for count in (1, 2, 4):
+        outcome = run('throughput', count, shared=True)
+        elapsed = max(result["start"] + result["elapsed"] for result in outcome) - min(r["start"] for r in outcome)
+        print(f"  {count} worker(s): {count * THROUGHPUT_REQUESTS / elapsed:7.1f} pages/s")
+
+    print("PASS" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Micro-benchmark: the compiled negativity scorer against the original keyword scan.
+
+Builds a deterministic corpus of SERP-like snippets and times the original
+`any(keyword in text)` check, the scorer's yes/no match and its weighted score,
+then lists how often the two yes/no answers disagree (the original's substring
+false positives, such as "bad" in "badminton"). The original scans the text once
+per keyword, so the comparison is repeated with a 250-keyword lexicon.
+
+Usage (from the repository root):
+    python -m bench.negativity_bench [snippets]
+"""
+import random
+import sys
+import time
+
+from app.negativity import get_scorer, NegativityScorer, DEFAULT_LEXICON
+
+DEFAULT_SNIPPETS = 100_000
+SEED = 13
+LARGE_LEXICON_SIZE = 250
+
+# The keyword list and check as they were before app/negativity.py
+LEGACY_KEYWORDS = [
+    'complaint', 'scam', 'fraud', 'terrible', 'awful', 'worst', 'horrible',
+    'bad', 'negative', 'poor', 'disappointing', 'unprofessional', 'rude',
+    'dishonest', 'avoid', 'warning', 'beware', 'lawsuit', 'legal action',
+    'refund', 'money back', 'rip off', 'ripoff', 'stolen', 'theft'
+]
+
+
+def legacy_is_potentially_negative(result_data: dict) -> bool:
+    text_to_check = (result_data.get("title", "") + " " + result_data.get("snippet", "")).lower()
+    return any(keyword in text_to_check for keyword in LEGACY_KEYWORDS)
+
+
+NEUTRAL_WORDS = (
+    "the service team delivery order price customer staff location parking hours booking appointment "
+    "manager website phone email friendly quick clean store branch review rating local family owned "
+    "years experience quality product support contact visit open today city downtown"
+).split()
+# Words containing a keyword that are not negative
+LOOKALIKE_WORDS = "badminton badge badger abadan poorly-lit scampi avoidance prudent warningham crude".split()
+NEGATIVE_PHRASES = [
+    "scam", "total ripoff", "rip off", "filed a complaint", "complaints", "fraud alert", "terrible",
+    "worst experience", "rude staff", "no refund", "money back", "lawsuit filed", "beware", "stolen",
+]
+
+
+def build_corpus(size: int) -> list:
+    rng = random.Random(SEED)
+    corpus = []
+    for _ in range(size):
+        words = rng.choices(NEUTRAL_WORDS, k=rng.randint(15, 40))
+        if rng.random() < 0.3:
+            words.insert(rng.randrange(len(words)), rng.choice(NEGATIVE_PHRASES))
+        if rng.random() < 0.1:
+            words.insert(rng.randrange(len(words)), rng.choice(LOOKALIKE_WORDS))
+        title = " ".join(rng.choices(NEUTRAL_WORDS, k=6)).title()
+        corpus.append({"title": title, "snippet": " ".join(words)})
+    return corpus
+
+
+def build_large_lexicon(size: int) -> dict:
+    rng = random.Random(SEED)
+    lexicon = dict(DEFAULT_LEXICON)
+    while len(lexicon) < size:
+        lexicon[''.join(rng.choices('abcdefghijklmnopqrstuvwxyz', k=rng.randint(5, 10)))] = 1.0
+    return lexicon
+
+
+def timed(label: str, func, corpus: list):
+    start = time.perf_counter()
+    results = [func(item) for item in corpus]
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {elapsed:7.3f}s  {elapsed / len(corpus) * 1e6:6.2f} us/snippet")
+    return results, elapsed
+
+
+def main() -> int:
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SNIPPETS
+    corpus = build_corpus(size)
+    scorer = get_scorer()
+    text = lambda item: f"{item['title']} {item['snippet']}"
+
+    print(f"{size} snippets, {len(scorer.weights)} keywords")
+    legacy, legacy_time = timed("legacy any(keyword in text)", legacy_is_potentially_negative, corpus)
+    matched, match_time = timed("compiled regex, yes/no", lambda item: scorer.is_negative(text(item)), corpus)
+    _, score_time = timed("compiled regex, weighted score", lambda item: scorer.score(text(item)), corpus)
+
+    print(f"speedup (yes/no):         {legacy_time / match_time:5.2f}x")
+    print(f"speedup (weighted score): {legacy_time / score_time:5.2f}x")
+    false_positives = [item for item, old, new in zip(corpus, legacy, matched) if old and not new]
+    missed = [item for item, old, new in zip(corpus, legacy, matched) if new and not old]
+    print(f"legacy-only matches (substring false positives): {len(false_positives)}")
+    print(f"scorer-only matches (extra lexicon words):        {len(missed)}")
+    if false_positives:
+        lookalikes = {word for item in false_positives for word in item["snippet"].split() if word in LOOKALIKE_WORDS}
+        print(f"  e.g. {', '.join(sorted(lookalikes))}")
+
+    large_lexicon = build_large_lexicon(LARGE_LEXICON_SIZE)
+    large_keywords = list(large_lexicon)
+    large_scorer = NegativityScorer(large_lexicon)
+    print(f"\nwith {len(large_keywords)} keywords")
+    _, legacy_time = timed(
+        "legacy any(keyword in text)",
+        lambda item: any(keyword in text(item).lower() for keyword in large_keywords),
+        corpus
+    )
+    _, match_time = timed("compiled regex, yes/no", lambda item: large_scorer.is_negative(text(item)), corpus)
+    _, score_time = timed("compiled regex, weighted score", lambda item: large_scorer.score(text(item)), corpus)
+    print(f"speedup (yes/no):         {legacy_time / match_time:5.2f}x")
+    print(f"speedup (weighted score): {legacy_time / score_time:5.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+Measure results-page bytes transferred and render time.
+
+Runs the app in-process against the offline provider stubs (bench/stubs.py).
+
+Bytes: a results page (GET /search, Google Places, 20 cards) and
+/static/tailwind.min.css are fetched as the browser would on a first visit,
+uncompressed (identity, as all responses were before) and gzip/brotli-compressed,
+and then on a repeat visit, where the browser revalidates with If-None-Match and
+gets 304.
+
+Render time: results.html with RESULTS business cards, rendered with the card
+fragment cache disabled (every card rendered from the template, as before) and
+with it warm (a repeated search).
+
+The check passes when compression at least halves the first-visit bytes,
+repeat visits get 304s, and warm rendering is faster than uncached rendering.
+
+Usage (from the repository root):
+    python -m bench.render_bench
+"""
+import os
+import re
+import sys
+import time
+import asyncio
+import logging
+import tempfile
+
+RESULTS = 60
+REPEATS = 20
+SEARCH = {"category": "plumber", "location": "Springfield", "api_choice": "google_places"}
+
+
+async def fetch(client, path: str, params: dict = None, encoding: str = 'identity', etag: str = None):
+    headers = {"accept-encoding": encoding}
+    if etag:
+        headers["if-none-match"] = etag
+    response = await client.get(path, params=params, headers=headers)
+    return response, response.num_bytes_downloaded
+
+
+async def measure_bytes() -> tuple:
+    """Print bytes per visit; return (first-visit bytes by encoding, repeat-visit statuses)."""
+    import httpx
+    from bench.stubs import StubTransport, StubProfile, DEFAULT_PROFILES
+    from app.compression import brotli
+    from app.http_client import init_http_client, close_http_client
+    from app.main import app
+
+    encodings = ['identity', 'gzip'] + (['br'] if brotli is not None else [])
+    await init_http_client(transport=StubTransport({provider: StubProfile(0.0) for provider in DEFAULT_PROFILES}))
+    first, repeat_statuses = {}, []
+    print(f"{'resource':<22} {'encoding':<9} {'first visit':>12} {'repeat visit':>13}")
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://lowrated.test") as client:
+            for encoding in encodings:
+                page, page_bytes = await fetch(client, "/search", SEARCH, encoding)
+                css_url = re.search(r'href="(/static/[^"]+)"', page.text).group(1)
+                css, css_bytes = await fetch(client, css_url, encoding=encoding)
+                repeat_page, repeat_page_bytes = await fetch(client, "/search", SEARCH, encoding, page.headers["etag"])
+                repeat_css, repeat_css_bytes = await fetch(client, css_url, encoding=encoding, etag=css.headers["etag"])
+                repeat_statuses += [repeat_page.status_code, repeat_css.status_code]
+                first[encoding] = page_bytes + css_bytes
+                print(f"{'results page':<22} {encoding:<9} {page_bytes:12d} {repeat_page_bytes:13d}")
+                print(f"{'tailwind.min.css':<22} {encoding:<9} {css_bytes:12d} {repeat_css_bytes:13d}")
+    finally:
+        await close_http_client()
+    if brotli is None:
+        print("(brotli not installed: br not measured)")
+    # Before: no compression, and the page had no ETag, so repeat visits downloaded it again
+    print(f"before: {first['identity']} bytes on a first visit, the whole page again on repeat visits")
+    return first, repeat_statuses
+
+
+def measure_render() -> dict:
+    """Mean seconds to render results.html with the card cache off, cold and warm."""
+    import random
+    from bench.stubs import _business, _review
+    from app.models import Business, Review
+    from app.main import templates
+    from app.rendering import card_cache, CARD_CACHE_MAX_ENTRIES
+
+    results = []
+    for index in range(RESULTS):
+        rng = random.Random(index)
+        business = Business(**_business(rng, "plumber", index))
+        business.reviews = [Review.from_trustpilot(_review(rng)) for _ in range(5)]
+        results.append(business.to_dict())
+    template = templates.get_template("results.html")
+
+    def render() -> float:
+        start = time.perf_counter()
+        template.render(results=results, next_cursor=None)
+        return time.perf_counter() - start
+
+    timings = {}
+    card_cache.max_entries = 0
+    timings["uncached"] = sum(render() for _ in range(REPEATS)) / REPEATS
+    card_cache.max_entries = CARD_CACHE_MAX_ENTRIES
+    cold = []
+    for _ in range(REPEATS):
+        card_cache.clear()
+        cold.append(render())
+    timings["cold cache"] = sum(cold) / REPEATS
+    timings["warm cache"] = sum(render() for _ in range(REPEATS)) / REPEATS
+    print(f"\nresults.html with {RESULTS} cards")
+    for name, seconds in timings.items():
+        print(f"{name:<11} {seconds * 1000:8.2f} ms")
+    return timings
+
+
+def main() -> int:
+    # Stub credentials set before the app loads .env, so real keys are never read or sent
+    for name in ('OUTSCRAPER_API_KEY', 'GOOGLE_API_KEY', 'APIFY_TOKEN', 'SERPAPI_KEY', 'OPENAI_API_KEY'):
+        os.environ[name] = 'stub'
+    os.environ['CACHE_PATH'] = os.path.join(tempfile.mkdtemp(), 'cache.sqlite3')
+    logging.disable(logging.CRITICAL)
+
+    first, repeat_statuses = asyncio.run(measure_bytes())
+    timings = measure_render()
+    compressed = min(size for encoding, size in first.items() if encoding != 'identity')
+    ok = (compressed * 2 <= first['identity']
+          and all(status == 304 for status in repeat_statuses)
+          and timings["warm cache"] < timings["uncached"])
+    print("PASS" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,375 @@
+"""
+Offline stand-ins for every upstream API the app calls.
+
+`StubTransport` is an httpx transport that answers Outscraper (Maps and
+Trustpilot), Google Places, Apify, SerpAPI and OpenAI requests locally with
+responses shaped like the real ones. Each provider has a latency, jitter and
+error profile, so load tests see realistic waits, retries and failures with no
+network and no API spend. Any other host gets a 404 and nothing leaves the machine.
+
+Install it on the shared HTTP client (which the OpenAI client also uses):
+
+    from app.http_client import init_http_client
+    from bench.stubs import StubTransport
+    await init_http_client(transport=StubTransport())
+
+Response content is derived from the query, so repeated searches return the same
+businesses, reviews and mentions; latency and errors are drawn from a seeded RNG.
+"""
+import json
+import calendar
+import time
+import zlib
+import random
+import asyncio
+
+import httpx
+
+# Upstream host -> stub provider name
+HOSTS = {
+    'api.app.outscraper.com': 'outscraper',
+    'api.outscraper.cloud': 'trustpilot',
+    'places.googleapis.com': 'google_places',
+    'api.apify.com': 'apify',
+    'serpapi.com': 'serpapi',
+    'api.openai.com': 'openai',
+}
+
+NAME_WORDS = "Acme Budget Premier City Metro Sunrise Eagle Summit Family Express Quality Golden".split()
+STREETS = "Main Oak Maple Cedar Elm Pine Lake Hill Park Washington".split()
+REVIEW_TEXTS = [
+    "Terrible service, waited two hours and nobody called back.",
+    "They charged me twice and refused a refund. Avoid.",
+    "Rude staff and the job was left half done.",
+    "Decent work but overpriced for what you get.",
+    "Fast, friendly and fixed the problem on the first visit.",
+    "Complete scam, took the deposit and never showed up.",
+    "Poor communication, had to chase them for weeks.",
+    "Great experience, would recommend to friends.",
+]
+MENTION_TEMPLATES = [
+    ("{name} Reviews - Read Customer Complaints", "Customers report {name} charged hidden fees and ignored complaints for months."),
+    ("Is {name} a scam? | Consumer Forum", "Several people say {name} took deposits and never delivered. Beware before paying upfront."),
+    ("{name} - Better Business Bureau", "{name} has 14 complaints filed in the last 3 years, mostly about refunds and billing."),
+    ("{name} lawsuit filed by former customers", "A lawsuit filed this spring accuses {name} of misleading advertising."),
+    ("{name} | Company profile", "{name} provides services to local customers and has been in business for 12 years."),
+    ("My terrible experience with {name}", "Worst customer service I have dealt with; rude staff and no follow-up."),
+]
+ANALYSIS = {
+    "risk_level": "High",
+    "summary": "Repeated complaints about billing, refunds and unresponsive staff across review sites and forums.",
+    "key_issues": ["Refund disputes", "Hidden fees", "Unresponsive customer service"],
+    "concerning_patterns": ["Complaints cluster around deposits taken without delivery"],
+    "recommendations": ["Publish a clear refund policy", "Respond publicly to open complaints"],
+    "positive_aspects": ["Some customers praise the quality of completed work"],
+    "source_breakdown": {"web_mentions": "6 negative mentions", "trustpilot_reviews": "5 mostly negative reviews"},
+}
+# Chunk extraction of a map-reduce analysis (prompts asking for a "risk_signal")
+EXTRACTION = {
+    "issues": ["Refund disputes", "Hidden fees"],
+    "patterns": ["Deposits taken without delivery"],
+    "positives": ["Quality of completed work"],
+    "risk_signal": "High",
+    "negative_items": 4,
+}
+
+
+class StubProfile:
+    """
+    Behaviour of one stubbed provider.
+
+    :param latency: Mean seconds before the response is sent
+    :param jitter: Standard deviation of the latency, in seconds
+    :param error_rate: Fraction of requests answered with HTTP 503
+    :param throttle_rate: Fraction of requests answered with HTTP 429
+    """
+
+    def __init__(self, latency: float, jitter: float = 0.0, error_rate: float = 0.0, throttle_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+
+    def __repr__(self):
+        return (
+            f"StubProfile(latency={self.latency}, jitter={self.jitter}, "
+            f"error_rate={self.error_rate}, throttle_rate={self.throttle_rate})"
+        )
+
+
+# Typical response times of the real providers, in seconds
+DEFAULT_PROFILES = {
+    'outscraper': StubProfile(1.5, 0.4),
+    'trustpilot': StubProfile(1.0, 0.3),
+    'google_places': StubProfile(0.3, 0.1),
+    'apify': StubProfile(3.0, 0.8),
+    'serpapi': StubProfile(0.8, 0.3),
+    'openai': StubProfile(2.0, 0.5),
+}
+
+
+def parse_profile(spec: str) -> tuple:
+    """
+    Parse a command-line profile override, `provider=latency[,jitter[,error_rate[,throttle_rate]]]`.
+
+    :return: (provider, StubProfile)
+    :raises ValueError: Unknown provider or malformed numbers
+    """
+    provider, _, values = spec.partition('=')
+    provider = provider.strip()
+    if provider not in DEFAULT_PROFILES:
+        raise ValueError(f"Unknown stub provider '{provider}' (expected one of {', '.join(DEFAULT_PROFILES)})")
+    numbers = [float(value) for value in values.split(',') if value.strip()]
+    if not 1 <= len(numbers) <= 4:
+        raise ValueError(f"Expected provider=latency[,jitter[,error_rate[,throttle_rate]]], got '{spec}'")
+    return provider, StubProfile(*numbers)
+
+
+def _query_rng(*parts) -> random.Random:
+    """RNG seeded from request content, so the same query always gets the same data."""
+    return random.Random(zlib.crc32(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')))
+
+
+def _business(rng: random.Random, query: str, index: int) -> dict:
+    name = f"{rng.choice(NAME_WORDS)} {query.split()[0].title() if query.split() else 'Services'} {index + 1}"
+    slug = ''.join(char for char in name.lower() if char.isalnum())
+    return {
+        "name": name,
+        "address": f"{rng.randint(1, 999)} {rng.choice(STREETS)} St, Springfield, IL 62701",
+        "rating": round(rng.uniform(1.0, 3.0), 1),
+        "reviews_count": rng.randint(5, 400),
+        "website": f"https://www.{slug}.example",
+        "phone": f"+1 217-555-{rng.randint(1000, 9999)}",
+    }
+
+
+def _review(rng: random.Random) -> dict:
+    return {
+        "review_text": rng.choice(REVIEW_TEXTS),
+        "review_rating": rng.randint(1, 5),
+        "author_title": f"Customer {rng.randint(100, 999)}",
+        "review_datetime_utc": f"{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/2024 12:00:00",
+    }
+
+
+# Places a stubbed search has in total, so paging through it ends
+OUTSCRAPER_RESULTS_TOTAL = 60
+# Google Places text search returns at most three pages of 20
+GOOGLE_PLACES_RESULTS_TOTAL = 60
+
+
+def _outscraper_place(query: str, index: int, reviews_limit: int = 0) -> dict:
+    rng = _query_rng('outscraper', query, index)
+    business = _business(rng, query, index)
+    place = {
+        # Encodes the search and position, so reviews-v3 can rebuild the place from it
+        "place_id": f"stub:{index}:{query}",
+        "name": business["name"],
+        "full_address": business["address"],
+        "rating": business["rating"],
+        "reviews": business["reviews_count"],
+        "site": business["website"],
+        "phone": business["phone"],
+    }
+    if reviews_limit:
+        place["reviews_data"] = [
+            {**review, "autor_name": review["author_title"]}
+            for review in (_review(rng) for _ in range(reviews_limit))
+        ]
+    return place
+
+
+def outscraper_response(request: httpx.Request) -> httpx.Response:
+    limit = int(request.url.params.get('limit') or 5)
+    if request.url.path.endswith('/search-v3'):
+        # Places without reviews, one list per query; pages by `skip`
+        query = request.url.params.get('query', '')
+        skip = int(request.url.params.get('skip') or 0)
+        places = [_outscraper_place(query, index) for index in range(skip, min(skip + limit, OUTSCRAPER_RESULTS_TOTAL))]
+        return httpx.Response(200, json={"id": "stub", "status": "Success", "data": [places]})
+
+    # reviews-v3: the first `limit` places of a search (it takes no offset), or the place of a place id
+    reviews_limit = int(request.url.params.get('reviewsLimit') or 5)
+    places = []
+    for query in request.url.params.get_list('query'):
+        if query.startswith('stub:'):
+            _, index, search = query.split(':', 2)
+            places.append({**_outscraper_place(search, int(index), reviews_limit), "query": query})
+        else:
+            places += [_outscraper_place(query, index, reviews_limit) for index in range(min(limit, OUTSCRAPER_RESULTS_TOTAL))]
+    return httpx.Response(200, json={"id": "stub", "status": "Success", "data": places})
+
+
+def trustpilot_response(request: httpx.Request) -> httpx.Response:
+    limit = int(request.url.params.get('limit') or 3)
+    cutoff = float(request.url.params.get('cutoff') or 0)
+    data = []
+    for domain in request.url.params.get_list('query'):
+        rng = _query_rng('trustpilot', domain, limit)
+        reviews = [_review(rng) for _ in range(limit)]
+        if cutoff:
+            reviews = [
+                review for review in reviews
+                if calendar.timegm(time.strptime(review["review_datetime_utc"], "%m/%d/%Y %H:%M:%S")) >= cutoff
+            ]
+        data.append(reviews)
+    return httpx.Response(200, json={"id": "stub", "status": "Success", "data": data})
+
+
+def google_places_response(request: httpx.Request) -> httpx.Response:
+    body = json.loads(request.content or b'{}')
+    query = body.get('textQuery', '')
+    page_size = min(int(body.get('pageSize') or 20), 20)
+    start = int(body.get('pageToken', 'page-0').split('-')[-1])
+    end = min(start + page_size, GOOGLE_PLACES_RESULTS_TOTAL)
+    places = []
+    for index in range(start, end):
+        rng = _query_rng('google_places', query, index)
+        business = _business(rng, query, index)
+        places.append({
+            "displayName": {"text": business["name"], "languageCode": "en"},
+            "formattedAddress": business["address"],
+            "rating": business["rating"],
+            "userRatingCount": business["reviews_count"],
+        })
+    data = {"places": places}
+    if end < GOOGLE_PLACES_RESULTS_TOTAL:
+        data["nextPageToken"] = f"page-{end}"
+    return httpx.Response(200, json=data)
+
+
+APIFY_DATASET_SIZE = 25
+
+
+def apify_response(request: httpx.Request) -> httpx.Response:
+    path = request.url.path
+    if path.endswith('/runs') or '/actor-runs/' in path:
+        if path.endswith('/runs'):
+            run_input = json.loads(request.content or b'{}')
+            query = f"{' '.join(run_input.get('searchStringsArray') or [])} {run_input.get('locationQuery', '')}"
+            run_id = f"run-{zlib.crc32(query.encode('utf-8')):08x}"
+        else:
+            run_id = path.rsplit('/', 1)[-1]
+        # A run started without waiting is reported running until its status is checked
+        started_async = path.endswith('/runs') and request.url.params.get('waitForFinish') == '0'
+        return httpx.Response(201, json={"data": {
+            "id": run_id, "status": "RUNNING" if started_async else "SUCCEEDED",
+            "defaultDatasetId": run_id.replace('run-', 'ds-')
+        }})
+    if '/datasets/' in path:
+        dataset_id = path.split('/datasets/')[1].split('/')[0]
+        offset = int(request.url.params.get('offset') or 0)
+        limit = int(request.url.params.get('limit') or APIFY_DATASET_SIZE)
+        rng = _query_rng('apify', dataset_id)
+        items = []
+        for index in range(APIFY_DATASET_SIZE):
+            business = _business(rng, 'places', index)
+            items.append({
+                "title": business["name"],
+                "address": business["address"],
+                "totalScore": round(rng.uniform(1.0, 5.0), 1),
+                "reviewsCount": business["reviews_count"],
+                "phone": business["phone"],
+                "website": business["website"],
+            })
+        return httpx.Response(200, json=items[offset:offset + limit])
+    return httpx.Response(404, json={"error": {"type": "page-not-found"}})
+
+
+def serpapi_response(request: httpx.Request) -> httpx.Response:
+    query = request.url.params.get('q', '')
+    num = int(request.url.params.get('num') or 10)
+    name = query.split('"')[1] if query.count('"') >= 2 else query
+    rng = _query_rng('serpapi', query)
+    results = []
+    for position in range(num):
+        title, snippet = rng.choice(MENTION_TEMPLATES)
+        site = rng.choice(["reddit.com", "bbb.org", "trustpilot.com", "yelp.com", "ripoffreport.com"])
+        results.append({
+            "position": position + 1,
+            "title": title.format(name=name),
+            "link": f"https://www.{site}/{zlib.crc32(f'{query}{position}'.encode('utf-8')):08x}",
+            "snippet": snippet.format(name=name),
+            "source": site,
+            "date": f"{rng.choice(['Jan', 'Mar', 'Jun', 'Sep', 'Nov'])} {rng.randint(1, 28)}, 2024",
+        })
+    return httpx.Response(200, json={"search_metadata": {"status": "Success"}, "organic_results": results})
+
+
+def openai_response(request: httpx.Request) -> httpx.Response:
+    body = json.loads(request.content or b'{}')
+    prompt = ''.join(message.get('content') or '' for message in body.get('messages', []))
+    content = json.dumps(EXTRACTION if '"risk_signal"' in prompt else ANALYSIS)
+    if not body.get('stream'):
+        return httpx.Response(200, json={
+            "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": body.get('model'),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        })
+
+    async def events():
+        # About four characters per token, as the real model streams them
+        for start in range(0, len(content), 4):
+            chunk = {
+                "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": body.get('model'),
+                "choices": [{"index": 0, "delta": {"content": content[start:start + 4]}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n".encode('utf-8')
+            await asyncio.sleep(0)
+        yield b"data: [DONE]\n\n"
+
+    return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=events())
+
+
+RESPONDERS = {
+    'outscraper': outscraper_response,
+    'trustpilot': trustpilot_response,
+    'google_places': google_places_response,
+    'apify': apify_response,
+    'serpapi': serpapi_response,
+    'openai': openai_response,
+}
+
+
+class StubTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport answering every upstream provider locally.
+
+    :param profiles: Per-provider StubProfile overrides (others use DEFAULT_PROFILES)
+    :param latency_scale: Multiplier applied to every latency and jitter
+    :param seed: Seed for latency and error draws
+    :param responders: Per-provider response functions replacing those in RESPONDERS
+    """
+
+    def __init__(self, profiles: dict = None, latency_scale: float = 1.0, seed: int = 0, responders: dict = None):
+        self.profiles = {**DEFAULT_PROFILES, **(profiles or {})}
+        self.responders = {**RESPONDERS, **(responders or {})}
+        self.latency_scale = latency_scale
+        self.rng = random.Random(seed)
+        self.stats = {provider: {'requests': 0, 'errors': 0, 'throttled': 0} for provider in RESPONDERS}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        provider = HOSTS.get(request.url.host)
+        if provider is None:
+            return httpx.Response(404, json={"error": f"no stub for {request.url.host}"}, request=request)
+        profile = self.profiles[provider]
+        stats = self.stats[provider]
+        stats['requests'] += 1
+
+        delay = max(0.0, self.rng.gauss(profile.latency, profile.jitter)) * self.latency_scale
+        await asyncio.sleep(delay)
+
+        draw = self.rng.random()
+        if draw < profile.throttle_rate:
+            stats['throttled'] += 1
+            response = httpx.Response(429, headers={"retry-after": "1"}, json={"error": "Too Many Requests"})
+        elif draw < profile.throttle_rate + profile.error_rate:
+            stats['errors'] += 1
+            response = httpx.Response(503, json={"error": "Service Unavailable"})
+        else:
+            response = self.responders[provider](request)
+        response.request = request
+        return response
+
+    def get_stats(self) -> dict:
+        return self.stats
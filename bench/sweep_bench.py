@@ -0,0 +1,188 @@
+"""
+Measure a geographic sweep against searching each sub-location by hand.
+
+Sweeps REGION with Google Places against the offline stubs (bench/stubs.py),
+each search taking SEARCH_LATENCY seconds. Neighbouring sub-locations return
+overlapping businesses (OVERLAP of each PER_LOCATION results are shared with
+the next sub-location), as adjacent cities do. Each sub-location also has its own
+branch of one chain (all listing the chain's website) and a business whose only
+website is a Facebook page, as a metro sweep mostly returns.
+
+- manual: one search per sub-location, one after another, results concatenated
+- sweep: one GET /api/sweep/stream request
+- resumed: a sweep interrupted after INTERRUPT_AFTER sub-locations, then resumed
+  with its sweep_id
+
+The check passes when the sweep returns every business exactly once (every chain
+branch and social-page business included), is faster
+than the manual searches, and the resumed sweep searches only the sub-locations
+the interrupted one had not finished while returning the same businesses (and
+exporting them from GET /api/sweeps/{id}/results).
+
+Usage (from the repository root):
+    python -m bench.sweep_bench
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import tempfile
+
+REGION = "Dallas-Fort Worth"
+CATEGORY = "plumber"
+SEARCH_LATENCY = 0.3
+PER_LOCATION = 12
+OVERLAP = 6
+INTERRUPT_AFTER = 5
+CHAIN = "Roto-Rooter Plumbing"
+# Businesses only the sub-location itself returns: a chain branch and a social-page business
+PER_LOCATION_EXTRA = 2
+
+
+class OverlappingPlaces:
+    """Google Places stub whose sub-locations share businesses with their neighbours."""
+
+    def __init__(self, locations: list):
+        self.positions = {f"{CATEGORY} in {location}": index for index, location in enumerate(locations)}
+        self.searches = []
+
+    def respond(self, request):
+        import httpx
+        query = json.loads(request.content)["textQuery"]
+        self.searches.append(query)
+        position = self.positions[query]
+        first = position * (PER_LOCATION - OVERLAP)
+        places = [{
+            "displayName": {"text": f"Plumber {index}", "languageCode": "en"},
+            "formattedAddress": f"{100 + index} Main St, Dallas, TX 75201",
+            "rating": 2.1,
+            "userRatingCount": 40 + index,
+            "websiteUri": f"https://plumber{index}.example",
+        } for index in range(first, first + PER_LOCATION)]
+        places += [{
+            "displayName": {"text": CHAIN, "languageCode": "en"},
+            "formattedAddress": f"{500 + position} Commerce St, Dallas, TX 75202",
+            "rating": 2.4,
+            "userRatingCount": 80,
+            "websiteUri": "https://www.rotorooter.example/",
+        }, {
+            "displayName": {"text": f"Handy Plumber {position}", "languageCode": "en"},
+            "formattedAddress": f"{900 + position} Elm St, Dallas, TX 75203",
+            "rating": 1.9,
+            "userRatingCount": 15,
+            "websiteUri": f"https://www.facebook.com/handyplumber{position}",
+        }]
+        return httpx.Response(200, json={"places": places})
+
+
+def business_key(business: dict) -> tuple:
+    """Identity of a stub business: its name and address."""
+    return business["name"], business["address"]
+
+
+def parse_events(text: str) -> list:
+    """(event, data) pairs of a Server-Sent Events body."""
+    events = []
+    for message in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in message.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+async def run() -> int:
+    import httpx
+    from bench.stubs import StubTransport, StubProfile
+    from app.http_client import init_http_client, close_http_client
+    from app.search import search_businesses
+    from app.sweep import expand_region, run_sweep, sweep_store
+    from app.main import app
+
+    _, locations = expand_region(REGION)
+    expected = (len(locations) - 1) * (PER_LOCATION - OVERLAP) + PER_LOCATION + len(locations) * PER_LOCATION_EXTRA
+    stub = OverlappingPlaces(locations)
+    await init_http_client(transport=StubTransport(
+        {'google_places': StubProfile(SEARCH_LATENCY)}, responders={'google_places': stub.respond}
+    ))
+    print(f"{REGION}: {len(locations)} sub-locations, {expected} distinct businesses, "
+          f"{SEARCH_LATENCY * 1000:.0f} ms per search")
+    print(f"{'mode':<10} {'requests':>9} {'searches':>9} {'businesses':>11} {'distinct':>9} {'seconds':>8}")
+    try:
+        start = time.perf_counter()
+        manual = []
+        for location in locations:
+            manual += await search_businesses(CATEGORY, location, "google_places", refresh=True)
+        manual_seconds = time.perf_counter() - start
+        distinct = len({business_key(business) for business in manual})
+        print(f"{'manual':<10} {len(locations):9d} {len(stub.searches):9d} {len(manual):11d} {distinct:9d} "
+              f"{manual_seconds:8.2f}")
+
+        stub.searches.clear()
+        start = time.perf_counter()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://lowrated.test") as client:
+            response = await client.get("/api/sweep/stream", params={
+                "category": CATEGORY, "region": REGION, "api_choice": "google_places", "refresh": "true"
+            })
+        sweep_seconds = time.perf_counter() - start
+        swept = [data for event, data in parse_events(response.text) if event == "business"]
+        distinct = len({business_key(business) for business in swept})
+        print(f"{'sweep':<10} {1:9d} {len(stub.searches):9d} {len(swept):11d} {distinct:9d} {sweep_seconds:8.2f}")
+        branches = sum(business["name"] == CHAIN for business in swept)
+        social = sum("facebook.com" in business["website"] for business in swept)
+        print(f"{CHAIN} branches: {branches} of {len(locations)}, social-page businesses: {social} of {len(locations)}")
+        sweep_ok = (len(swept) == distinct == expected and branches == social == len(locations)
+                    and sweep_seconds < manual_seconds)
+
+        stub.searches.clear()
+        sweep_id = sweep_store.create_sweep(CATEGORY, REGION, "google_places", locations)
+        events = run_sweep(sweep_id, refresh=True)
+        finished = 0
+        async for event, _ in events:
+            finished += event == "location"
+            if finished == INTERRUPT_AFTER:
+                break
+        # The client went away: searches still running are cancelled
+        await events.aclose()
+        interrupted_searches = len(stub.searches)
+        # Searches that finished before the interruption (even after the last event read) are kept
+        pending = sum(location["status"] != 'done' for location in sweep_store.get_sweep(sweep_id)["locations"])
+        stub.searches.clear()
+        start = time.perf_counter()
+        resumed = [data async for event, data in run_sweep(sweep_id, refresh=True) if event == "business"]
+        resumed_seconds = time.perf_counter() - start
+        distinct = len({business_key(business) for business in resumed})
+        print(f"{'resumed':<10} {2:9d} {interrupted_searches:4d} + {len(stub.searches):2d} {len(resumed):11d} "
+              f"{distinct:9d} {resumed_seconds:8.2f}")
+        resume_ok = (len(resumed) == distinct == expected
+                     and 0 < pending <= len(locations) - INTERRUPT_AFTER and len(stub.searches) == pending)
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://lowrated.test") as client:
+            response = await client.get(f"/api/sweeps/{sweep_id}/results", params={"format": "csv"})
+        # Header line plus one row per business
+        exported = len(response.text.splitlines()) - 1
+        print(f"results csv of the resumed sweep: {exported} rows")
+        resume_ok = resume_ok and exported == expected
+    finally:
+        await close_http_client()
+    ok = sweep_ok and resume_ok
+    print("PASS" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+def main() -> int:
+    # Stub credentials set before the app loads .env, so real keys are never read or sent
+    for name in ('OUTSCRAPER_API_KEY', 'GOOGLE_API_KEY', 'APIFY_TOKEN', 'SERPAPI_KEY', 'OPENAI_API_KEY'):
+        os.environ[name] = 'stub'
+    directory = tempfile.mkdtemp()
+    os.environ['CACHE_PATH'] = os.path.join(directory, 'cache.sqlite3')
+    os.environ['SWEEPS_PATH'] = os.path.join(directory, 'sweeps.sqlite3')
+    # Measure the sweep, not the configured upstream rate limits
+    os.environ['RATE_LIMIT_GOOGLE_PLACES'] = '100000'
+    os.environ['RATE_BURST_GOOGLE_PLACES'] = '100000'
+    logging.disable(logging.CRITICAL)
+    return asyncio.run(run())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
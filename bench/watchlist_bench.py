@@ -0,0 +1,172 @@
+"""
+Compare daily watchlist checks with re-analyzing a domain's whole review history.
+
+Simulates DAYS daily checks of a domain that already has a long Trustpilot
+history and gets NEW_PER_DAY new reviews a day, against the offline provider
+stubs (bench/stubs.py). The full re-check downloads every review and analyzes
+them all each day, as a from-scratch run would; the watchlist check
+(app/watchlist.py) fetches reviews from its high-water mark and updates the
+previous analysis from the new items only.
+
+For each history size it reports, per daily check after the first: reviews
+downloaded, model calls, estimated prompt tokens and time. The check passes when
+the watchlist's daily work stays the same as the history grows.
+
+Usage (from the repository root):
+    python -m bench.watchlist_bench
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import tempfile
+from datetime import datetime, timezone
+
+HISTORY_SIZES = (100, 1000)
+NEW_PER_DAY = 3
+DAYS = 5
+DOMAIN = "acme-plumbing.example"
+DAY = 86400
+# Words for the details that make each simulated review distinct (not near-duplicates)
+DETAIL_WORDS = (
+    "invoice technician appointment kitchen bathroom leak boiler quote deposit warranty manager weekend "
+    "callback parts estimate heater drain pipe install schedule office receipt inspection tuesday contract"
+).split()
+
+
+class ReviewHistory:
+    """A domain's Trustpilot reviews over simulated time, served newest first from a cutoff."""
+
+    def __init__(self, size: int, now: float):
+        self.now = now
+        self.reviews = []
+        self.downloaded = 0
+        # Existing history: one review every six hours, going back from now
+        for index in range(size):
+            self._add(now - (size - index) * 6 * 3600, index)
+
+    def _add(self, timestamp: float, index: int):
+        from bench.stubs import REVIEW_TEXTS
+        rng = random.Random(index)
+        details = ' '.join(rng.choice(DETAIL_WORDS) for _ in range(20))
+        self.reviews.append({
+            "review_id": f"review-{index}",
+            "review_text": f"{REVIEW_TEXTS[index % len(REVIEW_TEXTS)]} {details}",
+            "review_rating": 1 + index % 5,
+            "author_title": f"Customer {index}",
+            "review_datetime_utc": datetime.fromtimestamp(timestamp, timezone.utc).strftime('%m/%d/%Y %H:%M:%S'),
+            "timestamp": timestamp,
+        })
+
+    def next_day(self):
+        start = self.now
+        self.now += DAY
+        for offset in range(NEW_PER_DAY):
+            self._add(start + (offset + 1) * DAY / (NEW_PER_DAY + 1), len(self.reviews))
+
+    def respond(self, request):
+        import httpx
+        limit = int(request.url.params.get('limit') or 3)
+        cutoff = float(request.url.params.get('cutoff') or 0)
+        reviews = sorted(
+            (review for review in self.reviews if cutoff <= review["timestamp"] <= self.now),
+            key=lambda review: -review["timestamp"]
+        )[:limit]
+        self.downloaded += len(reviews)
+        data = [{key: value for key, value in review.items() if key != "timestamp"} for review in reviews]
+        return httpx.Response(200, json={"id": "stub", "status": "Success", "data": [data]})
+
+
+async def simulate(history_size: int, mode: str) -> list:
+    """Run DAYS daily checks in `mode` ('full' or 'watchlist'); return per-day measurements."""
+    from bench.stubs import StubTransport, StubProfile, openai_response
+    from app.context_builder import estimate_tokens
+    from app.http_client import init_http_client, close_http_client
+    from app.cache import analysis_cache, result_cache
+    from app.trustpilot import get_trustpilot_reviews_since
+    from app.serp_search import search_negative_mentions
+    from app.ai_analyzer import analyze_reputation_data
+    from app.reputation import business_name_from_domain
+    from app.watchlist import WatchlistStore, check_domain
+
+    directory = tempfile.mkdtemp()
+    result_cache.path = analysis_cache.path = os.path.join(directory, "cache.sqlite3")
+    store = WatchlistStore(os.path.join(directory, "watchlist.sqlite3"))
+    history = ReviewHistory(history_size, time.time() - DAYS * DAY)
+    prompts = []
+
+    def respond_openai(request):
+        import json
+        messages = json.loads(request.content)["messages"]
+        prompts.append(estimate_tokens(''.join(message["content"] for message in messages)))
+        return openai_response(request)
+
+    stubs = StubTransport(
+        {provider: StubProfile(0.0) for provider in ('trustpilot', 'serpapi', 'openai')},
+        responders={'trustpilot': history.respond, 'openai': respond_openai}
+    )
+    await init_http_client(transport=stubs)
+    business_name = business_name_from_domain(DOMAIN)
+    if mode == 'watchlist':
+        store.add([DOMAIN], DAY)
+
+    days = []
+    try:
+        for _ in range(DAYS):
+            history.next_day()
+            downloaded, calls = history.downloaded, len(prompts)
+            start = time.perf_counter()
+            if mode == 'full':
+                reviews = await get_trustpilot_reviews_since(DOMAIN, None, len(history.reviews))
+                mentions = await search_negative_mentions(business_name, limit=15)
+                await analyze_reputation_data(business_name, mentions, reviews)
+            else:
+                updates, check = await check_domain(store.get(DOMAIN))
+                store.finish_check(DOMAIN, updates, check)
+            days.append({
+                "downloaded": history.downloaded - downloaded,
+                "calls": len(prompts) - calls,
+                "prompt_tokens": sum(prompts[calls:]),
+                "seconds": time.perf_counter() - start,
+            })
+    finally:
+        await close_http_client()
+    return days
+
+
+async def run() -> int:
+    print(f"{DAYS} daily checks, {NEW_PER_DAY} new reviews a day; averages over the checks after the first")
+    print(f"{'history':>8} {'mode':<10} {'reviews/day':>12} {'model calls':>12} {'prompt tokens':>14} {'ms/check':>9}")
+    daily_downloads = {}
+    for history_size in HISTORY_SIZES:
+        for mode in ('full', 'watchlist'):
+            later = (await simulate(history_size, mode))[1:]
+            average = {key: sum(day[key] for day in later) / len(later) for key in later[0]}
+            daily_downloads[(history_size, mode)] = average["downloaded"]
+            print(
+                f"{history_size:8d} {mode:<10} {average['downloaded']:12.1f} {average['calls']:12.1f} "
+                f"{average['prompt_tokens']:14.0f} {average['seconds'] * 1000:9.1f}"
+            )
+    watchlist = [daily_downloads[(size, 'watchlist')] for size in HISTORY_SIZES]
+    # New reviews plus the one at the high-water mark, whatever the history size
+    ok = all(downloads <= NEW_PER_DAY + 1 for downloads in watchlist)
+    print("PASS" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+def main() -> int:
+    # Stub credentials set before the app loads .env, so real keys are never read or sent
+    for name in ('OUTSCRAPER_API_KEY', 'GOOGLE_API_KEY', 'APIFY_TOKEN', 'SERPAPI_KEY', 'OPENAI_API_KEY'):
+        os.environ[name] = 'stub'
+    # Measure the work per check, not the configured upstream rate limits
+    for provider in ('outscraper', 'serpapi', 'openai'):
+        os.environ[f'RATE_LIMIT_{provider.upper()}'] = '100000'
+        os.environ[f'RATE_BURST_{provider.upper()}'] = '100000'
+    logging.disable(logging.CRITICAL)
+    return asyncio.run(run())
+
+
+if __name__ == "__main__":
+    sys.exit(main())